@@ -0,0 +1,152 @@
+"""
+Async variants of the hot API views, for the ASGI deployment (uvicorn).
+
+Under ASGI, Django 3.2 runs every sync view on one shared thread, and it has
+no async ORM yet. An async variant runs the unchanged DRF view on a bounded
+thread pool instead, ``API_ASYNC_THREADS`` requests at a time, while the
+event loop reads slow uploads and writes to slow clients without holding a
+thread. ``ASGIHandler`` keeps the remaining blocking work off the loop:
+spooling large request bodies to disk and iterating streaming responses.
+"""
+
+import asyncio
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler as BaseASGIHandler
+from django.core.exceptions import RequestAborted
+from django.db import close_old_connections
+
+from .routers import check_connections
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.API_ASYNC_THREADS, thread_name_prefix="api-async"
+)
+# Streaming responses buffer at most this many chunks ahead of the client.
+STREAM_BUFFER = 4
+
+
+def run_in_pool(func):
+    return sync_to_async(func, thread_sensitive=False, executor=executor)
+
+
+def call_view(view, request, *args, **kwargs):
+    # Pool threads keep their own connections; Django only recycles those of
+    # the thread that handles request_started/request_finished.
+    close_old_connections()
+    check_connections()
+    recorder = getattr(request, "_query_recorder", None) or nullcontext()
+    try:
+        with recorder:
+            response = view(request, *args, **kwargs)
+            if hasattr(response, "render") and not response.is_rendered:
+                response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view_class, **initkwargs):
+    """The async variant of a DRF view class, for ``api.urls``."""
+    view = view_class.as_view(**initkwargs)
+
+    async def async_variant(request, *args, **kwargs):
+        return await run_in_pool(call_view)(view, request, *args, **kwargs)
+
+    async_variant.cls = view_class
+    async_variant.initkwargs = initkwargs
+    # DRF views do their own CSRF checks, as with as_view().
+    async_variant.csrf_exempt = True
+    return async_variant
+
+
+def pump(iterator, queue, loop, stop):
+    # Iterates on a single pool thread: a queryset iterator must stay on the
+    # thread, and connection, that started it.
+    close_old_connections()
+    try:
+        for part in iterator:
+            if stop.is_set():
+                break
+            asyncio.run_coroutine_threadsafe(queue.put(part), loop).result()
+    finally:
+        close_old_connections()
+        asyncio.run_coroutine_threadsafe(queue.put(None), loop).result()
+
+
+async def drain(queue, producer):
+    # Unblock a producer whose client went away, so its thread is released.
+    while not producer.done():
+        getter = asyncio.ensure_future(queue.get())
+        await asyncio.wait({getter, producer}, return_when=asyncio.FIRST_COMPLETED)
+        getter.cancel()
+
+
+class ASGIHandler(BaseASGIHandler):
+    async def read_body(self, receive):
+        """Spool the request body, writing to disk on the pool."""
+        max_size = settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        body_file = tempfile.SpooledTemporaryFile(max_size=max_size, mode="w+b")
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                body_file.close()
+                raise RequestAborted()
+            if "body" in message:
+                size += len(message["body"])
+                if size > max_size:
+                    await run_in_pool(body_file.write)(message["body"])
+                else:
+                    body_file.write(message["body"])
+            if not message.get("more_body", False):
+                break
+        body_file.seek(0)
+        return body_file
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        headers = [
+            (
+                header.encode("ascii") if isinstance(header, str) else header,
+                value.encode("latin1") if isinstance(value, str) else value,
+            )
+            for header, value in response.items()
+        ]
+        for cookie in response.cookies.values():
+            headers.append(
+                (b"Set-Cookie", cookie.output(header="").encode("ascii").strip())
+            )
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": headers,
+            }
+        )
+        queue = asyncio.Queue(STREAM_BUFFER)
+        stop = threading.Event()
+        producer = asyncio.ensure_future(
+            run_in_pool(pump)(iter(response), queue, asyncio.get_running_loop(), stop)
+        )
+        try:
+            while True:
+                part = await queue.get()
+                if part is None:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send(
+                        {"type": "http.response.body", "body": chunk, "more_body": True}
+                    )
+            await producer
+            await send({"type": "http.response.body"})
+        finally:
+            stop.set()
+            await drain(queue, producer)
+            await run_in_pool(response.close)()
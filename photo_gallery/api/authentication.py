@@ -0,0 +1,163 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+User = get_user_model()
+
+ACCESS = "access"
+REFRESH = "refresh"
+
+
+def user_version_key(user_id):
+    return f"api:auth:user-version:{user_id}"
+
+
+def password_fingerprint(user):
+    # Changing the password changes the hash, which revokes issued tokens
+    # without a token table and without running the password hasher.
+    return salted_hmac("api.token.password", user.password).hexdigest()[:16]
+
+
+def make_token(user, token_type):
+    payload = {"uid": user.pk, "typ": token_type, "pwd": password_fingerprint(user)}
+    return signing.dumps(payload, salt=f"api.token.{token_type}")
+
+
+def issue_tokens(user):
+    return {
+        ACCESS: make_token(user, ACCESS),
+        REFRESH: make_token(user, REFRESH),
+        "expires_in": settings.AUTH_TOKEN_ACCESS_LIFETIME,
+    }
+
+
+def load_token(token, token_type):
+    """The payload of a validly signed, unexpired token, without a query."""
+    max_age = (
+        settings.AUTH_TOKEN_ACCESS_LIFETIME
+        if token_type == ACCESS
+        else settings.AUTH_TOKEN_REFRESH_LIFETIME
+    )
+    try:
+        payload = signing.loads(token, salt=f"api.token.{token_type}", max_age=max_age)
+    except signing.SignatureExpired:
+        raise exceptions.AuthenticationFailed("Token has expired.")
+    except signing.BadSignature:
+        raise exceptions.AuthenticationFailed("Invalid token.")
+    if not isinstance(payload, dict) or payload.get("typ") != token_type:
+        raise exceptions.AuthenticationFailed("Invalid token.")
+    return payload
+
+
+def verify_token(token, token_type):
+    payload = load_token(token, token_type)
+    user = user_cache.get(payload.get("uid"))
+    if user is None or not user.is_active:
+        raise exceptions.AuthenticationFailed("User inactive or deleted.")
+    if not constant_time_compare(payload.get("pwd", ""), password_fingerprint(user)):
+        raise exceptions.AuthenticationFailed("Invalid token.")
+    return user
+
+
+class UserCache:
+    """
+    Bounded in-process LRU of users for token authentication.
+
+    Entries are tagged with the user's version from the shared cache, which
+    is bumped whenever the user row is saved or deleted, so other processes
+    drop their stale copies on the next lookup. The TTL bounds staleness if
+    the shared version key itself is evicted.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        if not isinstance(user_id, int):
+            return None
+        version = cache.get(user_version_key(user_id), 0)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == version and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                return copy.copy(entry[2])
+
+        # From the primary: a user who just signed up may not be on the
+        # replicas yet.
+        user = User.objects.using(DEFAULT_DB_ALIAS).filter(pk=user_id).first()
+        if user is not None:
+            with self._lock:
+                self._entries[user_id] = (version, now + self.ttl, user)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+            user = copy.copy(user)
+        return user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(
+    settings.AUTH_TOKEN_USER_CACHE_SIZE, settings.AUTH_TOKEN_USER_CACHE_TTL
+)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    key = user_version_key(instance.pk)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+    user_cache.invalidate(instance.pk)
+
+
+class TokenAuthentication(BaseAuthentication):
+    """
+    Stateless ``Authorization: Bearer <token>`` authentication.
+
+    Verifying a token is an HMAC check plus a cached user lookup, instead of
+    the PBKDF2 run that ``BasicAuthentication`` performs on every request.
+    """
+
+    keyword = "Bearer"
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed("Invalid token header.")
+        try:
+            token = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed("Invalid token header.")
+        return verify_token(token, ACCESS), token
+
+    def authenticate_header(self, request):
+        return f'{self.keyword} realm="api"'
@@ -0,0 +1,74 @@
+import threading
+
+from django.core.cache import caches
+from django.core.cache.backends import locmem
+
+CACHE_ALIAS = "api"
+
+
+class LocMemCache(locmem.LocMemCache):
+    """Django's LRU local-memory cache, counting the entries it culls."""
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self.evictions = 0
+
+    def _cull(self):
+        size = len(self._cache)
+        super()._cull()
+        self.evictions += size - len(self._cache)
+
+
+class PayloadCache:
+    """
+    Read-through cache of serialized API payloads.
+
+    Keys embed the version stamps of everything a payload depends on (see
+    ``api.views.ConditionalMixin``), and the stamps are bumped by the
+    post_save/post_delete receivers in ``gallery.models``. A write therefore
+    retires exactly the affected entries, in every process at once, and the
+    stale ones age out of the LRU. Counters are per process.
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key):
+        data = self.cache.get(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def set(self, key, data):
+        self.cache.set(key, data)
+
+    def stats(self):
+        cache = self.cache
+        # Other backends don't report evictions or their size.
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": getattr(cache, "evictions", None),
+            "size": len(cache._cache) if isinstance(cache, LocMemCache) else None,
+        }
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = 0
+        cache = self.cache
+        cache.clear()
+        if isinstance(cache, LocMemCache):
+            cache.evictions = 0
+
+
+payload_cache = PayloadCache(CACHE_ALIAS)
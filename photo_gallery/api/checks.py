@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, register
+
+
+def default_cache_is_local():
+    return isinstance(caches["default"], LocMemCache)
+
+
+@register()
+def check_token_revocation_cache(app_configs, **kwargs):
+    # A user deactivated or with a new password in one worker would keep
+    # their tokens in the others until AUTH_TOKEN_USER_CACHE_TTL.
+    if settings.WEB_CONCURRENCY > 1 and default_cache_is_local():
+        return [
+            Error(
+                "Token revocation needs a default cache shared by all "
+                f"{settings.WEB_CONCURRENCY} workers.",
+                hint="Set CACHE_LOCATION to a memcached server.",
+                id="api.E001",
+            )
+        ]
+    return []
+
+
+@register()
+def check_replica_pin_cache(app_configs, **kwargs):
+    # Pins kept in one process would not send the client's next request,
+    # served by another one, to the primary: it could miss its own write.
+    if settings.DATABASE_REPLICAS and default_cache_is_local():
+        return [
+            Error(
+                "Read-your-writes pins need a default cache shared by all "
+                "processes when SQL_REPLICAS is set.",
+                hint="Set CACHE_LOCATION to a memcached server.",
+                id="api.E002",
+            )
+        ]
+    return []
@@ -0,0 +1,135 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from rest_framework.negotiation import BaseContentNegotiation
+
+from gallery.storage import is_content_addressed
+
+BLOCK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+IMMUTABLE = "private, max-age=31536000, immutable"
+PUBLIC_IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "private, no-cache"
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    # Image requests accept image types only; errors still render as JSON.
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+def serve_file(request, storage, name, cache_control=None):
+    """
+    Respond with the file ``name`` from ``storage`` after access was checked.
+
+    With ``MEDIA_ACCEL_REDIRECT`` set, nginx is told to send the file from its
+    internal location and handles ranges and validators itself. Otherwise the
+    file is streamed from here, which is meant for development and tests.
+    Files in an object store are fetched from a presigned URL instead.
+    """
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if cache_control is None:
+        cache_control = IMMUTABLE if is_content_addressed(name) else REVALIDATE
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        response = HttpResponseRedirect(storage.url(name))
+        # The presigned URL expires; caches must not keep the redirect.
+        response["Cache-Control"] = "private, no-store"
+        return response
+    if settings.MEDIA_ACCEL_REDIRECT:
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_REDIRECT + quote(name)
+        response["Cache-Control"] = cache_control
+        return response
+
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404
+    etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+    if is_content_addressed(name):
+        etag = f'"{os.path.splitext(os.path.basename(name))[0]}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(stat.st_mtime),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if response is None:
+        response = ranged_response(request, path, stat.st_size, etag, content_type)
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+def parse_range(header, size):
+    """Return ``(start, end)`` of a single ``bytes=`` range, or None."""
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    return start, end
+
+
+def ranged_response(request, path, size, etag, content_type):
+    header = request.headers.get("Range")
+    if_range = request.headers.get("If-Range")
+    byte_range = None
+    if header and (not if_range or if_range == etag):
+        # Multiple ranges are not supported; the whole file is sent instead.
+        byte_range = parse_range(header, size)
+        if byte_range is not None and byte_range[0] > byte_range[1]:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    if byte_range is None:
+        return FileResponse(open(path, "rb"), content_type=content_type)
+
+    start, end = byte_range
+    response = StreamingHttpResponse(
+        read_range(path, start, end - start + 1),
+        status=206,
+        content_type=content_type,
+    )
+    response["Content-Length"] = str(end - start + 1)
+    response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return response
+
+
+def read_range(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            block = f.read(min(BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+
+from .routers import pin_after_write, read_alias, reads_for
+
+logger = logging.getLogger(__name__)
+
+IN_LIST_RE = re.compile(r"\((?:%s, )+%s\)")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryRecorder:
+    """Record the SQL run on every database connection while active."""
+
+    def __init__(self):
+        self.shapes = Counter()
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - start
+            self.count += 1
+            # Parameters are already placeholders; only IN lists vary in length.
+            self.shapes[IN_LIST_RE.sub("(%s, ...)", sql)] += 1
+
+    def __enter__(self):
+        self._wrappers = []
+        for alias in connections:
+            wrapper = connections[alias].execute_wrapper(self)
+            wrapper.__enter__()
+            self._wrappers.append(wrapper)
+        return self
+
+    def __exit__(self, *exc_info):
+        for wrapper in reversed(self._wrappers):
+            wrapper.__exit__(*exc_info)
+
+    @property
+    def duplicates(self):
+        """SQL shapes run more than once, most repeated first (N+1 suspects)."""
+        return [(sql, n) for sql, n in self.shapes.most_common() if n > 1]
+
+
+def get_query_budget(view_class, method):
+    budget = getattr(view_class, "query_budget", None)
+    if isinstance(budget, dict):
+        budget = budget.get(method)
+    return budget
+
+
+class QueryBudgetMiddleware:
+    """
+    Count the queries of each request and hold views to their ``query_budget``.
+
+    A view declares ``query_budget`` as a number or as a dict per HTTP method.
+    With ``QUERY_BUDGET_HEADERS`` the count, time and duplicated statements
+    are reported in ``X-Query-*`` headers. Going over budget is logged, or
+    raises ``QueryBudgetExceeded`` with ``QUERY_BUDGET_STRICT`` (as in tests).
+
+    Under ASGI the views of ``api.asynchronous`` run on other threads, so the
+    recorder is handed to them on the request instead.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Marks the instance as a coroutine function for Django.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        return self.check_budget(request, response, recorder)
+
+    async def __acall__(self, request):
+        request._query_recorder = recorder = QueryRecorder()
+        response = await self.get_response(request)
+        return self.check_budget(request, response, recorder)
+
+    def check_budget(self, request, response, recorder):
+        if settings.QUERY_BUDGET_HEADERS:
+            response["X-Query-Count"] = recorder.count
+            response["X-Query-Time"] = f"{recorder.time * 1000:.1f}ms"
+            response["X-Query-Duplicates"] = sum(n - 1 for _, n in recorder.duplicates)
+
+        view_class = getattr(request, "_query_budget_view", None)
+        budget = get_query_budget(view_class, request.method)
+        if budget is not None and recorder.count > budget:
+            message = (
+                f"{request.method} {request.path} ({view_class.__name__}) ran "
+                f"{recorder.count} queries, budget is {budget}."
+            )
+            for sql, n in recorder.duplicates[:3]:
+                message += f"\n  {n}x {sql}"
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget_view = getattr(view_func, "cls", None) or getattr(
+            view_func, "view_class", None
+        )
+
+
+class ReplicaMiddleware:
+    """
+    Send the reads of safe requests to a replica, and pin clients that write
+    to the primary for a while (see ``api.routers``).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = read_alias.set(reads_for(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            read_alias.reset(token)
+        pin_after_write(request)
+        return response
+
+    async def __acall__(self, request):
+        # The async views of api.asynchronous inherit the context variable.
+        token = read_alias.set(reads_for(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_alias.reset(token)
+        pin_after_write(request)
+        return response
@@ -0,0 +1,217 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from gallery.search import search_photos
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only keyset pagination over ``ordering``.
+
+    The cursor is the opaque, encoded tuple of ordering values of the last
+    row on the page, so fetching any page is a single index range scan
+    instead of an OFFSET over every preceding row. The last ordering field
+    must be unique (normally ``id``) to make the sort total. Clients may ask
+    for up to ``max_page_size`` rows with ``?limit=``.
+    """
+
+    cursor_query_param = "cursor"
+    page_size = api_settings.PAGE_SIZE or 20
+    page_size_query_param = "limit"
+    max_page_size = 100
+    ordering = ("-id",)
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.get_position_filter(position))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[: self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        position = [getattr(last, name) for name, _ in self.get_fields()]
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self.encode_cursor(position)
+        )
+
+    def get_fields(self):
+        return [(field.lstrip("-"), field.startswith("-")) for field in self.ordering]
+
+    def get_position_filter(self, position):
+        fields = self.get_fields()
+        after = Q()
+        for index, (name, descending) in enumerate(fields):
+            lookup = "lt" if descending else "gt"
+            clause = Q(**{f"{name}__{lookup}": position[index]})
+            for prev_index, (prev_name, _) in enumerate(fields[:index]):
+                clause &= Q(**{prev_name: position[prev_index]})
+            after |= clause
+        # The redundant bound on the leading column lets the database turn
+        # the OR-expanded row comparison into a single index range scan.
+        name, descending = fields[0]
+        lookup = "lte" if descending else "gte"
+        return Q(**{f"{name}__{lookup}": position[0]}) & after
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, position):
+        data = json.dumps(position, cls=DjangoJSONEncoder, separators=(",", ":"))
+        return base64.urlsafe_b64encode(data.encode("ascii")).decode("ascii")
+
+    def get_schema_fields(self, view):
+        import coreapi
+        import coreschema
+
+        return [
+            coreapi.Field(
+                name=self.cursor_query_param,
+                required=False,
+                location="query",
+                schema=coreschema.String(
+                    title="Cursor",
+                    description="The pagination cursor value.",
+                ),
+            ),
+            coreapi.Field(
+                name=self.page_size_query_param,
+                required=False,
+                location="query",
+                schema=coreschema.Integer(
+                    title="Limit",
+                    description="Number of results to return per page.",
+                ),
+            ),
+        ]
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+
+class FeedPagination(KeysetPagination):
+    ordering = ("-score", "-id")
+
+
+class SearchPagination(KeysetPagination):
+    """
+    Keyset pagination over full-text search hits, best match first.
+
+    The hits come from ``gallery.search`` rather than a queryset, which only
+    supplies the photos for the ids on the page.
+    """
+
+    ordering = ("-rank", "-id")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        if position is not None:
+            try:
+                position = (float(position[0]), int(position[1]))
+            except (TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+
+        hits = search_photos(view.get_search_terms(), position, self.page_size + 1)
+        self.has_next = len(hits) > self.page_size
+        hits = hits[: self.page_size]
+        self.last_hit = hits[-1] if hits else None
+        photos = queryset.in_bulk([photo_id for photo_id, _ in hits])
+        self.page = []
+        for photo_id, rank in hits:
+            # Deleted since the search document was read, or being deleted.
+            if photo_id in photos:
+                photo = photos[photo_id]
+                photo.rank = rank
+                self.page.append(photo)
+        return self.page
+
+    def get_next_link(self):
+        # Follows the last hit, whether or not its photo is still there.
+        if not self.has_next:
+            return None
+        photo_id, rank = self.last_hit
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            self.encode_cursor([rank, photo_id]),
+        )
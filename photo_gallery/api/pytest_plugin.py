@@ -0,0 +1,21 @@
+"""
+Pytest plugin holding API views to their ``query_budget`` in tests.
+
+Any request in a test that runs more queries than its view declares fails
+with ``QueryBudgetExceeded``, listing the repeated statements. Mark a test
+with ``@pytest.mark.no_query_budget`` to exempt it.
+"""
+import pytest
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "no_query_budget: don't enforce api.views query budgets"
+    )
+
+
+@pytest.fixture(autouse=True)
+def _enforce_query_budget(request, settings):
+    settings.QUERY_BUDGET_STRICT = not request.node.get_closest_marker(
+        "no_query_budget"
+    )
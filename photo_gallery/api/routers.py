@@ -0,0 +1,188 @@
+"""
+Read replicas: the reads of safe API requests go to a replica.
+
+Replicas are the database aliases in ``DATABASE_REPLICAS``. For GET, HEAD and
+OPTIONS requests ``api.middleware.ReplicaMiddleware`` picks one replica and
+every read of the request goes there, unless the client wrote within the
+last ``REPLICA_PIN_SECONDS``: each write pins its client to the primary for
+that long, through the shared cache, so clients always read their own
+writes. A replica lagging further behind than that leaves the rotation until
+it catches up, since pinning could no longer hide its lag. Writes, reads in a
+transaction and everything outside requests (jobs, commands) use the primary.
+"""
+
+import base64
+import contextvars
+import hashlib
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.dispatch import receiver
+
+from rest_framework import exceptions
+from rest_framework.authentication import get_authorization_header
+
+from .authentication import ACCESS, load_token
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# The alias the reads of the current request go to, if not the primary.
+read_alias = contextvars.ContextVar("read_alias", default=None)
+
+# Seconds a replica is behind the primary, by database vendor.
+LAG_SQL = {
+    "postgresql": (
+        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+        "THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) "
+        "END"
+    ),
+}
+
+
+def measure_lag(alias):
+    connection = connections[alias]
+    sql = LAG_SQL.get(connection.vendor)
+    if sql is None:
+        return 0
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            lag = cursor.fetchone()[0]
+    except DatabaseError:
+        # Down, or not reachable: out of the rotation until the next check.
+        return float("inf")
+    # NULL when the alias isn't a standby at all.
+    return float(lag or 0)
+
+
+class LagMonitor:
+    """Replica lags, measured at most every ``interval`` seconds per process."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lags = {}
+        self._lock = threading.Lock()
+
+    def lag(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._lags.get(alias)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+        lag = measure_lag(alias)
+        with self._lock:
+            self._lags[alias] = (now + self.interval, lag)
+        return lag
+
+    def clear(self):
+        with self._lock:
+            self._lags.clear()
+
+
+lag_monitor = LagMonitor(settings.REPLICA_LAG_CHECK_INTERVAL)
+
+
+def choose_replica():
+    """A replica that is close enough behind the primary, or None."""
+    replicas = [
+        alias
+        for alias in settings.DATABASE_REPLICAS
+        if lag_monitor.lag(alias) <= settings.REPLICA_PIN_SECONDS
+    ]
+    return random.choice(replicas) if replicas else None
+
+
+def client_key(request):
+    """Who sent the request, from its credentials, without a query."""
+    auth = get_authorization_header(request).split()
+    if len(auth) == 2 and auth[0].lower() == b"bearer":
+        try:
+            return f"user:{load_token(auth[1].decode(), ACCESS).get('uid')}"
+        except (exceptions.AuthenticationFailed, UnicodeError):
+            return None
+    if len(auth) == 2 and auth[0].lower() == b"basic":
+        try:
+            username = base64.b64decode(auth[1]).partition(b":")[0]
+        except ValueError:
+            return None
+        return f"basic:{hashlib.sha256(username).hexdigest()}"
+    session = getattr(request, "session", None)
+    if session is not None and session.get(SESSION_KEY):
+        return f"user:{session[SESSION_KEY]}"
+    return None
+
+
+def pin_key(client):
+    return f"api:db:pinned:{client}"
+
+
+def reads_for(request):
+    """The alias to read from during ``request``, None for the primary."""
+    if not settings.DATABASE_REPLICAS or request.method not in SAFE_METHODS:
+        return None
+    client = client_key(request)
+    if client is not None and cache.get(pin_key(client)):
+        return None
+    return choose_replica()
+
+
+def pin_after_write(request):
+    if not settings.DATABASE_REPLICAS or request.method in SAFE_METHODS:
+        return
+    client = client_key(request)
+    if client is not None:
+        cache.set(pin_key(client), 1, settings.REPLICA_PIN_SECONDS)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Also for instances that were read from a replica.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the primary's rows.
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+def check_connections():
+    """
+    Close persistent connections that broke while idle (a restarted server, a
+    firewall timeout), checking each at most every SQL_HEALTH_CHECK_INTERVAL
+    seconds. Django 3.2 only notices once a query fails.
+    """
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        if now - getattr(connection, "health_checked_at", float("-inf")) < (
+            settings.SQL_HEALTH_CHECK_INTERVAL
+        ):
+            continue
+        connection.health_checked_at = now
+        if not connection.is_usable():
+            connection.close()
+
+
+@receiver(request_started)
+def check_connections_on_request(sender, **kwargs):
+    check_connections()
@@ -1,9 +1,29 @@
-from django.contrib.auth import get_user_model
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
 from django.contrib.auth import password_validation as validators
+from django.core.validators import get_available_image_extensions
+from django.db import IntegrityError, transaction
+from django.urls import reverse
 
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 
-from gallery.models import Album, Photo, Comment, Bookmark
+from gallery.deletion import visible
+from gallery.models import (
+    Album,
+    Deletion,
+    Photo,
+    PhotoMetadata,
+    UploadSession,
+    Comment,
+    Bookmark,
+)
+from gallery.transforms import available_extensions
+from gallery.uploads import start_upload
+from .authentication import REFRESH, issue_tokens, verify_token
 
 User = get_user_model()
 
@@ -29,25 +49,76 @@ class SignupSerializer(serializers.ModelSerializer):
         return instance
 
 
+class TokenObtainSerializer(serializers.Serializer):
+    email = serializers.EmailField(write_only=True)
+    password = serializers.CharField(write_only=True, trim_whitespace=False)
+
+    def validate(self, attrs):
+        user = authenticate(
+            self.context.get("request"),
+            username=attrs["email"],
+            password=attrs["password"],
+        )
+        if user is None:
+            raise serializers.ValidationError("Invalid email or password.")
+        return issue_tokens(user)
+
+
+class TokenRefreshSerializer(serializers.Serializer):
+    refresh = serializers.CharField(write_only=True)
+
+    def validate(self, attrs):
+        return issue_tokens(verify_token(attrs["refresh"], REFRESH))
+
+
 class AlbumSerializer(serializers.ModelSerializer):
     class Meta:
         model = Album
         fields = (
             "id",
             "name",
+            "photo_count",
         )
+        read_only_fields = ("photo_count",)
 
     def validate(self, attrs):
         attrs["owner"] = self.initial_data["user"]
         pk = self.initial_data.get("id")
         if pk:
             attrs["id"] = pk
-            if not Album.objects.filter(owner=attrs["owner"], id=pk):
+            if not Album.objects.filter(owner=attrs["owner"], id=pk).exists():
                 raise serializers.ValidationError("You cannot update this album.")
         return attrs
 
 
+class PhotoMetadataSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PhotoMetadata
+        fields = ("taken_at", "camera", "lens", "width", "height", "orientation")
+
+
+class PhotoFileField(serializers.ImageField):
+    """
+    An uploaded photo, shown as the URL of ``api.views.PhotoFileApi``.
+
+    Media files are not public: the API checks access, then has nginx send
+    the file or redirects to a presigned URL, so the URL here never expires.
+    """
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = reverse("v1:photo_file", kwargs={"pk": value.instance.pk})
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request is not None else url
+
+
 class PhotoSerializer(serializers.ModelSerializer):
+    album = serializers.PrimaryKeyRelatedField(queryset=visible(Album.objects.all()))
+    photo = PhotoFileField()
+    renditions = serializers.SerializerMethodField()
+    metadata = PhotoMetadataSerializer(read_only=True)
+
     class Meta:
         model = Photo
         fields = (
@@ -55,19 +126,230 @@ class PhotoSerializer(serializers.ModelSerializer):
             "description",
             "album",
             "photo",
+            "comment_count",
+            "bookmark_count",
+            "renditions",
+            "metadata",
+            "placeholder",
         )
+        read_only_fields = ("comment_count", "bookmark_count", "placeholder")
 
     def validate(self, attrs):
         attrs["owner"] = self.initial_data["user"]
         pk = self.initial_data.get("id")
         if pk:
             attrs["id"] = pk
-            if not Photo.objects.filter(owner=attrs["owner"], id=pk):
+            if not Photo.objects.filter(owner=attrs["owner"], id=pk).exists():
                 raise serializers.ValidationError("You cannot update this photo.")
         return attrs
 
+    def get_renditions(self, obj):
+        request = self.context.get("request")
+        renditions = {}
+        for rendition in obj.renditions.all():
+            url = reverse(
+                "v1:photo_rendition_file",
+                kwargs={
+                    "pk": obj.pk,
+                    "size": rendition.size,
+                    "format": rendition.format,
+                },
+            )
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            renditions.setdefault(str(rendition.size), {})[rendition.format] = url
+        return renditions
+
+
+class PhotoFilterSerializer(serializers.Serializer):
+    """Query parameters of photo lists; see ``api.views.PhotoFilterMixin``."""
+
+    ORDERINGS = {
+        "-id": ("-id",),
+        "taken_at": ("taken_at", "id"),
+        "-taken_at": ("-taken_at", "-id"),
+    }
+
+    taken_after = serializers.DateTimeField(required=False)
+    taken_before = serializers.DateTimeField(required=False)
+    camera = serializers.CharField(required=False, max_length=100)
+    min_width = serializers.IntegerField(required=False, min_value=1)
+    min_height = serializers.IntegerField(required=False, min_value=1)
+    ordering = serializers.ChoiceField(
+        choices=list(ORDERINGS), required=False, default="-id"
+    )
+
+
+class PhotoMonthSerializer(serializers.Serializer):
+    month = serializers.DateField(format="%Y-%m")
+    count = serializers.IntegerField(source="photos")
+
+
+class DuplicateClusterSerializer(serializers.Serializer):
+    photos = serializers.ListField(child=serializers.IntegerField())
+
+
+class MapFilterSerializer(serializers.Serializer):
+    """
+    Query parameters of the map: ``bbox`` is ``min_lon,min_lat,max_lon,max_lat``
+    in degrees, with ``min_lon > max_lon`` for a box across the antimeridian.
+    """
+
+    bbox = serializers.CharField()
+    zoom = serializers.IntegerField(min_value=0, max_value=22)
+
+    def validate_bbox(self, value):
+        try:
+            min_lon, min_lat, max_lon, max_lat = (
+                float(part) for part in value.split(",")
+            )
+        except ValueError:
+            raise serializers.ValidationError(
+                "Enter four numbers: min_lon,min_lat,max_lon,max_lat."
+            )
+        if not (
+            -180 <= min_lon <= 180
+            and -180 <= max_lon <= 180
+            and -90 <= min_lat <= max_lat <= 90
+        ):
+            raise serializers.ValidationError("Enter a bounding box on the globe.")
+        return min_lon, min_lat, max_lon, max_lat
+
+
+class MapCellSerializer(serializers.Serializer):
+    cell = serializers.CharField()
+    count = serializers.IntegerField()
+    photo = serializers.IntegerField(source="photo_id", allow_null=True)
+    center = serializers.ListField(child=serializers.FloatField())
+    bounds = serializers.ListField(child=serializers.FloatField())
+
+
+class TransformSerializer(serializers.Serializer):
+    """Query parameters of a photo transform; see ``gallery.transforms``."""
+
+    width = serializers.IntegerField(required=False, min_value=1)
+    height = serializers.IntegerField(required=False, min_value=1)
+    crop = serializers.BooleanField(required=False, default=False)
+    quality = serializers.IntegerField(required=False, min_value=1, max_value=95)
+    extension = serializers.CharField(required=False, default="jpg")
+
+    def validate_extension(self, value):
+        if value not in available_extensions():
+            raise serializers.ValidationError(
+                f"Choose one of: {', '.join(available_extensions())}."
+            )
+        return value
+
+    def validate(self, attrs):
+        width, height = attrs.get("width"), attrs.get("height")
+        if not (width or height):
+            raise serializers.ValidationError("Enter a width, a height or both.")
+        if attrs["crop"] and not (width and height):
+            raise serializers.ValidationError("Cropping needs a width and a height.")
+        if max(width or 0, height or 0) > settings.PHOTO_TRANSFORM_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"Ask for at most {settings.PHOTO_TRANSFORM_MAX_SIZE} pixels."
+            )
+        return attrs
+
+
+class SearchResultSerializer(PhotoSerializer):
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(PhotoSerializer.Meta):
+        fields = PhotoSerializer.Meta.fields + ("rank",)
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    album = serializers.PrimaryKeyRelatedField(queryset=visible(Album.objects.all()))
+
+    class Meta:
+        model = UploadSession
+        fields = (
+            "id",
+            "album",
+            "description",
+            "filename",
+            "size",
+            "offset",
+            "expires_at",
+        )
+        read_only_fields = ("offset", "expires_at")
+
+    def validate_filename(self, value):
+        value = os.path.basename(value)
+        extension = os.path.splitext(value)[1][1:].lower()
+        if extension not in get_available_image_extensions():
+            raise serializers.ValidationError("Upload a valid image.")
+        return value
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"Size must be between 1 and {settings.UPLOAD_MAX_SIZE} bytes."
+            )
+        return value
+
+    def validate(self, attrs):
+        attrs["owner"] = self.initial_data["user"]
+        return attrs
+
+    def create(self, validated_data):
+        return start_upload(**validated_data)
+
+
+class DirectUploadSerializer(serializers.Serializer):
+    """A photo to upload straight to the object store; see ``gallery.uploads``."""
+
+    album = serializers.PrimaryKeyRelatedField(queryset=visible(Album.objects.all()))
+    description = serializers.CharField(allow_blank=True)
+    filename = serializers.CharField(max_length=255)
+    size = serializers.IntegerField()
+    content_type = serializers.CharField()
+    sha256 = serializers.RegexField(
+        r"^[0-9a-f]{64}$", error_messages={"invalid": "Enter a hex SHA-256 digest."}
+    )
+    method = serializers.ChoiceField(["PUT", "POST"], default="PUT")
+
+    validate_filename = UploadSessionSerializer.validate_filename
+    validate_size = UploadSessionSerializer.validate_size
+
+    def validate(self, attrs):
+        if mimetypes.guess_type(attrs["filename"])[0] != attrs["content_type"]:
+            raise serializers.ValidationError(
+                {"content_type": "Does not match the file name."}
+            )
+        return attrs
+
+
+class DirectUploadConfirmSerializer(serializers.Serializer):
+    token = serializers.CharField()
+
+
+class UniqueCreateMixin:
+    """
+    Report a unique constraint violation on insert as a validation error.
+
+    The database enforces uniqueness, so no existence query runs before the
+    insert and concurrent duplicates are rejected as well.
+    """
+
+    unique_error_message = None
+
+    def create(self, validated_data):
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [self.unique_error_message]}
+            )
+
+
+class CommentSerializer(UniqueCreateMixin, serializers.ModelSerializer):
+    unique_error_message = "You have already commented on this photo."
+    photo = serializers.PrimaryKeyRelatedField(queryset=visible(Photo.objects.all()))
 
-class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = (
@@ -78,16 +360,15 @@ class CommentSerializer(serializers.ModelSerializer):
 
     def validate(self, attrs):
         attrs["owner"] = self.initial_data["user"]
-        if Comment.objects.filter(owner=attrs["owner"], photo=attrs["photo"]):
-            raise serializers.ValidationError(
-                "You have already commented on this photo."
-            )
-        elif Photo.objects.filter(owner=attrs["owner"]):
+        if attrs["photo"].owner_id == getattr(attrs["owner"], "pk", attrs["owner"]):
             raise serializers.ValidationError("You cannot commented your photo.")
         return attrs
 
 
-class BookmarkSerializer(serializers.ModelSerializer):
+class BookmarkSerializer(UniqueCreateMixin, serializers.ModelSerializer):
+    unique_error_message = "You have already added this photo to your favorites."
+    photo = serializers.PrimaryKeyRelatedField(queryset=visible(Photo.objects.all()))
+
     class Meta:
         model = Bookmark
         fields = (
@@ -97,16 +378,63 @@ class BookmarkSerializer(serializers.ModelSerializer):
 
     def validate(self, attrs):
         attrs["owner"] = self.initial_data["user"]
-        if Photo.objects.filter(owner=attrs["owner"], id=attrs["photo"].id):
+        if attrs["photo"].owner_id == getattr(attrs["owner"], "pk", attrs["owner"]):
             raise serializers.ValidationError("You cannot favorite your photo.")
-        elif Bookmark.objects.filter(owner=attrs["owner"], photo=attrs["photo"]):
-            raise serializers.ValidationError(
-                "You have already added this photo to your favorites."
-            )
         return attrs
 
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = ("id", "email", "username", "first_name", "last_name")
+        fields = (
+            "id",
+            "email",
+            "username",
+            "first_name",
+            "last_name",
+            "album_count",
+            "photo_count",
+            "comment_count",
+            "bookmark_count",
+        )
+        read_only_fields = (
+            "album_count",
+            "photo_count",
+            "comment_count",
+            "bookmark_count",
+        )
+
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # The counters are kept by queryset updates; never write them back.
+        instance.save(update_fields=list(validated_data))
+        return instance
+
+
+class DeletionSerializer(serializers.ModelSerializer):
+    status = serializers.SerializerMethodField()
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Deletion
+        fields = (
+            "id",
+            "kind",
+            "object_id",
+            "status",
+            "total",
+            "deleted",
+            "progress",
+            "created_at",
+            "finished_at",
+        )
+
+    def get_status(self, obj):
+        return "done" if obj.finished_at else "running"
+
+    def get_progress(self, obj):
+        # The total is an estimate made when the deletion started.
+        if obj.finished_at:
+            return 1.0
+        return round(min(obj.deleted / obj.total, 1), 3) if obj.total else 0.0
@@ -1,13 +1,31 @@
+from django.conf import settings
 from django.urls import path
 
+from api.asynchronous import async_view
 from api.views import (
+    CacheStatsApi,
+    DeletionApi,
     FeedApi,
+    MapApi,
+    SearchApi,
     SignupApi,
+    TokenObtainApi,
+    TokenRefreshApi,
     AlbumApi,
     AlbumRetrieveUpdateDestroyApi,
     PhotoApi,
     PhotoRetrieveUpdateDestroyApi,
+    PhotoFileApi,
+    PhotoTransformUrlApi,
+    PhotoMonthsApi,
+    DuplicatesApi,
+    DirectUploadApi,
+    DirectUploadConfirmApi,
+    UploadApi,
+    UploadChunkApi,
+    UploadFinishApi,
     UserPhotosApi,
+    UserPhotoMonthsApi,
     UserAlbumsApi,
     CommentApi,
     CommentDeleteApi,
@@ -21,17 +39,54 @@ from api.views import (
 
 app_name = "v1"
 
+
+def hot(view_class):
+    """The view for a hot endpoint: its async variant in the ASGI deployment."""
+    if settings.API_ASYNC_VIEWS:
+        return async_view(view_class)
+    return view_class.as_view()
+
+
 urlpatterns = [
     path("signup/", SignupApi.as_view(), name="signup"),
+    path("token/", TokenObtainApi.as_view(), name="token"),
+    path("token/refresh/", TokenRefreshApi.as_view(), name="token_refresh"),
     path("albums/", AlbumApi.as_view(), name="albums"),
     path("album/<int:pk>/", AlbumRetrieveUpdateDestroyApi.as_view(), name="album"),
-    path("photos/", PhotoApi.as_view(), name="photos"),
-    path("photo/<int:pk>/", PhotoRetrieveUpdateDestroyApi.as_view(), name="photo"),
-    path("user/<int:user_pk>/photos/", UserPhotosApi.as_view(), name="user_photos"),
-    path("user/<int:user_pk>/albums/", UserAlbumsApi.as_view(), name="user_albums"),
+    path("photos/", hot(PhotoApi), name="photos"),
+    path("photos/months/", PhotoMonthsApi.as_view(), name="photo_months"),
+    path("photos/duplicates/", DuplicatesApi.as_view(), name="photo_duplicates"),
+    path("photo/<int:pk>/", hot(PhotoRetrieveUpdateDestroyApi), name="photo"),
+    path("photo/<int:pk>/file/", PhotoFileApi.as_view(), name="photo_file"),
+    path(
+        "photo/<int:pk>/transform/",
+        PhotoTransformUrlApi.as_view(),
+        name="photo_transform",
+    ),
+    path(
+        "photo/<int:pk>/file/<int:size>/<str:format>/",
+        PhotoFileApi.as_view(),
+        name="photo_rendition_file",
+    ),
+    path("uploads/", hot(UploadApi), name="uploads"),
+    path("upload/<uuid:pk>/", hot(UploadChunkApi), name="upload"),
+    path("upload/<uuid:pk>/finish/", hot(UploadFinishApi), name="upload_finish"),
+    path("uploads/direct/", hot(DirectUploadApi), name="direct_uploads"),
+    path(
+        "uploads/direct/confirm/",
+        hot(DirectUploadConfirmApi),
+        name="direct_upload_confirm",
+    ),
+    path("user/<int:user_pk>/photos/", hot(UserPhotosApi), name="user_photos"),
+    path(
+        "user/<int:user_pk>/photos/months/",
+        UserPhotoMonthsApi.as_view(),
+        name="user_photo_months",
+    ),
+    path("user/<int:user_pk>/albums/", hot(UserAlbumsApi), name="user_albums"),
     path(
         "user/<int:user_pk>/bookmarks/",
-        UserBookmarksApi.as_view(),
+        hot(UserBookmarksApi),
         name="user_bookmarks",
     ),
     path("photo/<int:photo_pk>/comments/", CommentApi.as_view(), name="photo_comments"),
@@ -45,7 +100,11 @@ urlpatterns = [
     path(
         "bookmark/delete/<int:pk>/", BookmarkDeleteApi.as_view(), name="bookmark_delete"
     ),
-    path("feed/", FeedApi.as_view(), name="feed"),
+    path("feed/", hot(FeedApi), name="feed"),
+    path("search/", SearchApi.as_view(), name="search"),
+    path("map/", MapApi.as_view(), name="map"),
     path("user/me/", UserApi.as_view(), name="user"),
     path("user/<int:pk>/", UserIdApi.as_view(), name="user_id"),
+    path("cache/stats/", CacheStatsApi.as_view(), name="cache_stats"),
+    path("deletion/<uuid:pk>/", DeletionApi.as_view(), name="deletion"),
 ]
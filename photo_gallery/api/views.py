@@ -1,6 +1,18 @@
-from django.contrib.auth import get_user_model
-from django.db.models import Count
+import hashlib
+import json
+from itertools import islice
 
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db.models import F, Sum, prefetch_related_objects
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.generics import (
     CreateAPIView,
     DestroyAPIView,
@@ -11,14 +23,67 @@ from rest_framework.generics import (
     RetrieveUpdateDestroyAPIView,
 )
 from rest_framework.parsers import MultiPartParser
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-
-from gallery.models import Album, Photo, Comment, Bookmark
+from rest_framework.utils.encoders import JSONEncoder
+
+from gallery.deletion import is_large, tombstone, visible
+from gallery.models import (
+    Album,
+    Deletion,
+    LocationCell,
+    Photo,
+    PhotoHash,
+    PhotoMonthCount,
+    Rendition,
+    UploadSession,
+    Comment,
+    Bookmark,
+    Version,
+    fill_cell_photos,
+)
+from gallery.duplicates import clusters, find_similar, hash_photo
+from gallery.geo import MAX_CELLS, count_cells, covering_cells, zoom_precision
+from gallery.renditions import schedule_renditions
+from gallery.search import search_terms
+from gallery.transforms import (
+    get_or_render,
+    parse_params,
+    touch,
+    transform_url,
+    verify,
+)
+from gallery.uploads import (
+    OffsetMismatch,
+    UploadError,
+    confirm_upload,
+    direct_uploads_enabled,
+    finish_upload,
+    parse_checksum,
+    presign_upload,
+    write_chunk,
+)
+from .authentication import TokenAuthentication
+from .cache import payload_cache
+from .media import PUBLIC_IMMUTABLE, IgnoreClientContentNegotiation, serve_file
+from .pagination import FeedPagination, SearchPagination
 from .serializers import (
     SignupSerializer,
+    TokenObtainSerializer,
+    TokenRefreshSerializer,
     AlbumSerializer,
+    DeletionSerializer,
     PhotoSerializer,
+    PhotoFilterSerializer,
+    PhotoMonthSerializer,
+    DuplicateClusterSerializer,
+    MapFilterSerializer,
+    MapCellSerializer,
+    SearchResultSerializer,
+    TransformSerializer,
+    UploadSessionSerializer,
+    DirectUploadSerializer,
+    DirectUploadConfirmSerializer,
     CommentSerializer,
     BookmarkSerializer,
     UserSerializer,
@@ -26,7 +91,6 @@ from .serializers import (
 
 from .permissions import IsNotSuperUser
 
-
 User = get_user_model()
 
 
@@ -43,29 +107,138 @@ class CreateMixin:
         return Response(serializer.data, status=201)
 
 
-class ListUserMixin:
+class StreamMixin:
+    """
+    Emit the whole list as NDJSON with ``?stream=1``, for bulk exports.
+
+    Rows are read with a chunked iterator (a server-side cursor where the
+    database has one) and serialized a chunk at a time, prefetching each
+    chunk's relations, so the full list is never held in memory.
+    """
+
+    stream_query_param = "stream"
+    stream_chunk_size = 500
+
     def list(self, request, *args, **kwargs):
-        user_id = self.kwargs.get("user_pk")
-        queryset = self.queryset.filter(owner_id=user_id)
-        if queryset:
-            serializer = self.get_serializer(queryset, many=True)
-            return Response(serializer.data)
-        else:
-            return Response(status=404)
+        if request.query_params.get(self.stream_query_param) in ("1", "true"):
+            queryset = self.filter_queryset(self.get_queryset())
+            ordering = getattr(self.paginator, "ordering", ("-id",))
+            return StreamingHttpResponse(
+                self.stream(queryset.order_by(*ordering)),
+                content_type="application/x-ndjson",
+            )
+        return super().list(request, *args, **kwargs)
+
+    def stream(self, queryset):
+        lookups = queryset._prefetch_related_lookups
+        # iterator() ignores prefetch_related(); it is applied per chunk.
+        rows = queryset.prefetch_related(None).iterator(
+            chunk_size=self.stream_chunk_size
+        )
+        while True:
+            chunk = list(islice(rows, self.stream_chunk_size))
+            if not chunk:
+                return
+            if lookups:
+                prefetch_related_objects(chunk, *lookups)
+            serializer = self.get_serializer(chunk, many=True)
+            yield "".join(
+                json.dumps(item, cls=JSONEncoder) + "\n" for item in serializer.data
+            )
+
+
+class ListUserMixin(StreamMixin):
+    def get_queryset(self):
+        return super().get_queryset().filter(owner_id=self.kwargs.get("user_pk"))
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        first_page = self.paginator.cursor_query_param not in request.query_params
+        if isinstance(response, Response) and first_page:
+            if not response.data["results"]:
+                return Response(status=404)
+        return response
+
+
+class PhotoFilterMixin:
+    """
+    Filter photos by capture time, camera and size, and sort them by capture
+    time, from the indexed ``PhotoMetadata``.
+
+    Sorting by capture time leaves out photos whose time is unknown, since
+    the keyset cursor can't step past NULLs.
+    """
+
+    filter_fields = {
+        "taken_after": "metadata__taken_at__gte",
+        "taken_before": "metadata__taken_at__lt",
+        "camera": "metadata__camera",
+        "min_width": "metadata__width__gte",
+        "min_height": "metadata__height__gte",
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method != "GET":
+            return queryset
+        params = PhotoFilterSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+        queryset = queryset.filter(
+            **{
+                lookup: filters[name]
+                for name, lookup in self.filter_fields.items()
+                if name in filters
+            }
+        )
+        ordering = PhotoFilterSerializer.ORDERINGS[filters["ordering"]]
+        if "taken_at" in filters["ordering"]:
+            queryset = queryset.annotate(taken_at=F("metadata__taken_at")).filter(
+                taken_at__isnull=False
+            )
+        # Read by the keyset pagination, and by StreamMixin.
+        self.paginator.ordering = ordering
+        return queryset
 
 
 class DestroyMixin:
     def destroy(self, request, *args, **kwargs):
         pk = self.kwargs["pk"]
         user_id = request.user.id
-        if self.queryset.filter(owner_id=user_id, id=pk):
-            instance = self.get_object()
+        instance = self.get_queryset().filter(owner_id=user_id, id=pk).first()
+        if instance is not None:
+            self.check_object_permissions(request, instance)
             self.perform_destroy(instance)
             return Response(status=204)
         else:
             return Response(status=403)
 
 
+class TombstoneMixin:
+    """
+    Delete big albums and accounts in the background (see gallery.deletion).
+
+    DELETE hides them at once and answers 202 with the progress of the
+    deletion and its URL in ``Location``. Small ones are deleted right away.
+    """
+
+    def destroy(self, request, *args, **kwargs):
+        instance = self.get_object()
+        if not is_large(instance):
+            self.perform_destroy(instance)
+            return Response(status=204)
+        deletion = tombstone(instance)
+        url = reverse("v1:deletion", kwargs={"pk": deletion.pk})
+        return Response(
+            DeletionSerializer(deletion).data,
+            status=202,
+            headers={"Location": request.build_absolute_uri(url)},
+        )
+
+    def perform_destroy(self, instance):
+        instance.delete()
+
+
 class UpdateMixin:
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop("partial", False)
@@ -81,9 +254,78 @@ class UpdateMixin:
             return Response(serializer.errors, status=400)
 
 
+class ConditionalMixin:
+    """
+    Answer conditional GETs from version stamps (see ``gallery.models.Version``).
+
+    ``version_keys`` name the stamps a response depends on, with ``{kwarg}``
+    and ``{user}`` placeholders. They are read in one query before the main
+    queryset, so an unchanged resource costs that query and a 304. Reading
+    the stamps first means a concurrent write can only make the ETag older
+    than the payload, never newer, so clients never keep stale data.
+    """
+
+    version_keys = ()
+
+    def get_version_keys(self):
+        return [
+            key.format(user=self.request.user.pk, **self.kwargs)
+            for key in self.version_keys
+        ]
+
+    def get_validators(self):
+        keys = self.get_version_keys()
+        rows = Version.objects.filter(key__in=keys).values_list(
+            "key", "value", "updated_at"
+        )
+        stamps = {key: value for key, value, _ in rows}
+        last_modified = max((row[2] for row in rows), default=None)
+        tag = "|".join(
+            [
+                self.request.get_full_path(),
+                self.request.accepted_media_type or "",
+                str(last_modified),
+                *(f"{key}={stamps.get(key, 0)}" for key in keys),
+            ]
+        )
+        etag = f'"{hashlib.md5(tag.encode()).hexdigest()}"'
+        return etag, last_modified
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = self.get_fresh_response(request, etag, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if timestamp is not None:
+                response["Last-Modified"] = http_date(timestamp)
+        return response
+
+    def get_fresh_response(self, request, etag, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class CacheMixin(ConditionalMixin):
+    """Serve the serialized payload from ``payload_cache``, keyed by the ETag."""
+
+    def get_fresh_response(self, request, etag, *args, **kwargs):
+        key = f"api:payload:{request.get_host()}:{etag}"
+        data = payload_cache.get(key)
+        if data is not None:
+            return Response(data, headers={"X-Cache": "hit"})
+        response = super().get_fresh_response(request, etag, *args, **kwargs)
+        if isinstance(response, Response) and response.status_code == 200:
+            payload_cache.set(key, response.data)
+            response["X-Cache"] = "miss"
+        return response
+
+
 class SignupApi(CreateAPIView):
     permission_classes = (AllowAny,)
     serializer_class = SignupSerializer
+    query_budget = 5
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -92,114 +334,485 @@ class SignupApi(CreateAPIView):
         return Response(serializer.data, status=201)
 
 
-class AlbumApi(CreateMixin, ListCreateAPIView):
+class TokenObtainApi(GenericAPIView):
+    permission_classes = (AllowAny,)
+    authentication_classes = ()
+    serializer_class = TokenObtainSerializer
+    query_budget = 1
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.validated_data)
+
+    def get_authenticate_header(self, request):
+        return TokenAuthentication().authenticate_header(request)
+
+
+class TokenRefreshApi(TokenObtainApi):
+    serializer_class = TokenRefreshSerializer
+
+
+class AlbumApi(ConditionalMixin, StreamMixin, CreateMixin, ListCreateAPIView):
     permission_classes = [IsAuthenticated, IsNotSuperUser]
     serializer_class = AlbumSerializer
-    queryset = Album.objects.all()
+    queryset = visible(Album.objects.all())
+    version_keys = ("albums",)
+    query_budget = {"GET": 4, "POST": 6}
 
 
-class AlbumRetrieveUpdateDestroyApi(UpdateMixin, RetrieveUpdateDestroyAPIView):
+class AlbumRetrieveUpdateDestroyApi(
+    CacheMixin, TombstoneMixin, UpdateMixin, RetrieveUpdateDestroyAPIView
+):
     permission_classes = [IsAuthenticated, IsNotSuperUser]
     serializer_class = AlbumSerializer
-    queryset = Album.objects.all()
+    queryset = visible(Album.objects.all())
+    version_keys = ("album:{pk}",)
+    query_budget = {"GET": 4, "PUT": 7, "PATCH": 7}
 
 
-class PhotoApi(CreateMixin, ListCreateAPIView):
+class PhotoApi(
+    ConditionalMixin, PhotoFilterMixin, StreamMixin, CreateMixin, ListCreateAPIView
+):
     parser_classes = (MultiPartParser,)
     permission_classes = [IsAuthenticated, IsNotSuperUser]
     serializer_class = PhotoSerializer
-    queryset = Photo.objects.all()
+    queryset = visible(
+        Photo.objects.select_related("metadata").prefetch_related("renditions")
+    )
+    version_keys = ("photos",)
+    query_budget = {"GET": 5, "POST": 23}
+    duplicates_query_param = "duplicates"
+
+    def create(self, request, *args, **kwargs):
+        self.duplicates = None
+        response = super().create(request, *args, **kwargs)
+        if self.duplicates is not None:
+            response.data["duplicates"] = self.duplicates
+        return response
+
+    def perform_create(self, serializer):
+        photo = serializer.save()
+        schedule_renditions(photo)
+        # With ?duplicates=1 the hash is computed now rather than by the
+        # worker, to warn about near-duplicates the user already has.
+        if self.request.query_params.get(self.duplicates_query_param) in ("1", "true"):
+            photo_hash = hash_photo(photo)
+            self.duplicates = find_similar(
+                photo.owner_id, photo_hash.value, exclude=photo.pk
+            )
 
 
 class PhotoRetrieveUpdateDestroyApi(
-    UpdateMixin, DestroyMixin, RetrieveUpdateDestroyAPIView
+    CacheMixin, UpdateMixin, DestroyMixin, RetrieveUpdateDestroyAPIView
 ):
     permission_classes = [IsAuthenticated, IsNotSuperUser]
     serializer_class = PhotoSerializer
-    queryset = Photo.objects.all()
+    queryset = visible(
+        Photo.objects.select_related("metadata").prefetch_related("renditions")
+    )
+    # "deletions" for photos of albums and accounts being deleted.
+    version_keys = ("photo:{pk}", "deletions")
+    # Deleting cascades to comments, bookmarks and renditions, whose
+    # receivers run per row, so DELETE has no fixed budget.
+    query_budget = {"GET": 5, "PUT": 9, "PATCH": 9}
+
+    def perform_update(self, serializer):
+        photo = serializer.save()
+        if "photo" in serializer.validated_data:
+            schedule_renditions(photo)
+
+
+class PhotoFileApi(GenericAPIView):
+    """Authorized download of a photo, or of one of its renditions."""
+
+    permission_classes = [IsAuthenticated, IsNotSuperUser]
+    content_negotiation_class = IgnoreClientContentNegotiation
+    query_budget = 3
+
+    def get(self, request, *args, **kwargs):
+        if "size" in kwargs:
+            field = Rendition._meta.get_field("file")
+            names = visible(
+                Rendition.objects.filter(
+                    photo_id=kwargs["pk"], size=kwargs["size"], format=kwargs["format"]
+                )
+            ).values_list("file", flat=True)
+        else:
+            field = Photo._meta.get_field("photo")
+            names = visible(Photo.objects.filter(pk=kwargs["pk"])).values_list(
+                "photo", flat=True
+            )
+        name = names.first()
+        if not name:
+            return Response(status=404)
+        return serve_file(request, field.storage, name)
+
+
+class PhotoTransformUrlApi(GenericAPIView):
+    """A signed URL of a resized, cropped or converted copy of a photo."""
+
+    permission_classes = [IsAuthenticated, IsNotSuperUser]
+    query_budget = 3
+
+    def get(self, request, *args, **kwargs):
+        params = TransformSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        transform = dict(params.validated_data)
+        extension = transform.pop("extension")
+        photo = (
+            visible(Photo.objects.filter(pk=kwargs["pk"])).only("pk", "photo").first()
+        )
+        if photo is None or not photo.photo:
+            return Response(status=404)
+        url = transform_url(photo, extension, **transform)
+        return Response({"url": request.build_absolute_uri(url)})
+
+
+class TransformApi(GenericAPIView):
+    """
+    A transform of a photo by signed URL, rendered and cached on first use.
+
+    The signature is the credential, so the response can be cached publicly.
+    In production nginx serves cached transforms and only misses get here.
+    """
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    content_negotiation_class = IgnoreClientContentNegotiation
+    # A miss may queue a cache trim.
+    query_budget = 2
+
+    def get(self, request, signature, params, pk, extension):
+        transform = parse_params(params)
+        photo = visible(Photo.objects.filter(pk=pk)).only("pk", "photo").first()
+        if (
+            transform is None
+            or photo is None
+            or not photo.photo
+            or not verify(signature, params, pk, extension, photo.photo.name)
+        ):
+            return Response(status=404)
+        name = get_or_render(photo, signature, params, extension, transform)
+        touch(name)
+        return serve_file(request, default_storage, name, PUBLIC_IMMUTABLE)
 
 
-class UserAlbumsApi(ListUserMixin, ListAPIView):
+class UploadApi(CreateMixin, CreateAPIView):
+    permission_classes = [IsAuthenticated, IsNotSuperUser]
+    serializer_class = UploadSessionSerializer
+    query_budget = 4
+
+
+class UploadSessionMixin:
+    permission_classes = [IsAuthenticated, IsNotSuperUser]
+    serializer_class = UploadSessionSerializer
+
+    def get_queryset(self):
+        return visible(
+            UploadSession.objects.filter(
+                owner=self.request.user, expires_at__gt=timezone.now()
+            )
+        )
+
+
+class UploadChunkApi(UploadSessionMixin, GenericAPIView):
+    query_budget = {"GET": 3, "PATCH": 5, "DELETE": 5}
+
+    def get(self, request, *args, **kwargs):
+        session = self.get_object()
+        return Response(
+            self.get_serializer(session).data,
+            headers={"Upload-Offset": session.offset, "Upload-Length": session.size},
+        )
+
+    def patch(self, request, *args, **kwargs):
+        session = self.get_object()
+        try:
+            offset = int(request.headers["Upload-Offset"])
+            length = int(request.headers["Content-Length"])
+        except (KeyError, ValueError):
+            return Response(
+                {"detail": "Upload-Offset and Content-Length headers are required."},
+                status=400,
+            )
+        if length > settings.UPLOAD_CHUNK_MAX_SIZE:
+            return Response(
+                {"detail": f"Chunks are limited to {settings.UPLOAD_CHUNK_MAX_SIZE}."},
+                status=413,
+            )
+        try:
+            checksum = parse_checksum(request.headers.get("Upload-Checksum"))
+            offset = write_chunk(session, offset, request.stream, length, checksum)
+        except OffsetMismatch as e:
+            return Response(
+                {"detail": str(e)},
+                status=409,
+                headers={"Upload-Offset": session.offset},
+            )
+        except UploadError as e:
+            return Response({"detail": str(e)}, status=400)
+        return Response(status=204, headers={"Upload-Offset": offset})
+
+    def delete(self, request, *args, **kwargs):
+        self.get_object().delete()
+        return Response(status=204)
+
+
+class UploadFinishApi(UploadSessionMixin, GenericAPIView):
+    query_budget = 22
+
+    def post(self, request, *args, **kwargs):
+        try:
+            photo = finish_upload(self.get_object())
+        except UploadError as e:
+            return Response({"detail": str(e)}, status=400)
+        serializer = PhotoSerializer(photo, context=self.get_serializer_context())
+        return Response(serializer.data, status=201)
+
+
+class DirectUploadMixin:
+    """Answer 404 unless the photos live in an object store."""
+
+    permission_classes = [IsAuthenticated, IsNotSuperUser]
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if not direct_uploads_enabled():
+            raise NotFound("Direct uploads need an object store (PHOTO_STORAGE).")
+
+
+class DirectUploadApi(DirectUploadMixin, GenericAPIView):
+    """
+    Where to upload a photo so that its bytes go straight to the object
+    store; POST the returned token to the confirm endpoint once it is there.
+    """
+
+    serializer_class = DirectUploadSerializer
+    query_budget = 3
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(presign_upload(request.user, **serializer.validated_data))
+
+
+class DirectUploadConfirmApi(DirectUploadMixin, GenericAPIView):
+    serializer_class = DirectUploadConfirmSerializer
+    query_budget = 19
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            photo = confirm_upload(serializer.validated_data["token"], request.user)
+        except UploadError as e:
+            return Response({"detail": str(e)}, status=400)
+        serializer = PhotoSerializer(photo, context=self.get_serializer_context())
+        return Response(serializer.data, status=201)
+
+
+class UserAlbumsApi(CacheMixin, ListUserMixin, ListAPIView):
     permission_classes = [IsAuthenticated, IsNotSuperUser]
     serializer_class = AlbumSerializer
-    queryset = Album.objects.all()
+    queryset = visible(Album.objects.all())
+    version_keys = ("user:{user_pk}:albums",)
+    query_budget = 4
 
 
-class UserPhotosApi(ListUserMixin, ListAPIView):
+class UserPhotosApi(CacheMixin, PhotoFilterMixin, ListUserMixin, ListAPIView):
     permission_classes = [IsAuthenticated, IsNotSuperUser]
     serializer_class = PhotoSerializer
-    queryset = Photo.objects.all()
+    queryset = visible(
+        Photo.objects.select_related("metadata").prefetch_related("renditions")
+    )
+    version_keys = ("user:{user_pk}:photos", "deletions")
+    query_budget = 5
 
 
-class CommentApi(CreateMixin, ListCreateAPIView):
+class CommentApi(ConditionalMixin, StreamMixin, CreateMixin, ListCreateAPIView):
     permission_classes = [IsAuthenticated, IsNotSuperUser]
     serializer_class = CommentSerializer
-    queryset = Comment.objects.all()
+    queryset = visible(Comment.objects.all())
+    version_keys = ("photo:{photo_pk}:comments", "deletions")
+    query_budget = {"GET": 4, "POST": 11}
 
-    def list(self, request, *args, **kwargs):
-        photo_id = self.kwargs["photo_pk"]
-        queryset = Comment.objects.filter(photo_id=photo_id)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+    def get_queryset(self):
+        return super().get_queryset().filter(photo_id=self.kwargs["photo_pk"])
 
 
 class CommentDeleteApi(DestroyMixin, DestroyAPIView):
     permission_classes = [IsAuthenticated, IsNotSuperUser]
     serializer_class = CommentSerializer
-    queryset = Comment.objects.all()
+    queryset = visible(Comment.objects.all())
+    query_budget = 10
 
 
 class BookmarkApi(CreateMixin, CreateAPIView):
     permission_classes = [IsAuthenticated, IsNotSuperUser]
     serializer_class = BookmarkSerializer
-    queryset = Bookmark.objects.all()
+    queryset = visible(Bookmark.objects.all())
+    query_budget = 10
 
 
-class BookmarksListApi(ListAPIView):
+class BookmarksListApi(ConditionalMixin, StreamMixin, ListAPIView):
     permission_classes = [IsAuthenticated, IsNotSuperUser]
     serializer_class = BookmarkSerializer
-    queryset = Bookmark.objects.all()
+    queryset = visible(Bookmark.objects.all())
+    version_keys = ("bookmarks",)
+    query_budget = 4
 
 
-class UserBookmarksApi(ListUserMixin, ListAPIView):
+class UserBookmarksApi(CacheMixin, ListUserMixin, ListAPIView):
     permission_classes = [IsAuthenticated, IsNotSuperUser]
     serializer_class = BookmarkSerializer
-    queryset = Bookmark.objects.all()
+    queryset = visible(Bookmark.objects.all())
+    version_keys = ("user:{user_pk}:bookmarks", "deletions")
+    query_budget = 4
 
 
 class BookmarkDeleteApi(DestroyMixin, DestroyAPIView):
     permission_classes = [IsAuthenticated, IsNotSuperUser]
     serializer_class = BookmarkSerializer
-    queryset = Bookmark.objects.all()
+    queryset = visible(Bookmark.objects.all())
+    query_budget = 9
 
 
-class FeedApi(ListAPIView):
+class FeedApi(ConditionalMixin, StreamMixin, ListAPIView):
     permission_classes = [IsAuthenticated, IsNotSuperUser]
     serializer_class = PhotoSerializer
-    queryset = Photo.objects.all()
+    pagination_class = FeedPagination
+    queryset = visible(
+        Photo.objects.select_related("metadata").prefetch_related("renditions")
+    )
+    version_keys = ("photos",)
+    query_budget = 5
+
+
+class PhotoMonthsApi(ConditionalMixin, ListAPIView):
+    """Photos per month of capture, from the ``PhotoMonthCount`` aggregate."""
+
+    permission_classes = [IsAuthenticated, IsNotSuperUser]
+    serializer_class = PhotoMonthSerializer
+    pagination_class = None
+    queryset = PhotoMonthCount.objects.filter(count__gt=0)
+    version_keys = ("photos",)
+    query_budget = 4
+
+    def get_queryset(self):
+        return (
+            super()
+            .get_queryset()
+            .values("month")
+            .annotate(photos=Sum("count"))
+            .order_by("month")
+        )
+
+
+class UserPhotoMonthsApi(PhotoMonthsApi):
+    version_keys = ("user:{user_pk}:photos",)
+
+    def get_queryset(self):
+        return super().get_queryset().filter(owner_id=self.kwargs["user_pk"])
+
+
+class DuplicatesApi(ConditionalMixin, ListAPIView):
+    """The current user's photos grouped into clusters of near-duplicates."""
+
+    permission_classes = [IsAuthenticated, IsNotSuperUser]
+    serializer_class = DuplicateClusterSerializer
+    pagination_class = None
+    queryset = visible(PhotoHash.objects.all())
+    version_keys = ("user:{user}:duplicates",)
+    query_budget = 4
 
     def list(self, request, *args, **kwargs):
-        queryset = (
-            self.queryset.annotate(cnt=Count("comment") + Count("bookmark"))
-            .order_by("-cnt")
+        hashes = (
+            self.get_queryset()
+            .filter(owner_id=request.user.id)
+            .values_list("photo_id", "value")
+        )
+        groups = clusters(hashes.iterator(), settings.PHOTO_DUPLICATE_DISTANCE)
+        serializer = self.get_serializer(
+            [{"photos": group} for group in groups], many=True
         )
-        serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
 
-class UserApi(GenericAPIView):
+class MapApi(ConditionalMixin, ListAPIView):
+    """
+    Located photos in ``?bbox=`` clustered into geohash cells sized for
+    ``?zoom=``, read from the maintained ``LocationCell`` counts.
+    """
+
     permission_classes = [IsAuthenticated, IsNotSuperUser]
-    serializer_class = UserSerializer
-    queryset = User.objects.all()
+    serializer_class = MapCellSerializer
+    pagination_class = None
+    queryset = LocationCell.objects.filter(count__gt=0)
+    version_keys = ("locations",)
+    # Two more when cells lost their photo since the last read.
+    query_budget = 6
 
-    def get(self, request, *args, **kwargs):
+    def list(self, request, *args, **kwargs):
+        params = MapFilterSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        bbox = params.validated_data["bbox"]
+        precision = zoom_precision(params.validated_data["zoom"])
+        # A large box at a high zoom would be too many cells: coarsen them.
+        while precision > 1 and count_cells(bbox, precision) > MAX_CELLS:
+            precision -= 1
+        cells = list(
+            self.get_queryset()
+            .filter(cell__in=covering_cells(bbox, precision))
+            .order_by("cell")
+        )
+        fill_cell_photos(cells)
+        serializer = self.get_serializer(cells, many=True)
+        return Response({"precision": precision, "cells": serializer.data})
+
+
+class SearchApi(ConditionalMixin, ListAPIView):
+    """Photos whose description or comments contain every word of ``?q=``."""
+
+    permission_classes = [IsAuthenticated, IsNotSuperUser]
+    serializer_class = SearchResultSerializer
+    pagination_class = SearchPagination
+    queryset = visible(
+        Photo.objects.select_related("metadata").prefetch_related("renditions")
+    )
+    version_keys = ("photos",)
+    query_budget = 6
+
+    def get_search_terms(self):
+        terms = search_terms(self.request.query_params.get("q"))
+        if not terms:
+            raise ValidationError({"q": ["Enter at least one word to search for."]})
+        return terms
+
+
+class UserApi(ConditionalMixin, TombstoneMixin, RetrieveAPIView):
+    permission_classes = [IsAuthenticated, IsNotSuperUser]
+    serializer_class = UserSerializer
+    queryset = visible(User.objects.all())
+    version_keys = ("user:{user}",)
+    query_budget = {"GET": 4, "PUT": 7, "PATCH": 7}
+
+    def get_object(self):
+        # request.user may be a copy cached by token authentication, with
+        # counters that queryset updates changed since: never save it.
+        user = self.get_queryset().filter(pk=self.request.user.pk).first()
+        if user is None:
+            raise NotFound
+        return user
+
+    def retrieve(self, request, *args, **kwargs):
         user_id = request.user.id
         queryset = self.queryset.filter(id=user_id)
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
     def put(self, request, *args, **kwargs):
-        serializer = self.get_serializer(request.user, data=request.data)
+        serializer = self.get_serializer(self.get_object(), data=request.data)
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
@@ -207,7 +820,9 @@ class UserApi(GenericAPIView):
             return Response(serializer.errors, status=400)
 
     def partial_update(self, request, pk=None):
-        serializer = self.get_serializer(request.user, data=request.data, partial=True)
+        serializer = self.get_serializer(
+            self.get_object(), data=request.data, partial=True
+        )
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data)
@@ -215,8 +830,34 @@ class UserApi(GenericAPIView):
     def patch(self, request, *args, **kwargs):
         return self.partial_update(request, *args, **kwargs)
 
+    def delete(self, request, *args, **kwargs):
+        return self.destroy(request, *args, **kwargs)
+
+
+class CacheStatsApi(GenericAPIView):
+    permission_classes = [IsAdminUser]
+    query_budget = 2
+
+    def get(self, request, *args, **kwargs):
+        return Response(payload_cache.stats())
+
 
-class UserIdApi(RetrieveAPIView):
+class UserIdApi(CacheMixin, RetrieveAPIView):
     permission_classes = [IsAuthenticated, IsNotSuperUser]
     serializer_class = UserSerializer
-    queryset = User.objects.all()
+    queryset = visible(User.objects.all())
+    version_keys = ("user:{pk}",)
+    query_budget = 4
+
+
+class DeletionApi(RetrieveAPIView):
+    """
+    Progress of an album or account deleted in the background. Its id is
+    the credential, since a deleted account can no longer sign in.
+    """
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    serializer_class = DeletionSerializer
+    queryset = Deletion.objects.all()
+    query_budget = 1
@@ -0,0 +1,153 @@
+"""
+Compare feed throughput of the sync (WSGI) and ASGI deployments with slow clients.
+
+    python -m benchmarks.asgi --workers 2 --clients 64 --slow-clients 16
+
+Each deployment runs under gunicorn with the same number of workers: sync
+workers for core.wsgi, uvicorn workers for core.asgi. Meanwhile, the slow
+clients trickle upload chunks in. Needs gunicorn and uvicorn installed. The
+servers share the benchmark's throwaway database, so on SQLite it's a file.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from . import env
+
+MODES = {
+    "sync": ("core.wsgi:application", ()),
+    "asgi": ("core.asgi:application", ("-k", "uvicorn.workers.UvicornWorker")),
+}
+
+
+async def http(port, method, path, headers, body=b"", trickle=None):
+    """Send one request and return its status; ``trickle`` is (bytes, delay)."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    head = [f"{method} {path} HTTP/1.1", "Host: 127.0.0.1", "Connection: close"]
+    head += [f"{name}: {value}" for name, value in headers.items()]
+    head.append(f"Content-Length: {len(body)}")
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode())
+    if trickle:
+        size, delay = trickle
+        for start in range(0, len(body), size):
+            writer.write(body[start : start + size])
+            await writer.drain()
+            await asyncio.sleep(delay)
+    else:
+        writer.write(body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return int(response.split(b" ", 2)[1])
+
+
+async def load(port, token, sessions, args):
+    auth = {"Authorization": f"Bearer {token}"}
+    deadline = time.monotonic() + args.duration
+    latencies = []
+    uploads = 0
+
+    async def fast_client():
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            status = await http(port, "GET", "/api/feed/", auth)
+            assert status == 200, status
+            latencies.append(time.perf_counter() - start)
+
+    async def slow_client(own_sessions):
+        nonlocal uploads
+        body = b"x" * args.upload_size
+        headers = {
+            **auth,
+            "Content-Type": "application/offset+octet-stream",
+            "Upload-Offset": "0",
+        }
+        for session_id in own_sessions:
+            if time.monotonic() >= deadline:
+                break
+            trickle = (args.trickle_bytes, args.trickle_delay)
+            path = f"/api/upload/{session_id}/"
+            status = await http(port, "PATCH", path, headers, body, trickle)
+            assert status == 204, status
+            uploads += 1
+
+    per_client = len(sessions) // max(args.slow_clients, 1)
+    await asyncio.gather(
+        *(fast_client() for _ in range(args.clients)),
+        *(
+            slow_client(sessions[i * per_client : (i + 1) * per_client])
+            for i in range(args.slow_clients)
+        ),
+    )
+    return latencies, uploads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--slow-clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--photos", type=int, default=1000)
+    parser.add_argument("--upload-size", type=int, default=256 * 1024)
+    parser.add_argument("--trickle-bytes", type=int, default=16 * 1024)
+    parser.add_argument("--trickle-delay", type=float, default=0.1)
+    args = parser.parse_args()
+
+    env.setup()
+    from django.contrib.auth import get_user_model
+
+    from api.authentication import ACCESS, make_token
+    from gallery.models import Album, Photo
+    from gallery.uploads import start_upload
+
+    env.use_file_database()
+    upload_time = args.upload_size / args.trickle_bytes * args.trickle_delay
+    sessions_per_client = int(args.duration / upload_time) + 2
+
+    with env.test_database():
+        user = get_user_model().objects.create_user(
+            email="bench@example.com", username="bench", password="benchmark-password"
+        )
+        album = Album.objects.create(name="bench", owner=user)
+        Photo.objects.bulk_create(
+            Photo(description=f"photo {i}", album=album, owner=user, photo="b.jpg")
+            for i in range(args.photos)
+        )
+        token = make_token(user, ACCESS)
+
+        print(
+            f"{'mode':>6} {'feed req/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'uploads':>8}"
+        )
+        for mode in MODES:
+            sessions = [
+                str(
+                    start_upload(
+                        owner=user,
+                        album=album,
+                        description="slow",
+                        filename="slow.jpg",
+                        size=args.upload_size,
+                    ).id
+                )
+                for _ in range(sessions_per_client * args.slow_clients)
+            ]
+            port = env.free_port()
+            app, options = MODES[mode]
+            server = env.start_gunicorn(
+                app, port, args.workers, options, {"QUERY_BUDGET_HEADERS": "0"}
+            )
+            try:
+                latencies, uploads = asyncio.run(load(port, token, sessions, args))
+            finally:
+                env.stop_server(server)
+            latencies.sort()
+            p50 = statistics.median(latencies) * 1000
+            p99 = latencies[int(len(latencies) * 0.99)] * 1000
+            rps = len(latencies) / args.duration
+            print(f"{mode:>6} {rps:>11.1f} {p50:>8.1f} {p99:>8.1f} {uploads:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Compare API throughput under Basic and signed Bearer token authentication.
+
+    python -m benchmarks.auth --requests 50
+"""
+import argparse
+import base64
+import time
+
+from . import env
+
+PASSWORD = "benchmark-password"
+
+
+def measure(client, path, authorization, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path, HTTP_AUTHORIZATION=authorization)
+        assert response.status_code == 200, response.status_code
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--path", default="/api/user/me/")
+    args = parser.parse_args()
+
+    env.setup()
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+
+    from api.authentication import ACCESS, make_token
+
+    with env.test_database():
+        user = get_user_model().objects.create_user(
+            email="bench@example.com", username="bench", password=PASSWORD
+        )
+        credentials = base64.b64encode(f"{user.email}:{PASSWORD}".encode()).decode()
+        modes = {
+            "basic": f"Basic {credentials}",
+            "bearer": f"Bearer {make_token(user, ACCESS)}",
+        }
+        client = Client()
+        results = {
+            mode: measure(client, args.path, authorization, args.requests)
+            for mode, authorization in modes.items()
+        }
+
+    for mode, rps in results.items():
+        print(f"{mode:>8}: {rps:10.1f} req/s")
+    print(f"{'speedup':>8}: {results['bearer'] / results['basic']:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
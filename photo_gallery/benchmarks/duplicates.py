@@ -0,0 +1,106 @@
+"""
+Compare near-duplicate lookup through the chunk indexes with a linear scan.
+
+    python -m benchmarks.duplicates --sizes 10000 100000 1000000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from . import env
+
+BATCH = 10000
+
+
+def populate(user, album, start, stop, rng):
+    from gallery.duplicates import chunk_fields, to_signed
+    from gallery.models import Photo, PhotoHash
+
+    hashes = []
+    for offset in range(start, stop, BATCH):
+        last_id = Photo.objects.order_by("-id").values_list("id", flat=True).first()
+        Photo.objects.bulk_create(
+            Photo(description="", album=album, owner=user, photo="bench.jpg")
+            for _ in range(min(BATCH, stop - offset))
+        )
+        # Not every database returns the ids of bulk-inserted rows.
+        photo_ids = list(
+            Photo.objects.filter(id__gt=last_id or 0)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        values = [rng.getrandbits(64) for _ in photo_ids]
+        PhotoHash.objects.bulk_create(
+            PhotoHash(
+                photo_id=photo_id,
+                owner=user,
+                value=to_signed(value),
+                **chunk_fields(value),
+            )
+            for photo_id, value in zip(photo_ids, values)
+        )
+        hashes += values
+    return hashes
+
+
+def near(value, rng, bits=3):
+    for bit in rng.sample(range(64), bits):
+        value ^= 1 << bit
+    return value
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def linear_scan(hashes, value, max_distance):
+    return [h for h in hashes if bin(h ^ value).count("1") <= max_distance]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10000, 100000, 1000000]
+    )
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--distance", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    env.setup()
+    from django.contrib.auth import get_user_model
+
+    from gallery.duplicates import find_similar
+    from gallery.models import Album
+
+    rng = random.Random(args.seed)
+    with env.test_database():
+        user = get_user_model().objects.create_user(
+            email="bench@example.com", username="bench", password="benchmark-password"
+        )
+        album = Album.objects.create(name="bench", owner=user)
+        hashes = []
+        print(f"{'hashes':>10} {'index ms':>10} {'scan ms':>10} {'speedup':>8}")
+        for size in sorted(args.sizes):
+            hashes += populate(user, album, len(hashes), size, rng)
+            queries = [near(rng.choice(hashes), rng) for _ in range(args.queries)]
+            index_times, scan_times = [], []
+            for value in queries:
+                elapsed, found = timed(find_similar, user.id, value, args.distance)
+                index_times.append(elapsed)
+                elapsed, expected = timed(linear_scan, hashes, value, args.distance)
+                scan_times.append(elapsed)
+                assert len(found) == len(expected), (found, expected)
+            index_ms = statistics.median(index_times) * 1000
+            scan_ms = statistics.median(scan_times) * 1000
+            print(
+                f"{size:>10} {index_ms:>10.2f} {scan_ms:>10.2f} "
+                f"{scan_ms / index_ms:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
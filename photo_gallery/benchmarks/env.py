@@ -0,0 +1,78 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import django
+
+
+def setup():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """Run the block against a freshly migrated throwaway database."""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def use_file_database():
+    """Keep a SQLite test database in a file, which other processes can open."""
+    from django.db import connection
+
+    if connection.vendor == "sqlite":
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(
+            tempfile.mkdtemp(), "benchmark.sqlite3"
+        )
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(app, port, workers, options=(), environ=None):
+    """Serve ``app`` on ``port`` from the test database; returns the process."""
+    from django.db import connection
+
+    command = [sys.executable, "-m", "gunicorn", app, *options]
+    command += ["--workers", str(workers), "--bind", f"127.0.0.1:{port}"]
+    environ = {
+        **os.environ,
+        "SQL_DATABASE": connection.settings_dict["NAME"],
+        "DEBUG": "0",
+        **(environ or {}),
+    }
+    server = subprocess.Popen(command, env=environ, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"gunicorn {app} didn't start.")
+
+
+def stop_server(server):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(10)
+    except subprocess.TimeoutExpired:
+        server.kill()
@@ -0,0 +1,535 @@
+"""
+Load-test every route of the API and compare the results with a baseline.
+
+    python -m benchmarks.load --users 100 --photos 5000 --concurrency 8 \
+        --output results.json --baseline baseline.json
+
+Seeds a throwaway database with ``seed_gallery``, then sends ``--requests``
+requests to each route of ``api.urls`` from ``--concurrency`` threads, through
+the WSGI app in this process or a local gunicorn (``--server gunicorn``).
+Records latency percentiles, throughput, queries per request (from the
+``X-Query-Count`` header) and the peak RSS of the serving processes, writes
+them as JSON and lists the routes that got slower, or ran more queries, than
+in the baseline. Exits with status 1 if there are any. Writes on SQLite
+contend for one lock, so compare numbers taken on PostgreSQL.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from urllib.parse import urlencode
+
+from . import env
+
+Request = namedtuple(
+    "Request",
+    "method path body content_type auth status headers",
+    defaults=(b"", None, "user", 200, ()),
+)
+
+
+def url(name, params=None, **kwargs):
+    from django.urls import reverse
+
+    path = reverse(f"v1:{name}", kwargs=kwargs)
+    return f"{path}?{urlencode(params)}" if params else path
+
+
+def get(name, params=None, **kwargs):
+    return Request("GET", url(name, params, **kwargs))
+
+
+def post(path, data, auth="user", status=201):
+    return Request(
+        "POST", path, json.dumps(data).encode(), "application/json", auth, status
+    )
+
+
+def cycle(items, i):
+    # Fewer prepared objects than requests: the extra requests fail and count
+    # as errors, rather than hiding the shortfall.
+    return items[i] if i < len(items) else items[-1]
+
+
+# Route name -> request number -> Request.
+ROUTES = {
+    "signup": lambda ctx, i: post(
+        url("signup"),
+        {
+            "email": f"load{i}@example.com",
+            "username": f"load{i}",
+            "password": ctx.password,
+        },
+        auth=None,
+    ),
+    "token": lambda ctx, i: post(
+        url("token"), {"email": ctx.user.email, "password": ctx.password}, None, 200
+    ),
+    "token_refresh": lambda ctx, i: post(
+        url("token_refresh"), {"refresh": ctx.refresh}, None, 200
+    ),
+    "albums": lambda ctx, i: get("albums"),
+    "album": lambda ctx, i: get("album", pk=ctx.album_id),
+    "photos": lambda ctx, i: get("photos"),
+    "photo_months": lambda ctx, i: get("photo_months"),
+    "photo_duplicates": lambda ctx, i: get("photo_duplicates"),
+    "photo": lambda ctx, i: get("photo", pk=ctx.photo_id),
+    "photo_file": lambda ctx, i: get("photo_file", pk=ctx.photo_id),
+    "photo_transform": lambda ctx, i: get(
+        "photo_transform", {"width": 320}, pk=ctx.photo_id
+    ),
+    "photo_rendition_file": lambda ctx, i: get(
+        "photo_rendition_file", pk=ctx.photo_id, **ctx.rendition
+    ),
+    "uploads": lambda ctx, i: post(
+        url("uploads"),
+        {
+            "album": ctx.album_id,
+            "description": "load",
+            "filename": "load.jpg",
+            "size": len(ctx.image),
+        },
+    ),
+    "upload": lambda ctx, i: Request(
+        "PATCH",
+        url("upload", pk=cycle(ctx.sessions, i)),
+        ctx.image,
+        "application/offset+octet-stream",
+        status=204,
+        headers=(("Upload-Offset", "0"),),
+    ),
+    "upload_finish": lambda ctx, i: Request(
+        "POST", url("upload_finish", pk=cycle(ctx.uploaded, i)), status=201
+    ),
+    "direct_uploads": lambda ctx, i: post(
+        url("direct_uploads"), ctx.direct_upload, status=200 if ctx.direct else 404
+    ),
+    "direct_upload_confirm": lambda ctx, i: post(
+        url("direct_upload_confirm"),
+        {"token": cycle(ctx.confirms, i)},
+        status=201 if ctx.direct else 404,
+    ),
+    "user_photos": lambda ctx, i: get("user_photos", user_pk=ctx.user.pk),
+    "user_photo_months": lambda ctx, i: get("user_photo_months", user_pk=ctx.user.pk),
+    "user_albums": lambda ctx, i: get("user_albums", user_pk=ctx.user.pk),
+    "user_bookmarks": lambda ctx, i: get("user_bookmarks", user_pk=ctx.user.pk),
+    "photo_comments": lambda ctx, i: get("photo_comments", photo_pk=ctx.popular_id),
+    "comment_delete": lambda ctx, i: Request(
+        "DELETE", url("comment_delete", pk=cycle(ctx.comments, i)), status=204
+    ),
+    "bookmark": lambda ctx, i: post(
+        url("bookmark", photo_pk=cycle(ctx.targets, i)),
+        {"photo": cycle(ctx.targets, i)},
+    ),
+    "bookmarks": lambda ctx, i: get("bookmarks"),
+    "bookmark_delete": lambda ctx, i: Request(
+        "DELETE", url("bookmark_delete", pk=cycle(ctx.bookmarks, i)), status=204
+    ),
+    "feed": lambda ctx, i: get("feed"),
+    "search": lambda ctx, i: get("search", {"q": ctx.word}),
+    "map": lambda ctx, i: get("map", {"bbox": "-180,-90,180,90", "zoom": 2}),
+    "user": lambda ctx, i: get("user"),
+    "user_id": lambda ctx, i: get("user_id", pk=ctx.other_user_id),
+    "cache_stats": lambda ctx, i: Request("GET", url("cache_stats"), auth="admin"),
+    "deletion": lambda ctx, i: Request(
+        "GET", url("deletion", pk=ctx.deletion_id), auth=None
+    ),
+}
+
+
+class Context:
+    """The seeded objects the requests refer to, prepared for ``count`` each."""
+
+    def __init__(self, count, password):
+        import hashlib
+        import random
+
+        from django.contrib.auth import get_user_model
+        from django.core import signing
+        from django.db.models import Count
+
+        from api.authentication import ACCESS, REFRESH, make_token
+        from gallery.management.commands.seed_gallery import make_image
+        from gallery.deletion import tombstone
+        from gallery.models import Album, Bookmark, Comment, Photo
+        from gallery.renditions import generate_renditions
+        from gallery.uploads import (
+            DIRECT_UPLOAD_SALT,
+            direct_uploads_enabled,
+            presign_upload,
+            start_upload,
+            write_chunk,
+        )
+
+        User = get_user_model()
+        self.password = password
+        # The most active user, as the heaviest pages are theirs.
+        self.user = (
+            User.objects.filter(is_superuser=False)
+            .annotate(photos=Count("photo"))
+            .order_by("-photos", "pk")
+            .first()
+        )
+        admin = User.objects.create_user(
+            email="load-admin@example.com",
+            username="load-admin",
+            password=password,
+            is_staff=True,
+        )
+        self.tokens = {
+            "user": make_token(self.user, ACCESS),
+            "admin": make_token(admin, ACCESS),
+        }
+        self.refresh = make_token(self.user, REFRESH)
+        self.other_user_id = User.objects.exclude(pk=self.user.pk).first().pk
+
+        photos = Photo.objects.filter(owner=self.user)
+        photo = photos.order_by("-pk").first()
+        self.photo_id = photo.pk
+        self.album_id = photo.album_id
+        self.word = photo.description.split()[0]
+        rendition = generate_renditions(photo)[-1]
+        self.rendition = {"size": rendition.size, "format": rendition.format}
+        self.popular_id = (
+            Photo.objects.order_by("-comment_count", "pk")
+            .values_list("pk", flat=True)
+            .first()
+        )
+
+        targets = list(
+            Photo.objects.exclude(owner=self.user)
+            .exclude(comment__owner=self.user)
+            .exclude(bookmark__owner=self.user)
+            .order_by("pk")
+            .values_list("pk", flat=True)[: 2 * count]
+        )
+        self.targets = targets[:count]
+        self.comments = [
+            Comment.objects.create(owner=self.user, photo_id=pk, text="load").pk
+            for pk in targets[:count]
+        ]
+        self.bookmarks = [
+            Bookmark.objects.create(owner=self.user, photo_id=pk).pk
+            for pk in targets[count:]
+        ]
+
+        self.image = make_image(random.Random(0))
+        fields = {
+            "owner": self.user,
+            "album_id": self.album_id,
+            "description": "load",
+            "filename": "load.jpg",
+            "size": len(self.image),
+        }
+        self.sessions = [start_upload(**fields).pk for _ in range(count)]
+        self.uploaded = []
+        for _ in range(count):
+            session = start_upload(**fields)
+            write_chunk(session, 0, io.BytesIO(self.image), len(self.image))
+            self.uploaded.append(session.pk)
+
+        # Direct uploads answer 404 unless the photos are in an object store.
+        self.direct = direct_uploads_enabled()
+        self.direct_upload = {
+            "album": self.album_id,
+            "description": "load",
+            "filename": "load.jpg",
+            "size": len(self.image),
+            "content_type": "image/jpeg",
+            "sha256": hashlib.sha256(self.image).hexdigest(),
+        }
+        self.confirms = [""]
+        if self.direct:
+            storage = Photo._meta.get_field("photo").storage
+            fields = {
+                **self.direct_upload,
+                "album": Album.objects.get(pk=self.album_id),
+            }
+            self.confirms = []
+            for _ in range(count):
+                upload = presign_upload(self.user, **fields)
+                key = signing.loads(upload["token"], salt=DIRECT_UPLOAD_SALT)["key"]
+                storage.client.call(
+                    "PUT",
+                    key,
+                    headers=upload["headers"],
+                    body=self.image,
+                    payload=self.direct_upload["sha256"],
+                )
+                self.confirms.append(upload["token"])
+
+        album = Album.objects.create(owner=self.user, name="load")
+        self.deletion_id = tombstone(album).pk
+
+
+class WSGIClient:
+    """Calls the WSGI app in this process, as a WSGI server would."""
+
+    def __init__(self):
+        from django.core.wsgi import get_wsgi_application
+
+        self.app = get_wsgi_application()
+
+    def send(self, method, path, body, headers):
+        path, _, query = path.partition("?")
+        environ = {
+            "REQUEST_METHOD": method,
+            "PATH_INFO": path,
+            "QUERY_STRING": query,
+            "SERVER_NAME": "127.0.0.1",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in headers.items():
+            key = name.upper().replace("-", "_")
+            if key != "CONTENT_TYPE":
+                key = f"HTTP_{key}"
+            environ[key] = value
+        started = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            started["status"] = int(status.split()[0])
+            started["headers"] = dict(response_headers)
+
+        response = self.app(environ, start_response)
+        try:
+            for _ in response:
+                pass
+        finally:
+            response.close()
+        return started["status"], started["headers"]
+
+
+class HTTPClient:
+    """Sends requests to a local server, over a connection per thread."""
+
+    def __init__(self, port):
+        self.port = port
+        self.local = threading.local()
+
+    def send(self, method, path, body, headers):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.local.connection = HTTPConnection("127.0.0.1", self.port)
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status, dict(response.getheaders())
+
+
+def peak_rss(pid):
+    """Peak RSS in KiB of a process or of its largest child (Linux only)."""
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    peaks = []
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                peaks += [
+                    int(line.split()[1]) for line in f if line.startswith("VmHWM")
+                ]
+        except OSError:
+            continue
+    return max(peaks, default=None)
+
+
+def percentile(values, q):
+    # Nearest rank over sorted values.
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def run_route(client, ctx, spec, count, concurrency, pid):
+    requests = [spec(ctx, i) for i in range(count)]
+
+    def send(request):
+        headers = dict(request.headers)
+        if request.auth:
+            headers["Authorization"] = f"Bearer {ctx.tokens[request.auth]}"
+        if request.content_type:
+            headers["Content-Type"] = request.content_type
+        start = time.perf_counter()
+        status, response_headers = client.send(
+            request.method, request.path, request.body, headers
+        )
+        elapsed = time.perf_counter() - start
+        queries = response_headers.get("X-Query-Count")
+        return elapsed, status == request.status, queries
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(send, requests))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(elapsed * 1000 for elapsed, _, _ in results)
+    queries = [int(n) for _, _, n in results if n is not None]
+    return {
+        "method": requests[0].method,
+        "requests": count,
+        "errors": sum(not ok for _, ok, _ in results),
+        "throughput": count / wall,
+        "p50_ms": percentile(latencies, 0.5),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "queries": sum(queries) / len(queries) if queries else None,
+        "peak_rss_kib": peak_rss(pid),
+    }
+
+
+def compare(routes, baseline, tolerance):
+    """Describe the routes that regressed from the baseline."""
+    regressions = []
+    for name, current in routes.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {before['p95_ms']:.1f} -> {current['p95_ms']:.1f} ms"
+            )
+        # Half a query more per request on average, e.g. a new N+1.
+        if (current["queries"] or 0) >= (before["queries"] or 0) + 0.5:
+            regressions.append(
+                f"{name}: {before['queries']:.1f} -> {current['queries']:.1f} queries"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--photos", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=100, help="Per route.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--server", choices=("wsgi", "gunicorn"), default="wsgi")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers.")
+    parser.add_argument("--routes", nargs="*", help="Route names, default all.")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", help="A results file to compare with.")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed p95 slowdown from the baseline, as a fraction.",
+    )
+    args = parser.parse_args()
+
+    env.setup()
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+
+    from api.urls import urlpatterns
+    from gallery.management.commands.seed_gallery import PASSWORD
+
+    names = [pattern.name for pattern in urlpatterns]
+    missing = [name for name in names if name not in ROUTES]
+    if missing:
+        sys.exit(f"No requests defined for: {', '.join(missing)}")
+    if args.routes:
+        names = [name for name in names if name in args.routes]
+
+    settings.QUERY_BUDGET_HEADERS = True
+    env.use_file_database()
+    routes = {}
+    with env.test_database():
+        call_command(
+            "seed_gallery",
+            users=args.users,
+            photos=args.photos,
+            seed=args.seed,
+            stdout=io.StringIO(),
+        )
+        ctx = Context(args.requests, PASSWORD)
+        server = None
+        if args.server == "gunicorn":
+            port = env.free_port()
+            server = env.start_gunicorn(
+                "core.wsgi:application",
+                port,
+                args.workers,
+                environ={"QUERY_BUDGET_HEADERS": "1"},
+            )
+            client, pid = HTTPClient(port), server.pid
+        else:
+            client, pid = WSGIClient(), os.getpid()
+
+        print(
+            f"{'route':<22} {'method':<7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'queries':>8} {'errors':>7}"
+        )
+        try:
+            for name in names:
+                result = run_route(
+                    client, ctx, ROUTES[name], args.requests, args.concurrency, pid
+                )
+                routes[name] = result
+                queries = result["queries"]
+                print(
+                    f"{name:<22} {result['method']:<7} {result['throughput']:>8.1f} "
+                    f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} "
+                    f"{result['p99_ms']:>8.1f} "
+                    f"{'-' if queries is None else f'{queries:.1f}':>8} "
+                    f"{result['errors']:>7}"
+                )
+        finally:
+            if server is not None:
+                env.stop_server(server)
+        vendor = connection.vendor
+
+    peak = max((r["peak_rss_kib"] or 0 for r in routes.values()), default=0)
+    print(f"Peak RSS: {peak / 1024:.0f} MiB")
+    results = {
+        "meta": {
+            "server": args.server,
+            "workers": args.workers if args.server == "gunicorn" else None,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "users": args.users,
+            "photos": args.photos,
+            "seed": args.seed,
+            "database": vendor,
+            "python": platform.python_version(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "routes": routes,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for key in ("server", "workers", "concurrency", "requests", "database"):
+            if baseline["meta"].get(key) != results["meta"][key]:
+                print(f"The baseline was taken with a different {key}.")
+        regressions = compare(routes, baseline["routes"], args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions from {args.baseline}.")
+
+
+if __name__ == "__main__":
+    main()
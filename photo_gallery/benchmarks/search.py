@@ -0,0 +1,113 @@
+"""
+Time full-text search over a synthetic corpus of photo descriptions.
+
+    python -m benchmarks.search --rows 1000000 --queries 50
+"""
+import argparse
+import random
+import statistics
+import time
+from itertools import accumulate
+
+from . import env
+
+VOCABULARY = 5000
+WORDS_PER_DESCRIPTION = 12
+BATCH = 10000
+
+
+def words():
+    # Roughly Zipf-distributed, like natural text: a few words are in most
+    # descriptions and most words are rare.
+    vocabulary = [f"word{i}" for i in range(VOCABULARY)]
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(VOCABULARY)))
+    return vocabulary, cum_weights
+
+
+def populate(rows, seed):
+    from django.contrib.auth import get_user_model
+
+    from gallery.models import Album, Photo
+    from gallery.search import rebuild_index
+
+    rng = random.Random(seed)
+    vocabulary, cum_weights = words()
+    user = get_user_model().objects.create_user(
+        email="bench@example.com", username="bench", password="benchmark-password"
+    )
+    album = Album.objects.create(name="bench", owner=user)
+
+    start = time.perf_counter()
+    for offset in range(0, rows, BATCH):
+        # bulk_create sends no signals, so the index is built afterwards.
+        Photo.objects.bulk_create(
+            Photo(
+                description=" ".join(
+                    rng.choices(
+                        vocabulary, cum_weights=cum_weights, k=WORDS_PER_DESCRIPTION
+                    )
+                ),
+                album=album,
+                owner=user,
+                photo="bench.jpg",
+            )
+            for _ in range(min(BATCH, rows - offset))
+        )
+    inserted = time.perf_counter() - start
+
+    start = time.perf_counter()
+    photo_ids = Photo.objects.order_by("id").values_list("id", flat=True)
+    rebuild_index(photo_ids.iterator(), chunk_size=BATCH)
+    return inserted, time.perf_counter() - start
+
+
+def measure(terms, queries, pages):
+    from gallery.search import search_photos
+
+    timings = []
+    for _ in range(queries):
+        after = None
+        for _ in range(pages):
+            start = time.perf_counter()
+            hits = search_photos(terms, after, limit=20)
+            timings.append(time.perf_counter() - start)
+            if not hits:
+                break
+            photo_id, rank = hits[-1]
+            after = (rank, photo_id)
+    timings.sort()
+    return (
+        statistics.median(timings) * 1000,
+        timings[int(len(timings) * 0.95)] * 1000,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    env.setup()
+    from django.db import connection
+
+    cases = {
+        "common": ["word0"],
+        "medium": ["word50"],
+        "rare": ["word4000"],
+        "two words": ["word1", "word2"],
+    }
+    with env.test_database():
+        inserted, indexed = populate(args.rows, args.seed)
+        print(f"{connection.vendor}, {args.rows} photos")
+        print(f"{'insert':>10}: {inserted:10.1f} s")
+        print(f"{'index':>10}: {indexed:10.1f} s")
+        for name, terms in cases.items():
+            median, p95 = measure(terms, args.queries, args.pages)
+            print(f"{name:>10}: {median:8.2f} ms median, {p95:8.2f} ms p95 per page")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@
 ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Run it with uvicorn workers, e.g.
+``gunicorn core.asgi:application -k uvicorn.workers.UvicornWorker``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
@@ -9,8 +11,12 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+os.environ.setdefault("API_ASYNC_VIEWS", "1")
+django.setup(set_prefix=False)
 
-application = get_asgi_application()
+from api.asynchronous import ASGIHandler  # noqa: E402
+
+application = ASGIHandler()
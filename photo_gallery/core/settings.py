@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -41,19 +41,31 @@ INSTALLED_APPS = [
     "users",
     "api",
     "gallery",
+    "tasks",
 ]
 
 MIDDLEWARE = [
+    "api.middleware.QueryBudgetMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "api.middleware.ReplicaMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# The ASGI deployment (core.asgi) routes the hot API endpoints to their async
+# variants, run on a pool of API_ASYNC_THREADS threads (see api.asynchronous).
+# WhiteNoise is sync-only and would hold every request to Django's single
+# sync thread there, so nginx serves the static files instead.
+API_ASYNC_VIEWS = config("API_ASYNC_VIEWS", cast=bool, default=False)
+API_ASYNC_THREADS = config("API_ASYNC_THREADS", cast=int, default=16)
+if API_ASYNC_VIEWS:
+    MIDDLEWARE.remove("whitenoise.middleware.WhiteNoiseMiddleware")
+
 AUTH_USER_MODEL = "users.User"
 ROOT_URLCONF = "core.urls"
 
@@ -93,8 +105,36 @@ DATABASES = {
         "PASSWORD": config("SQL_PASSWORD", default=None),
         "HOST": config("SQL_HOST", default=None),
         "PORT": config("SQL_PORT", cast=int, default=0),
+        # Persistent connections, reused for this many seconds.
+        "CONN_MAX_AGE": config("SQL_CONN_MAX_AGE", cast=int, default=60),
     }
 }
+# Seconds between checks that a persistent connection still works, made
+# before a request uses it (see api.routers.check_connections).
+SQL_HEALTH_CHECK_INTERVAL = config("SQL_HEALTH_CHECK_INTERVAL", cast=int, default=10)
+
+# Read replicas (see api/routers.py), with the primary's engine, name and
+# credentials: "host[:port]" entries, or database files for SQLite.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(config("SQL_REPLICAS", cast=Csv(), default=""), 1):
+    if DATABASES["default"]["ENGINE"].endswith("sqlite3"):
+        location = {"NAME": replica}
+    else:
+        host, _, port = replica.partition(":")
+        location = {"HOST": host, "PORT": int(port or DATABASES["default"]["PORT"])}
+    alias = f"replica{number}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        **location,
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ["api.routers.ReplicaRouter"]
+# Clients read from the primary for this many seconds after they write, so
+# they see their writes; replicas lagging further behind are skipped. Pins
+# live in the default cache, which must be shared by all processes.
+REPLICA_PIN_SECONDS = config("REPLICA_PIN_SECONDS", cast=int, default=5)
+REPLICA_LAG_CHECK_INTERVAL = config("REPLICA_LAG_CHECK_INTERVAL", cast=int, default=2)
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -142,6 +182,105 @@ STATICFILES_DIRS = (BASE_DIR.joinpath("static"),)
 MEDIA_URL = "/media/"
 MEDIA_ROOT = str(BASE_DIR.joinpath("media"))
 
+# Downscaled copies of every uploaded photo, longest side in pixels.
+PHOTO_RENDITION_SIZES = (160, 640, 1280)
+PHOTO_RENDITION_FORMATS = ("jpeg", "webp")
+PHOTO_RENDITION_QUALITY = config("PHOTO_RENDITION_QUALITY", cast=int, default=82)
+
+# Largest Hamming distance between the perceptual hashes of two photos for
+# them to count as near-duplicates (see gallery.duplicates).
+PHOTO_DUPLICATE_DISTANCE = config("PHOTO_DUPLICATE_DISTANCE", cast=int, default=6)
+
+# On-demand transforms (/media/t/..., see gallery.transforms): the largest
+# width or height that can be asked for, and the cache size in bytes.
+PHOTO_TRANSFORM_MAX_SIZE = config("PHOTO_TRANSFORM_MAX_SIZE", cast=int, default=2560)
+PHOTO_TRANSFORM_CACHE_SIZE = config(
+    "PHOTO_TRANSFORM_CACHE_SIZE", cast=int, default=1024 * 1024 * 1024
+)
+
+# Resumable uploads (/api/uploads/), sizes in bytes and TTL in seconds.
+UPLOAD_MAX_SIZE = config("UPLOAD_MAX_SIZE", cast=int, default=100 * 1024 * 1024)
+UPLOAD_CHUNK_MAX_SIZE = config(
+    "UPLOAD_CHUNK_MAX_SIZE", cast=int, default=8 * 1024 * 1024
+)
+UPLOAD_SESSION_TTL = config("UPLOAD_SESSION_TTL", cast=int, default=24 * 60 * 60)
+
+# Where the photo files live: content-addressed under MEDIA_ROOT by default,
+# or "gallery.s3.S3Storage" for an S3-compatible object store (AWS S3, MinIO),
+# which clients can also upload to directly (/api/uploads/direct/). Renditions
+# and transforms stay under MEDIA_ROOT. Presigned URLs expire after
+# S3_URL_EXPIRES seconds.
+PHOTO_STORAGE = config(
+    "PHOTO_STORAGE", default="gallery.storage.ContentAddressedStorage"
+)
+S3_ENDPOINT_URL = config("S3_ENDPOINT_URL", default="https://s3.amazonaws.com")
+S3_BUCKET = config("S3_BUCKET", default="")
+S3_REGION = config("S3_REGION", default="us-east-1")
+S3_ACCESS_KEY_ID = config("S3_ACCESS_KEY_ID", default="")
+S3_SECRET_ACCESS_KEY = config("S3_SECRET_ACCESS_KEY", default="")
+S3_URL_EXPIRES = config("S3_URL_EXPIRES", cast=int, default=15 * 60)
+S3_TIMEOUT = config("S3_TIMEOUT", cast=float, default=30)
+
+# Prefix of the internal nginx location that serves MEDIA_ROOT. When set,
+# /api/photo/<id>/file/ answers with X-Accel-Redirect instead of the bytes.
+MEDIA_ACCEL_REDIRECT = config("MEDIA_ACCEL_REDIRECT", default="")
+
+# Seconds an unreferenced photo blob must sit untouched before it is deleted,
+# so an upload that was just deduplicated onto it can still claim it.
+MEDIA_BLOB_GRACE_PERIOD = config("MEDIA_BLOB_GRACE_PERIOD", cast=int, default=300)
+
+# Albums and accounts with at least this many photos, comments and bookmarks
+# are hidden at once and deleted by a job (see gallery.deletion), in chunks
+# of DELETION_CHUNK_SIZE rows, pausing DELETION_CHUNK_PAUSE seconds between
+# chunks and handing over to a new job every DELETION_JOB_SECONDS.
+DELETION_ASYNC_THRESHOLD = config("DELETION_ASYNC_THRESHOLD", cast=int, default=500)
+DELETION_CHUNK_SIZE = config("DELETION_CHUNK_SIZE", cast=int, default=500)
+DELETION_CHUNK_PAUSE = config("DELETION_CHUNK_PAUSE", cast=float, default=0.1)
+DELETION_JOB_SECONDS = config("DELETION_JOB_SECONDS", cast=int, default=60)
+
+# Background jobs (see "manage.py runworker"). With TASKS_EAGER jobs run
+# inline when queued, which is handy for development without a worker.
+TASKS_EAGER = config("TASKS_EAGER", cast=bool, default=False)
+TASKS_CONCURRENCY = config("TASKS_CONCURRENCY", cast=int, default=2)
+TASKS_POLL_INTERVAL = config("TASKS_POLL_INTERVAL", cast=float, default=1.0)
+TASKS_MAX_ATTEMPTS = config("TASKS_MAX_ATTEMPTS", cast=int, default=5)
+TASKS_RETRY_BACKOFF = config("TASKS_RETRY_BACKOFF", cast=int, default=10)
+TASKS_RETRY_BACKOFF_MAX = config("TASKS_RETRY_BACKOFF_MAX", cast=int, default=3600)
+TASKS_LOCK_TIMEOUT = config("TASKS_LOCK_TIMEOUT", cast=int, default=600)
+
+# Per-request query counts (see api/middleware.py). Headers are for debugging;
+# strict mode turns exceeding a view's query_budget into an error.
+QUERY_BUDGET_HEADERS = config("QUERY_BUDGET_HEADERS", cast=bool, default=DEBUG)
+QUERY_BUDGET_STRICT = config("QUERY_BUDGET_STRICT", cast=bool, default=False)
+
+# The default cache holds what all processes must agree on, token revocation
+# versions (api.authentication) and read-your-writes pins (api.routers), so
+# with more than one gunicorn worker (WEB_CONCURRENCY, which gunicorn reads
+# too) CACHE_LOCATION must name a memcached server; the checks in api/checks.py
+# refuse the per-process default then. "api" holds serialized API payloads
+# keyed by version stamps (see api/cache.py).
+WEB_CONCURRENCY = config("WEB_CONCURRENCY", cast=int, default=1)
+CACHE_LOCATION = config("CACHE_LOCATION", default="")
+CACHES = {
+    "default": (
+        {
+            "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+            "LOCATION": CACHE_LOCATION,
+        }
+        if CACHE_LOCATION
+        else {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    ),
+    "api": {
+        "BACKEND": "api.cache.LocMemCache",
+        "LOCATION": "api",
+        "TIMEOUT": config("API_CACHE_TIMEOUT", cast=int, default=600),
+        "OPTIONS": {
+            "MAX_ENTRIES": config("API_CACHE_MAX_ENTRIES", cast=int, default=5000),
+            "CULL_FREQUENCY": 10,
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -155,12 +294,25 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_SCHEMA_CLASS": "rest_framework.schemas.coreapi.AutoSchema",
     "DEFAULT_AUTHENTICATION_CLASSES": (
+        "api.authentication.TokenAuthentication",
         "rest_framework.authentication.BasicAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ),
     "DEFAULT_VERSIONING_CLASS": "rest_framework.versioning.NamespaceVersioning",
+    "DEFAULT_PAGINATION_CLASS": "api.pagination.KeysetPagination",
+    "PAGE_SIZE": 20,
 }
 
+# Signed bearer tokens issued by /api/token/ (lifetimes in seconds).
+AUTH_TOKEN_ACCESS_LIFETIME = config("AUTH_TOKEN_ACCESS_LIFETIME", cast=int, default=300)
+AUTH_TOKEN_REFRESH_LIFETIME = config(
+    "AUTH_TOKEN_REFRESH_LIFETIME", cast=int, default=7 * 24 * 60 * 60
+)
+AUTH_TOKEN_USER_CACHE_SIZE = config(
+    "AUTH_TOKEN_USER_CACHE_SIZE", cast=int, default=1024
+)
+AUTH_TOKEN_USER_CACHE_TTL = config("AUTH_TOKEN_USER_CACHE_TTL", cast=int, default=60)
+
 SWAGGER_SETTINGS = {
     "api_version": "1",
     "is_authenticated": False,
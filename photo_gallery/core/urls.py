@@ -1,13 +1,12 @@
 from django.contrib import admin
 from django.urls import path, include, re_path
-from django.conf import settings
-from django.conf.urls.static import static
 
 from rest_framework import permissions
 
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from api.views import TransformApi
 
 urlpatterns_api = [
     path("api/", include("api.urls", namespace="v1")),
@@ -38,7 +37,9 @@ urlpatterns = urlpatterns_api + [
     path("redoc/", schema_view.with_ui("redoc", cache_timeout=0), name="schema-redoc"),
     path("admin/", admin.site.urls),
     path("api-auth/", include("rest_framework.urls", namespace="rest_framework")),
+    path(
+        "media/t/<int:pk>/<str:signature>/<str:params>.<str:extension>",
+        TransformApi.as_view(),
+        name="transform",
+    ),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
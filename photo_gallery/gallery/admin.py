@@ -1,18 +1,56 @@
 from django.contrib import admin
 
-from .models import Album, Photo, Comment, Bookmark
+from .deletion import is_large, tombstone
+from .models import (
+    Album, Deletion, Photo, PhotoLocation, PhotoMetadata, Rendition, Comment,
+    Bookmark,
+)
 
 
 @admin.register(Album)
 class AlbumAdmin(admin.ModelAdmin):
     list_display = ('name', 'owner', )
 
+    def delete_model(self, request, obj):
+        # Big albums are deleted in the background, see gallery.deletion.
+        if is_large(obj):
+            tombstone(obj)
+        else:
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            self.delete_model(request, obj)
+
+
+@admin.register(Deletion)
+class DeletionAdmin(admin.ModelAdmin):
+    list_display = (
+        'kind', 'object_id', 'deleted', 'total', 'created_at', 'finished_at',
+    )
+
 
 @admin.register(Photo)
 class PhotoAdmin(admin.ModelAdmin):
     list_display = ('description', 'album', 'owner', 'photo', )
 
 
+@admin.register(PhotoMetadata)
+class PhotoMetadataAdmin(admin.ModelAdmin):
+    list_display = ('photo', 'taken_at', 'camera', 'width', 'height', )
+    list_filter = ('camera', )
+
+
+@admin.register(PhotoLocation)
+class PhotoLocationAdmin(admin.ModelAdmin):
+    list_display = ('photo', 'latitude', 'longitude', 'geohash', )
+
+
+@admin.register(Rendition)
+class RenditionAdmin(admin.ModelAdmin):
+    list_display = ('photo', 'size', 'format', 'width', 'height', )
+
+
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('photo', 'text', 'owner', )
@@ -0,0 +1,277 @@
+"""
+Deleting albums and accounts too big to delete within one request.
+
+Django's delete() collects every related row into memory and holds its locks
+until the whole cascade is done. Instead, ``tombstone()`` stamps the album or
+account ``deleted_at``, which hides it and everything in it from the API (see
+``visible()``), and queues ``gallery.purge_deletion``. That job deletes the
+rows a chunk at a time with plain DELETE statements, doing the bookkeeping of
+the skipped receivers (counters, search index, files, version stamps) once
+per chunk, and records its progress on the ``Deletion``. Photo histograms and
+map clusters keep counting the hidden photos until their chunk is deleted.
+"""
+
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from tasks.queue import enqueue
+
+from .models import (
+    Album,
+    Bookmark,
+    Comment,
+    Deletion,
+    Photo,
+    PhotoHash,
+    PhotoLocation,
+    PhotoMetadata,
+    Rendition,
+    UploadSession,
+    adjust_counters,
+    bump_versions,
+    count_month,
+    defer_deletion,
+    release_file,
+)
+from .search import index_photos, remove_photos
+
+User = get_user_model()
+
+# Lookups that hide the rows of albums and accounts being deleted.
+VISIBLE = {
+    User: {"deleted_at__isnull": True},
+    Album: {"deleted_at__isnull": True},
+    Photo: {"album__deleted_at__isnull": True, "owner__deleted_at__isnull": True},
+    Comment: {
+        "photo__album__deleted_at__isnull": True,
+        "owner__deleted_at__isnull": True,
+    },
+    Bookmark: {
+        "photo__album__deleted_at__isnull": True,
+        "owner__deleted_at__isnull": True,
+    },
+    PhotoHash: {"photo__album__deleted_at__isnull": True},
+    Rendition: {
+        "photo__album__deleted_at__isnull": True,
+        "photo__owner__deleted_at__isnull": True,
+    },
+    UploadSession: {"album__deleted_at__isnull": True},
+}
+
+
+def visible(queryset):
+    """``queryset`` without the rows of albums and accounts being deleted."""
+    return queryset.filter(**VISIBLE[queryset.model])
+
+
+def is_large(instance):
+    """Whether deleting ``instance`` should happen in the background."""
+    if isinstance(instance, Album):
+        size = instance.photo_count
+    else:
+        size = instance.photo_count + instance.comment_count + instance.bookmark_count
+    return size >= settings.DELETION_ASYNC_THRESHOLD
+
+
+def photo_lookups(deletion):
+    if deletion.kind == Deletion.ALBUM:
+        return {"album_id": deletion.object_id}
+    return {"owner_id": deletion.object_id}
+
+
+def tombstone(instance):
+    """Hide an album or account now and queue its deletion; returns the Deletion."""
+    kind = Deletion.ALBUM if isinstance(instance, Album) else Deletion.USER
+    with transaction.atomic():
+        now = timezone.now()
+        fields = ["deleted_at"]
+        if kind == Deletion.ALBUM:
+            owner_id = instance.owner_id
+        else:
+            owner_id = instance.pk
+            # Signs the user out everywhere (see api.authentication).
+            instance.is_active = False
+            fields.append("is_active")
+            Album.objects.filter(owner=instance).update(deleted_at=now)
+        instance.deleted_at = now
+        # Only these: the counters are kept by queryset updates.
+        instance.save(update_fields=fields)
+
+        deletion = Deletion(kind=kind, object_id=instance.pk)
+        totals = Photo.objects.filter(**photo_lookups(deletion)).aggregate(
+            photos=Count("pk"), reactions=Sum(F("comment_count") + F("bookmark_count"))
+        )
+        deletion.total = totals["photos"] + (totals["reactions"] or 0)
+        if kind == Deletion.USER:
+            deletion.total += instance.comment_count + instance.bookmark_count
+        deletion.save()
+        bump_versions(
+            "deletions",
+            "albums",
+            "photos",
+            "bookmarks",
+            f"user:{owner_id}",
+            f"user:{owner_id}:albums",
+            f"user:{owner_id}:photos",
+            f"user:{owner_id}:bookmarks",
+            f"user:{owner_id}:duplicates",
+        )
+        enqueue("gallery.purge_deletion", str(deletion.pk))
+    return deletion
+
+
+def raw_delete(queryset):
+    # A single DELETE, without collecting related rows or sending signals:
+    # the callers do the receivers' work.
+    return queryset._raw_delete(queryset.db)
+
+
+def delete_reactions(queryset, chunk_size):
+    """Delete a chunk of comments or bookmarks; returns how many."""
+    model = queryset.model
+    rows = list(
+        queryset.order_by("pk").values_list("pk", "photo_id", "owner_id")[:chunk_size]
+    )
+    if not rows:
+        return 0
+    raw_delete(model.objects.filter(pk__in=[pk for pk, _, _ in rows]))
+
+    counter = f"{model._meta.model_name}_count"
+    for photo_id, count in Counter(photo_id for _, photo_id, _ in rows).items():
+        adjust_counters(Photo, photo_id, -count, counter, "score")
+    owner_ids = Counter(owner_id for _, _, owner_id in rows)
+    for owner_id, count in owner_ids.items():
+        adjust_counters(User, owner_id, -count, counter)
+
+    photo_ids = sorted({photo_id for _, photo_id, _ in rows})
+    if model is Comment:
+        # Comments are part of their photo's search document.
+        index_photos(photo_ids)
+    photo_owner_ids = Photo.objects.filter(pk__in=photo_ids).values_list(
+        "owner_id", flat=True
+    )
+    bump_versions(
+        "photos",
+        "bookmarks",
+        *(f"photo:{photo_id}" for photo_id in photo_ids),
+        *(f"photo:{photo_id}:comments" for photo_id in photo_ids),
+        *(f"user:{owner_id}:photos" for owner_id in set(photo_owner_ids)),
+        *(f"user:{owner_id}" for owner_id in owner_ids),
+        *(f"user:{owner_id}:bookmarks" for owner_id in owner_ids),
+    )
+    return len(rows)
+
+
+def delete_photos(queryset, chunk_size):
+    """
+    Delete a chunk of photos whose comments and bookmarks are already gone,
+    with their renditions, metadata, locations and hashes; returns how many.
+    """
+    rows = list(
+        queryset.order_by("pk").values_list("pk", "owner_id", "album_id", "photo")[
+            :chunk_size
+        ]
+    )
+    if not rows:
+        return 0
+    photo_ids = [pk for pk, _, _, _ in rows]
+
+    renditions = Rendition.objects.filter(photo_id__in=photo_ids)
+    defer_deletion(paths=list(renditions.values_list("file", flat=True)))
+    raw_delete(renditions)
+
+    metadata = PhotoMetadata.objects.filter(photo_id__in=photo_ids)
+    months = (
+        metadata.exclude(taken_month=None)
+        .values_list("owner_id", "taken_month")
+        .annotate(count=Count("pk"))
+        .order_by()
+    )
+    for owner_id, month, count in months:
+        count_month(owner_id, month, -count)
+    raw_delete(metadata)
+
+    # Few photos have a position, and their receivers keep the map clusters.
+    PhotoLocation.objects.filter(photo_id__in=photo_ids).delete()
+    raw_delete(PhotoHash.objects.filter(photo_id__in=photo_ids))
+    remove_photos(photo_ids)
+    raw_delete(Photo.objects.filter(pk__in=photo_ids))
+
+    owner_ids = Counter(owner_id for _, owner_id, _, _ in rows)
+    for owner_id, count in owner_ids.items():
+        adjust_counters(User, owner_id, -count, "photo_count")
+    album_ids = Counter(album_id for _, _, album_id, _ in rows)
+    for album_id, count in album_ids.items():
+        adjust_counters(Album, album_id, -count, "photo_count")
+    for name, count in Counter(name for _, _, _, name in rows).items():
+        release_file(name, count)
+    defer_deletion(photo_ids=photo_ids)
+
+    keys = ["photos", "albums", "locations"]
+    for owner_id in owner_ids:
+        keys += [
+            f"user:{owner_id}",
+            f"user:{owner_id}:photos",
+            f"user:{owner_id}:albums",
+            f"user:{owner_id}:duplicates",
+        ]
+    bump_versions(*keys, *(f"album:{album_id}" for album_id in album_ids))
+    return len(rows)
+
+
+def purge_chunk(deletion, chunk_size):
+    """Delete the next chunk of rows of ``deletion``; returns how many, 0 when done."""
+    photos = photo_lookups(deletion)
+    reactions = {f"photo__{lookup}": value for lookup, value in photos.items()}
+    querysets = [
+        (delete_reactions, Comment.objects.filter(**reactions)),
+        (delete_reactions, Bookmark.objects.filter(**reactions)),
+    ]
+    if deletion.kind == Deletion.USER:
+        querysets += [
+            (delete_reactions, Comment.objects.filter(owner_id=deletion.object_id)),
+            (delete_reactions, Bookmark.objects.filter(owner_id=deletion.object_id)),
+        ]
+    querysets.append((delete_photos, Photo.objects.filter(**photos)))
+    for delete, queryset in querysets:
+        deleted = delete(queryset, chunk_size)
+        if deleted:
+            return deleted
+    return 0
+
+
+def finish(deletion):
+    # What is left is small (upload sessions, empty albums, month counts) and
+    # goes through the receivers.
+    model = Album if deletion.kind == Deletion.ALBUM else User
+    model.objects.filter(pk=deletion.object_id).delete()
+    Deletion.objects.filter(pk=deletion.pk).update(finished_at=timezone.now())
+    bump_versions("deletions")
+
+
+def delete_chunks(deletion, seconds=None):
+    """
+    Delete chunks of ``deletion`` for about ``seconds``, pausing between them
+    so that other writers and the replicas keep up. Returns True when done.
+    """
+    if seconds is None:
+        seconds = settings.DELETION_JOB_SECONDS
+    deadline = time.monotonic() + seconds
+    while True:
+        with transaction.atomic():
+            deleted = purge_chunk(deletion, settings.DELETION_CHUNK_SIZE)
+            if not deleted:
+                finish(deletion)
+                return True
+            Deletion.objects.filter(pk=deletion.pk).update(
+                deleted=F("deleted") + deleted
+            )
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(settings.DELETION_CHUNK_PAUSE)
@@ -0,0 +1,170 @@
+"""
+Near-duplicate photos by perceptual hash.
+
+Each photo gets a 64-bit difference hash (dHash): the brightness gradients
+of a 9x8 grayscale thumbnail. Resizing, recompression and small edits flip
+only a few bits, so near-duplicates are hashes within a small Hamming
+distance of each other.
+
+Lookups use a multi-index: the hash is split into ``CHUNKS`` 16-bit chunks,
+each stored in its own indexed column. Two hashes within distance ``d``
+differ by at most ``d // CHUNKS`` bits in at least one chunk (pigeonhole),
+so probing every chunk for the values within that radius finds all the
+candidates through the indexes; only those are compared bit by bit.
+"""
+from collections import defaultdict
+from itertools import combinations
+
+from django.conf import settings
+
+from PIL import Image, ImageOps
+
+from .models import PhotoHash
+
+HASH_WIDTH, HASH_HEIGHT = 9, 8
+CHUNKS = 4
+CHUNK_BITS = 64 // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+def dhash(fp):
+    """Return the 64-bit dHash of an image file (a path or a file object)."""
+    with Image.open(fp) as image:
+        # JPEGs are decoded at the smallest DCT scale above 64 pixels.
+        image.draft("L", (64, 64))
+        image = ImageOps.exif_transpose(image).convert("L")
+        pixels = list(image.resize((HASH_WIDTH, HASH_HEIGHT), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(HASH_HEIGHT):
+        for col in range(HASH_WIDTH - 1):
+            left = pixels[row * HASH_WIDTH + col]
+            value = (value << 1) | (left > pixels[row * HASH_WIDTH + col + 1])
+    return value
+
+
+def to_signed(value):
+    # Databases have no unsigned 64-bit integers.
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def distance(a, b):
+    return bin(to_unsigned(a) ^ to_unsigned(b)).count("1")
+
+
+def split(value):
+    value = to_unsigned(value)
+    return [(value >> (CHUNK_BITS * i)) & CHUNK_MASK for i in range(CHUNKS)]
+
+
+def neighbours(chunk, radius):
+    """All chunk values within ``radius`` bits of ``chunk``."""
+    values = [chunk]
+    for flips in range(1, radius + 1):
+        for bits in combinations(range(CHUNK_BITS), flips):
+            mask = 0
+            for bit in bits:
+                mask |= 1 << bit
+            values.append(chunk ^ mask)
+    return values
+
+
+def probe(value, max_distance):
+    """Per chunk, the values a hash within ``max_distance`` must match in one."""
+    radius = max_distance // CHUNKS
+    return [neighbours(chunk, radius) for chunk in split(value)]
+
+
+class MultiIndex:
+    """In-memory counterpart of the ``PhotoHash`` chunk indexes."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.tables = [defaultdict(list) for _ in range(CHUNKS)]
+
+    def add(self, key, value):
+        self.hashes[key] = value
+        for table, chunk in zip(self.tables, split(value)):
+            table[chunk].append(key)
+
+    def search(self, value, max_distance):
+        found = set()
+        for table, chunks in zip(self.tables, probe(value, max_distance)):
+            for chunk in chunks:
+                found.update(table.get(chunk, ()))
+        return [
+            key for key in found if distance(self.hashes[key], value) <= max_distance
+        ]
+
+
+def clusters(items, max_distance):
+    """Group ``(key, hash)`` pairs into clusters of near-duplicates."""
+    index = MultiIndex()
+    parent = {}
+
+    def root(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    for key, value in items:
+        parent[key] = key
+        for other in index.search(value, max_distance):
+            parent[root(other)] = root(key)
+        index.add(key, value)
+
+    groups = defaultdict(list)
+    for key in parent:
+        groups[root(key)].append(key)
+    return sorted(
+        (sorted(group) for group in groups.values() if len(group) > 1),
+        key=lambda group: group[0],
+    )
+
+
+def chunk_fields(value):
+    return {f"chunk{i}": chunk for i, chunk in enumerate(split(value))}
+
+
+def find_similar(owner_id, value, max_distance=None, exclude=None):
+    """Ids of ``owner_id``'s photos whose hash is within ``max_distance``."""
+    if max_distance is None:
+        max_distance = settings.PHOTO_DUPLICATE_DISTANCE
+    # A UNION rather than an OR, so that each branch uses its chunk's index.
+    queries = []
+    for i, chunks in enumerate(probe(value, max_distance)):
+        query = PhotoHash.objects.filter(owner_id=owner_id, **{f"chunk{i}__in": chunks})
+        if exclude is not None:
+            query = query.exclude(photo_id=exclude)
+        queries.append(query.values_list("photo_id", "value"))
+    candidates = queries[0].union(*queries[1:])
+    return sorted(
+        photo_id
+        for photo_id, other in candidates
+        if distance(other, value) <= max_distance
+    )
+
+
+def save_hash(photo, value):
+    photo_hash, _ = PhotoHash.objects.update_or_create(
+        photo=photo,
+        defaults={
+            "owner_id": photo.owner_id,
+            "value": to_signed(value),
+            **chunk_fields(value),
+        },
+    )
+    return photo_hash
+
+
+def hash_photo(photo):
+    """Compute and record the perceptual hash of ``photo``'s file."""
+    if not photo.photo:
+        return None
+    with photo.photo.open("rb") as f:
+        value = dhash(f)
+    return save_hash(photo, value)
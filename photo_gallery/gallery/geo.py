@@ -0,0 +1,132 @@
+"""
+Geohash cells for photo locations.
+
+A geohash interleaves longitude and latitude bits, 5 per base-32 character,
+so every prefix of a photo's geohash names the grid cell containing it at a
+coarser precision. ``LocationCell`` keeps a photo count for each prefix up
+to ``MAX_PRECISION``, which lets the map read clusters at any zoom level by
+primary key instead of aggregating photos.
+"""
+import math
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+DECODE = {char: i for i, char in enumerate(BASE32)}
+PRECISION = 12
+MAX_PRECISION = 8
+# Most cells the map returns for one box.
+MAX_CELLS = 256
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        if coordinate >= middle:
+            value = (value << 1) | 1
+            interval[0] = middle
+        else:
+            value <<= 1
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return "".join(chars)
+
+
+def bounds(cell):
+    """Return ``(min_lat, min_lon, max_lat, max_lon)`` of a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in cell:
+        value = DECODE[char]
+        for shift in range(4, -1, -1):
+            interval = lon_range if even else lat_range
+            middle = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = middle
+            else:
+                interval[1] = middle
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def cell_size(precision):
+    """Return the ``(height, width)`` in degrees of cells at ``precision``."""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180 / 2**lat_bits, 360 / 2**lon_bits
+
+
+def zoom_precision(zoom):
+    """Precision whose cells are at most a quarter of a map tile wide."""
+    for precision in range(1, MAX_PRECISION + 1):
+        if math.ceil(precision * 5 / 2) >= zoom + 2:
+            return precision
+    return MAX_PRECISION
+
+
+def split_bbox(min_lon, min_lat, max_lon, max_lat):
+    # A box crossing the antimeridian is two boxes.
+    if min_lon > max_lon:
+        return [(min_lon, min_lat, 180.0, max_lat), (-180.0, min_lat, max_lon, max_lat)]
+    return [(min_lon, min_lat, max_lon, max_lat)]
+
+
+def grid(bbox, precision):
+    """Row and column ranges of the cells at ``precision`` covering ``bbox``."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    height, width = cell_size(precision)
+
+    def span(low, high, origin, size, count):
+        first = min(max(int((low - origin) // size), 0), count - 1)
+        last = min(max(int((high - origin) // size), 0), count - 1)
+        return range(first, last + 1)
+
+    return (
+        span(min_lat, max_lat, -90, height, round(180 / height)),
+        span(min_lon, max_lon, -180, width, round(360 / width)),
+    )
+
+
+def count_cells(bbox, precision):
+    return sum(
+        len(lat_rows) * len(lon_cols)
+        for lat_rows, lon_cols in (grid(box, precision) for box in split_bbox(*bbox))
+    )
+
+
+def covering_cells(bbox, precision):
+    """The geohash cells at ``precision`` that intersect ``bbox``."""
+    height, width = cell_size(precision)
+    cells = []
+    for box in split_bbox(*bbox):
+        lat_rows, lon_cols = grid(box, precision)
+        for row in lat_rows:
+            for col in lon_cols:
+                cells.append(
+                    encode(
+                        -90 + (row + 0.5) * height,
+                        -180 + (col + 0.5) * width,
+                        precision,
+                    )
+                )
+    return cells
+
+
+def prefixes(geohash):
+    return [geohash[:precision] for precision in range(1, MAX_PRECISION + 1)]
+
+
+def prefix_range(prefix):
+    """Bounds of the geohashes starting with ``prefix``, for a range scan."""
+    # "~" sorts after every base-32 character.
+    return prefix, prefix + "~"
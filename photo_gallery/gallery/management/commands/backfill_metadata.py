@@ -0,0 +1,71 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from gallery.duplicates import dhash, save_hash
+from gallery.metadata import read_metadata, save_metadata
+from gallery.models import Photo
+
+
+def read_file(name):
+    # Runs in a worker process; exceptions are returned, not raised, so one
+    # bad file doesn't abort the chunk. Opened through the storage, which may
+    # be an object store.
+    try:
+        with Photo._meta.get_field("photo").storage.open(name) as f:
+            data = read_metadata(f)
+            f.seek(0)
+            return data, dhash(f)
+    except Exception as e:
+        return e
+
+
+class Command(BaseCommand):
+    help = (
+        "Extract EXIF metadata and perceptual hashes of photos uploaded "
+        "before they were recorded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count(),
+            help="Worker processes reading the files.",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Extract the metadata and hash of every photo again.",
+        )
+
+    def handle(self, *args, **options):
+        queryset = Photo.objects.exclude(photo="").order_by("pk")
+        if not options["force"]:
+            queryset = queryset.filter(
+                Q(metadata__isnull=True) | Q(perceptual_hash__isnull=True)
+            )
+
+        done = failed = 0
+        last_pk = 0
+        with ProcessPoolExecutor(max_workers=options["processes"]) as executor:
+            while True:
+                chunk = list(queryset.filter(pk__gt=last_pk)[: options["chunk_size"]])
+                if not chunk:
+                    break
+                last_pk = chunk[-1].pk
+                names = [photo.photo.name for photo in chunk]
+                results = executor.map(read_file, names, chunksize=16)
+                for photo, result in zip(chunk, results):
+                    if isinstance(result, Exception):
+                        failed += 1
+                        self.stderr.write(f"Photo {photo.pk}: {result}")
+                        continue
+                    data, value = result
+                    save_metadata(photo, data)
+                    save_hash(photo, value)
+                    done += 1
+                self.stdout.write(f"{done} extracted, {failed} failed")
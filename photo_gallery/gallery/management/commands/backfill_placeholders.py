@@ -0,0 +1,69 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from gallery.models import Photo
+from gallery.placeholders import blurhash, save_placeholders
+
+
+def read_file(name):
+    # Runs in a worker process; exceptions are returned, not raised, so one
+    # bad file doesn't abort the chunk. Opened through the storage, which may
+    # be an object store.
+    try:
+        with Photo._meta.get_field("photo").storage.open(name) as f:
+            return blurhash(f)
+    except Exception as e:
+        return e
+
+
+class Command(BaseCommand):
+    help = "Compute the BlurHash placeholders of photos uploaded before them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Photos read and saved at a time, which bounds memory use.",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count(),
+            help="Worker processes decoding the files.",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Compute the placeholder of every photo again.",
+        )
+
+    def handle(self, *args, **options):
+        queryset = Photo.objects.exclude(photo="").order_by("pk")
+        if not options["force"]:
+            queryset = queryset.filter(placeholder="")
+        queryset = queryset.only("pk", "owner_id", "photo")
+
+        done = failed = 0
+        last_pk = 0
+        with ProcessPoolExecutor(max_workers=options["processes"]) as executor:
+            while True:
+                chunk = list(queryset.filter(pk__gt=last_pk)[: options["chunk_size"]])
+                if not chunk:
+                    break
+                last_pk = chunk[-1].pk
+                names = [photo.photo.name for photo in chunk]
+                results = executor.map(read_file, names, chunksize=16)
+                placeholders = {}
+                for photo, result in zip(chunk, results):
+                    if isinstance(result, Exception):
+                        failed += 1
+                        self.stderr.write(f"Photo {photo.pk}: {result}")
+                    else:
+                        placeholders[photo] = result
+                if placeholders:
+                    save_placeholders(placeholders)
+                done += len(placeholders)
+                self.stdout.write(f"{done} computed, {failed} failed")
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from gallery.models import Photo
+from gallery.renditions import available_formats, generate_renditions
+
+
+class Command(BaseCommand):
+    help = "Generate missing renditions for photos uploaded before the pipeline."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=100)
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate renditions for every photo.",
+        )
+
+    def handle(self, *args, **options):
+        expected = len(set(settings.PHOTO_RENDITION_SIZES)) * len(available_formats())
+        queryset = Photo.objects.exclude(photo="").order_by("pk")
+        if not options["force"]:
+            queryset = queryset.annotate(rendered=Count("renditions")).filter(
+                rendered__lt=expected
+            )
+
+        done = failed = 0
+        last_pk = 0
+        while True:
+            chunk = list(
+                queryset.filter(pk__gt=last_pk).prefetch_related("renditions")[
+                    : options["chunk_size"]
+                ]
+            )
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+            for photo in chunk:
+                try:
+                    generate_renditions(photo)
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"Photo {photo.pk}: {e}")
+                else:
+                    done += 1
+            self.stdout.write(f"{done} rendered, {failed} failed")
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from gallery.models import Photo, retain_file
+from gallery.storage import is_content_addressed
+
+
+class Command(BaseCommand):
+    help = "Move photos stored flat in MEDIA_ROOT into the content-addressed layout."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many files would be moved.",
+        )
+
+    def handle(self, *args, **options):
+        storage = Photo._meta.get_field("photo").storage
+        queryset = Photo.objects.exclude(photo="").order_by("pk")
+
+        moved = missing = pending = 0
+        last_pk = 0
+        while True:
+            chunk = list(
+                queryset.filter(pk__gt=last_pk).values_list("pk", "photo")[
+                    : options["chunk_size"]
+                ]
+            )
+            if not chunk:
+                break
+            last_pk = chunk[-1][0]
+            for pk, name in chunk:
+                if is_content_addressed(name):
+                    continue
+                if not storage.exists(name):
+                    missing += 1
+                    self.stderr.write(f"Photo {pk}: {name} does not exist")
+                    continue
+                if options["dry_run"]:
+                    pending += 1
+                    continue
+                with transaction.atomic():
+                    hashed = storage.adopt(name)
+                    # update() skips photo_saved, which would queue the
+                    # deletion of the flat name that was just moved away.
+                    Photo.objects.filter(pk=pk).update(photo=hashed)
+                    retain_file(hashed)
+                moved += 1
+
+        if options["dry_run"]:
+            self.stdout.write(f"{pending} files to move, {missing} missing")
+        else:
+            self.stdout.write(f"{moved} files moved, {missing} missing")
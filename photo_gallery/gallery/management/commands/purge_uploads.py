@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from gallery.uploads import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete expired resumable upload sessions and their partial files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        purged = purge_expired(chunk_size=options["chunk_size"])
+        self.stdout.write(f"{purged} expired uploads purged")
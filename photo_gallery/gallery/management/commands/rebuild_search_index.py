@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from gallery.models import Photo
+from gallery.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search documents of every photo."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        photo_ids = Photo.objects.order_by("id").values_list("id", flat=True)
+        total = rebuild_index(photo_ids.iterator(), options["chunk_size"])
+        self.stdout.write(f"{total} photos reindexed")
@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from gallery.models import Album, Photo, Comment, Bookmark
+
+User = get_user_model()
+
+COUNTERS = (
+    (
+        Photo,
+        {"comment_count": (Comment, "photo"), "bookmark_count": (Bookmark, "photo")},
+    ),
+    (Album, {"photo_count": (Photo, "album")}),
+    (
+        User,
+        {
+            "album_count": (Album, "owner"),
+            "photo_count": (Photo, "owner"),
+            "comment_count": (Comment, "owner"),
+            "bookmark_count": (Bookmark, "owner"),
+        },
+    ),
+)
+
+
+def count_of(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(cnt=Count("pk"))
+            .values("cnt")
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized counters and fix the rows that drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drifted rows without updating them.",
+        )
+
+    def handle(self, *args, **options):
+        for model, counters in COUNTERS:
+            checked, fixed = self.repair(
+                model, counters, options["chunk_size"], options["dry_run"]
+            )
+            self.stdout.write(
+                f"{model._meta.label}: {checked} checked, {fixed} drifted"
+            )
+
+    def repair(self, model, counters, chunk_size, dry_run):
+        expressions = {field: count_of(*source) for field, source in counters.items()}
+        if model is Photo:
+            expressions["score"] = (
+                expressions["comment_count"] + expressions["bookmark_count"]
+            )
+        annotations = {f"actual_{field}": expr for field, expr in expressions.items()}
+        checked = fixed = 0
+        last_pk = 0
+        while True:
+            chunk = list(
+                model.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .annotate(**annotations)
+                .values("pk", *expressions, *annotations)[:chunk_size]
+            )
+            if not chunk:
+                return checked, fixed
+            last_pk = chunk[-1]["pk"]
+            checked += len(chunk)
+
+            drifted = [
+                row["pk"]
+                for row in chunk
+                if any(row[field] != row[f"actual_{field}"] for field in expressions)
+            ]
+            fixed += len(drifted)
+            if drifted and not dry_run:
+                # Recount inside the UPDATE itself so writes that landed since
+                # the chunk was read are not overwritten with stale values.
+                model.objects.filter(pk__in=drifted).update(**expressions)
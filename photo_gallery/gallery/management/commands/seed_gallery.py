@@ -0,0 +1,218 @@
+import io
+import random
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from PIL import Image, ImageOps
+
+from gallery.models import Album, Blob, Bookmark, Comment, Photo, bump_versions
+from gallery.placeholders import blurhash
+from gallery.search import rebuild_index
+from gallery.storage import is_content_addressed
+
+User = get_user_model()
+
+PASSWORD = "seed-gallery-password"
+WORDS = (
+    "sunset beach mountain forest river lake city street night morning snow "
+    "rain autumn spring summer winter portrait family friends dog cat bird "
+    "flower garden bridge tower harbor boat train road desert island castle "
+    "market festival concert wedding birthday trip hike sky clouds stars"
+).split()
+IMAGE_SIZE = (64, 48)
+
+
+def bulk_insert(model, objects, batch_size):
+    """Insert ``objects`` and return their new primary keys in order."""
+    # Not every database returns the ids of bulk-inserted rows.
+    last_pk = model.objects.order_by("-pk").values_list("pk", flat=True).first()
+    model.objects.bulk_create(objects, batch_size=batch_size)
+    return list(
+        model.objects.filter(pk__gt=last_pk or 0)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+
+
+def batches(count, batch_size):
+    for start in range(0, count, batch_size):
+        yield range(start, min(start + batch_size, count))
+
+
+def make_image(rng):
+    """A tiny gradient JPEG, so that photos differ in placeholders and hashes."""
+    colors = [tuple(rng.randrange(256) for _ in range(3)) for _ in range(2)]
+    gradient = Image.linear_gradient("L").rotate(rng.choice((0, 90, 180, 270)))
+    image = ImageOps.colorize(gradient.resize(IMAGE_SIZE), *colors)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=80)
+    return buffer.getvalue()
+
+
+def sentence(rng, low, high):
+    return " ".join(rng.sample(WORDS, rng.randint(low, high)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic users, albums, photos, comments and "
+        "bookmarks for load tests. The same --seed generates the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--photos", type=int, default=1000)
+        parser.add_argument("--albums-per-user", type=int, default=3)
+        parser.add_argument(
+            "--comments",
+            type=float,
+            default=2,
+            help="Comments per photo on average.",
+        )
+        parser.add_argument(
+            "--bookmarks",
+            type=float,
+            default=1,
+            help="Bookmarks per photo on average.",
+        )
+        parser.add_argument(
+            "--images",
+            type=int,
+            default=16,
+            help="Distinct image files shared by the photos.",
+        )
+        parser.add_argument("--password", default=PASSWORD)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+        images = self.create_images(rng, options["images"])
+        user_ids = self.create_users(options["users"], options["password"], batch_size)
+        albums = self.create_albums(
+            rng, user_ids, options["albums_per_user"], batch_size
+        )
+        photos = self.create_photos(rng, albums, images, options["photos"], batch_size)
+        comments = self.create_pairs(
+            rng, Comment, user_ids, photos, options["comments"], batch_size
+        )
+        bookmarks = self.create_pairs(
+            rng, Bookmark, user_ids, photos, options["bookmarks"], batch_size
+        )
+
+        # bulk_create skips the receivers: catch up on what they maintain.
+        call_command("repair_counters", chunk_size=batch_size, stdout=self.stdout)
+        rebuild_index([photo_id for photo_id, _ in photos], batch_size)
+        bump_versions("photos", "bookmarks")
+        self.stdout.write(
+            f"{len(user_ids)} users, {sum(map(len, albums.values()))} albums, "
+            f"{len(photos)} photos, {comments} comments, {bookmarks} bookmarks"
+        )
+
+    def create_images(self, rng, count):
+        """Save ``count`` generated images; returns (name, placeholder) pairs."""
+        storage = Photo._meta.get_field("photo").storage
+        images = []
+        for i in range(count):
+            content = make_image(rng)
+            name = storage.save(f"seed-{i}.jpg", ContentFile(content))
+            images.append((name, blurhash(io.BytesIO(content))))
+        return images
+
+    def create_users(self, count, password, batch_size):
+        # Hashing is slow on purpose, so every user shares one hash.
+        password = make_password(password)
+        first = User.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+        users = (
+            User(
+                email=f"seed{first + i + 1}@example.com",
+                username=f"seed{first + i + 1}",
+                password=password,
+            )
+            for i in range(count)
+        )
+        return bulk_insert(User, users, batch_size)
+
+    def create_albums(self, rng, user_ids, per_user, batch_size):
+        """Returns the new album ids of each user."""
+        owners = [user_id for user_id in user_ids for _ in range(per_user)]
+        album_ids = bulk_insert(
+            Album,
+            (
+                Album(owner_id=owner_id, name=f"{rng.choice(WORDS).title()} {i}")
+                for i, owner_id in enumerate(owners)
+            ),
+            batch_size,
+        )
+        albums = {}
+        for owner_id, album_id in zip(owners, album_ids):
+            albums.setdefault(owner_id, []).append(album_id)
+        return albums
+
+    def create_photos(self, rng, albums, images, count, batch_size):
+        """Returns (photo id, owner id) pairs."""
+        if not albums or not images:
+            return []
+        # A few users upload most photos, as on real sites (Zipf's law).
+        owners = list(albums)
+        weights = [1 / rank for rank in range(1, len(owners) + 1)]
+        photos = []
+        files = Counter()
+        for batch in batches(count, batch_size):
+            rows = []
+            for owner_id in rng.choices(owners, weights, k=len(batch)):
+                name, placeholder = rng.choice(images)
+                files[name] += 1
+                rows.append(
+                    Photo(
+                        owner_id=owner_id,
+                        album_id=rng.choice(albums[owner_id]),
+                        description=sentence(rng, 3, 8),
+                        photo=name,
+                        placeholder=placeholder,
+                    )
+                )
+            photo_ids = bulk_insert(Photo, rows, batch_size)
+            photos.extend(zip(photo_ids, (row.owner_id for row in rows)))
+
+        names = [name for name in files if is_content_addressed(name)]
+        Blob.objects.bulk_create(
+            [Blob(name=name) for name in names], ignore_conflicts=True
+        )
+        for name in names:
+            Blob.objects.filter(name=name).update(refcount=F("refcount") + files[name])
+        return photos
+
+    def create_pairs(self, rng, model, user_ids, photos, per_photo, batch_size):
+        """
+        Create comments or bookmarks by random users on the new photos, at
+        most one per user and photo and none on the user's own photos.
+        """
+        count = round(len(photos) * per_photo)
+        if len(user_ids) < 2 or not photos:
+            return 0
+        count = min(count, len(photos) * (len(user_ids) - 1))
+        seen = set()
+        created = 0
+        while created < count:
+            rows = []
+            while len(rows) < min(batch_size, count - created):
+                photo_id, photo_owner_id = rng.choice(photos)
+                owner_id = rng.choice(user_ids)
+                if owner_id == photo_owner_id or (owner_id, photo_id) in seen:
+                    continue
+                seen.add((owner_id, photo_id))
+                row = model(owner_id=owner_id, photo_id=photo_id)
+                if model is Comment:
+                    row.text = sentence(rng, 2, 10)
+                rows.append(row)
+            model.objects.bulk_create(rows, batch_size=batch_size)
+            created += len(rows)
+        return created
@@ -0,0 +1,224 @@
+import heapq
+import os
+import time
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models.functions import Collate
+
+from gallery.models import Blob, Photo, Rendition, UploadSession
+from gallery.transforms import CACHE_DIR
+
+# Collations that sort like Python compares strings, by code point.
+BINARY_COLLATIONS = {
+    "postgresql": "C",
+    "sqlite": "BINARY",
+    "mysql": "utf8mb4_bin",
+}
+
+# (model, field) pairs whose values name files under MEDIA_ROOT.
+REFERENCES = (
+    (Photo, "photo"),
+    (Rendition, "file"),
+    (UploadSession, "path"),
+)
+
+
+def local_references():
+    """The REFERENCES whose files are stored under MEDIA_ROOT."""
+    return [
+        (model, field)
+        for model, field in REFERENCES
+        # Upload sessions name their file in default_storage.
+        if isinstance(
+            getattr(model._meta.get_field(field), "storage", default_storage),
+            FileSystemStorage,
+        )
+    ]
+
+
+def walk_sorted(root, prefix=""):
+    """
+    Yield (name, stat) for the files under ``root``, sorted by name, holding
+    one directory listing at a time. Transforms and dot files are skipped.
+    """
+    with os.scandir(os.path.join(root, prefix)) as it:
+        entries = []
+        for entry in it:
+            if entry.name.startswith("."):
+                continue
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if is_dir and not prefix and entry.name == CACHE_DIR:
+                # The transform cache evicts on its own (gallery.transforms).
+                continue
+            # "a/" sorts after "a.jpg" like every name inside "a" does.
+            entries.append((entry.name + "/" if is_dir else entry.name, entry))
+    entries.sort(key=itemgetter(0))
+    for key, entry in entries:
+        if key.endswith("/"):
+            yield from walk_sorted(root, prefix + key)
+            continue
+        try:
+            yield prefix + entry.name, entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            continue
+
+
+def references_of(model, field, chunk_size):
+    """Yield (name, model, pk) for the files ``field`` references, by name."""
+    collation = BINARY_COLLATIONS.get(connection.vendor)
+    order = Collate(field, collation) if collation else field
+    rows = (
+        model.objects.exclude(**{field: ""})
+        .order_by(order, "pk")
+        .values_list(field, "pk")
+        .iterator(chunk_size=chunk_size)
+    )
+    for name, pk in rows:
+        yield name, model, pk
+
+
+def referenced_names(chunk_size):
+    """Every referenced file, sorted by name, as ``references_of()``."""
+    return heapq.merge(
+        *(
+            references_of(model, field, chunk_size)
+            for model, field in local_references()
+        ),
+        key=itemgetter(0),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Find files under MEDIA_ROOT that no row references, and rows whose "
+        "file is missing, in one sorted pass over both. Orphaned files older "
+        "than MEDIA_BLOB_GRACE_PERIOD are deleted; missing files are only "
+        "reported. Use -v 2 to list them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report orphaned files without deleting them.",
+        )
+        parser.add_argument(
+            "--progress",
+            type=float,
+            default=10,
+            help="Seconds between throughput reports.",
+        )
+
+    def handle(self, *args, **options):
+        self.chunk_size = options["chunk_size"]
+        self.dry_run = options["dry_run"]
+        self.verbosity = options["verbosity"]
+        self.files = self.rows = self.bytes = 0
+        self.orphans = self.orphan_bytes = self.recent = self.dangling = 0
+        self.pending = []
+        self.started = time.monotonic()
+        report_at = self.started + options["progress"]
+
+        files = walk_sorted(settings.MEDIA_ROOT)
+        rows = referenced_names(self.chunk_size)
+        file, row = next(files, None), next(rows, None)
+        while file is not None or row is not None:
+            if row is None or (file is not None and file[0] < row[0]):
+                self.count_file(file)
+                self.orphaned(*file)
+                file = next(files, None)
+            elif file is None or row[0] < file[0]:
+                self.rows += 1
+                self.dangling += 1
+                if self.verbosity >= 2:
+                    self.stdout.write(
+                        f"missing: {row[1]._meta.label} {row[2]} {row[0]}"
+                    )
+                row = next(rows, None)
+            else:
+                # Deduplicated photos share a file.
+                self.count_file(file)
+                while row is not None and row[0] == file[0]:
+                    self.rows += 1
+                    row = next(rows, None)
+                file = next(files, None)
+
+            if time.monotonic() >= report_at:
+                self.stdout.write(self.throughput())
+                report_at = time.monotonic() + options["progress"]
+        self.delete_pending()
+
+        self.stdout.write(self.throughput())
+        action = "would be deleted" if self.dry_run else "deleted"
+        self.stdout.write(
+            f"{self.orphans} orphaned files ({self.orphan_bytes} bytes) {action}, "
+            f"{self.recent} too recent to tell, {self.dangling} rows with "
+            f"missing files"
+        )
+
+    def count_file(self, file):
+        self.files += 1
+        self.bytes += file[1].st_size
+
+    def throughput(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return (
+            f"{self.files} files ({self.bytes} bytes) and {self.rows} rows in "
+            f"{elapsed:.1f}s: {self.files / elapsed:.0f} files/s, "
+            f"{self.rows / elapsed:.0f} rows/s"
+        )
+
+    def orphaned(self, name, stat):
+        # Uploads that haven't committed their row yet look orphaned too.
+        if time.time() - stat.st_mtime < settings.MEDIA_BLOB_GRACE_PERIOD:
+            self.recent += 1
+            return
+        self.pending.append((name, stat))
+        if len(self.pending) >= self.chunk_size:
+            self.delete_pending()
+
+    def delete_pending(self):
+        """Delete the pending orphans that are still unreferenced."""
+        pending, self.pending = self.pending, []
+        if not pending:
+            return
+        names = [name for name, _ in pending]
+        referenced = set(
+            Blob.objects.filter(name__in=names, refcount__gt=0).values_list(
+                "name", flat=True
+            )
+        )
+        for model, field in local_references():
+            referenced.update(
+                model.objects.filter(**{f"{field}__in": names}).values_list(
+                    field, flat=True
+                )
+            )
+        deleted = []
+        for name, stat in pending:
+            if name in referenced:
+                continue
+            if not self.dry_run:
+                path = os.path.join(settings.MEDIA_ROOT, name)
+                try:
+                    # Deduplicating onto a file touches it (see delete_blob).
+                    if time.time() - os.stat(path).st_mtime < (
+                        settings.MEDIA_BLOB_GRACE_PERIOD
+                    ):
+                        self.recent += 1
+                        continue
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                deleted.append(name)
+            self.orphans += 1
+            self.orphan_bytes += stat.st_size
+            if self.verbosity >= 2:
+                self.stdout.write(f"orphaned: {name}")
+        if deleted:
+            Blob.objects.filter(name__in=deleted, refcount=0).delete()
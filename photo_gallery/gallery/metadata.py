@@ -0,0 +1,156 @@
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+
+from PIL import Image
+
+from .geo import encode
+from .models import PhotoLocation, PhotoMetadata
+
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+MAKE = 0x010F
+MODEL = 0x0110
+ORIENTATION = 0x0112
+DATETIME = 0x0132
+DATETIME_ORIGINAL = 0x9003
+OFFSET_TIME_ORIGINAL = 0x9011
+LENS_MAKE = 0xA433
+LENS_MODEL = 0xA434
+GPS_LATITUDE_REF = 0x0001
+GPS_LATITUDE = 0x0002
+GPS_LONGITUDE_REF = 0x0003
+GPS_LONGITUDE = 0x0004
+
+EXIF_DATETIME_FORMAT = "%Y:%m:%d %H:%M:%S"
+
+
+def text(value):
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", "replace")
+    if not isinstance(value, str):
+        return ""
+    return value.strip("\x00 ")
+
+
+def parse_datetime(value, offset=None):
+    """Parse an EXIF date, in its own offset if given, else in local time."""
+    try:
+        taken_at = datetime.strptime(text(value), EXIF_DATETIME_FORMAT)
+    except ValueError:
+        return None
+    offset = text(offset)
+    if offset:
+        try:
+            sign = -1 if offset[0] == "-" else 1
+            hours, minutes = offset.lstrip("+-").split(":")
+            delta = timedelta(hours=int(hours), minutes=int(minutes))
+            return taken_at.replace(tzinfo=dt_timezone(sign * delta))
+        except ValueError:
+            pass
+    return taken_at
+
+
+def parse_coordinate(value, ref, negative_ref, limit):
+    """Convert EXIF degrees, minutes and seconds to signed decimal degrees."""
+    try:
+        degrees, minutes, seconds = (float(part) for part in value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    coordinate = degrees + minutes / 60 + seconds / 3600
+    if not math.isfinite(coordinate) or coordinate > limit:
+        return None
+    return -coordinate if text(ref).upper() == negative_ref else coordinate
+
+
+def parse_location(gps):
+    latitude = parse_coordinate(
+        gps.get(GPS_LATITUDE), gps.get(GPS_LATITUDE_REF), "S", 90
+    )
+    longitude = parse_coordinate(
+        gps.get(GPS_LONGITUDE), gps.get(GPS_LONGITUDE_REF), "W", 180
+    )
+    if latitude is None or longitude is None:
+        return None
+    return latitude, longitude
+
+
+def join_make(make, model):
+    # Models usually repeat the make ("Canon" / "Canon EOS 5D").
+    make, model = text(make), text(model)
+    if make and not model.lower().startswith(make.lower()):
+        return f"{make} {model}".strip()
+    return model
+
+
+def read_metadata(fp):
+    """
+    Read the dimensions, EXIF and GPS position of an image file (a path or a file object).
+
+    ``Image.open`` only parses the header, and nothing here decodes pixels.
+    The capture time is returned naive unless the file records its offset.
+    Safe to call in a worker process: it doesn't touch Django.
+    """
+    with Image.open(fp) as image:
+        width, height = image.size
+        exif = image.getexif()
+        details = exif.get_ifd(EXIF_IFD) if EXIF_IFD in exif else {}
+        gps = exif.get_ifd(GPS_IFD) if GPS_IFD in exif else {}
+
+    orientation = exif.get(ORIENTATION)
+    if orientation not in range(1, 9):
+        orientation = 1
+    if orientation >= 5:
+        width, height = height, width
+    return {
+        "taken_at": parse_datetime(
+            details.get(DATETIME_ORIGINAL) or exif.get(DATETIME),
+            details.get(OFFSET_TIME_ORIGINAL),
+        ),
+        "camera": join_make(exif.get(MAKE), exif.get(MODEL))[:100],
+        "lens": join_make(details.get(LENS_MAKE), details.get(LENS_MODEL))[:100],
+        "width": width,
+        "height": height,
+        "orientation": orientation,
+        "location": parse_location(gps),
+    }
+
+
+def save_location(photo, location):
+    if location is None:
+        PhotoLocation.objects.filter(photo=photo).delete()
+        return None
+    latitude, longitude = location
+    photo_location, _ = PhotoLocation.objects.update_or_create(
+        photo=photo,
+        defaults={
+            "latitude": latitude,
+            "longitude": longitude,
+            "geohash": encode(latitude, longitude),
+        },
+    )
+    return photo_location
+
+
+def save_metadata(photo, data):
+    data = dict(data)
+    save_location(photo, data.pop("location"))
+    taken_at = data["taken_at"]
+    if taken_at is not None and timezone.is_naive(taken_at):
+        # is_dst settles the hour that DST changes make ambiguous or skip.
+        taken_at = timezone.make_aware(taken_at, is_dst=False)
+    metadata, _ = PhotoMetadata.objects.update_or_create(
+        photo=photo,
+        defaults={**data, "taken_at": taken_at, "owner_id": photo.owner_id},
+    )
+    return metadata
+
+
+def extract_metadata(photo):
+    """Read ``photo``'s metadata from its file and record it."""
+    if not photo.photo:
+        return None
+    with photo.photo.open("rb") as f:
+        data = read_metadata(f)
+    return save_metadata(photo, data)
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.4 on 2026-10-18 07:40
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_score(apps, schema_editor):
+    Photo = apps.get_model("gallery", "Photo")
+    Comment = apps.get_model("gallery", "Comment")
+    Bookmark = apps.get_model("gallery", "Bookmark")
+
+    def count_of(model):
+        return Coalesce(
+            Subquery(
+                model.objects.filter(photo=OuterRef("pk"))
+                .order_by()
+                .values("photo")
+                .annotate(cnt=Count("pk"))
+                .values("cnt")
+            ),
+            0,
+        )
+
+    Photo.objects.update(score=count_of(Comment) + count_of(Bookmark))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gallery", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="photo",
+            name="score",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_score, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="photo",
+            index=models.Index(
+                fields=["score", "id"], name="gallery_photo_score_id_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 3.2.4 on 2026-10-18 07:42
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(cnt=Count("pk"))
+            .values("cnt")
+        ),
+        0,
+    )
+
+
+def populate_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    Album = apps.get_model("gallery", "Album")
+    Photo = apps.get_model("gallery", "Photo")
+    Comment = apps.get_model("gallery", "Comment")
+    Bookmark = apps.get_model("gallery", "Bookmark")
+
+    Photo.objects.update(
+        comment_count=count_of(Comment, "photo"),
+        bookmark_count=count_of(Bookmark, "photo"),
+    )
+    Album.objects.update(photo_count=count_of(Photo, "album"))
+    User.objects.update(
+        album_count=count_of(Album, "owner"),
+        photo_count=count_of(Photo, "owner"),
+        comment_count=count_of(Comment, "owner"),
+        bookmark_count=count_of(Bookmark, "owner"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gallery", "0003_photo_score"),
+        ("users", "0003_user_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="album",
+            name="photo_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="photo",
+            name="bookmark_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="photo",
+            name="comment_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.4 on 2026-10-18 07:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+import gallery.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gallery", "0004_engagement_counters"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Rendition",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("size", models.PositiveSmallIntegerField()),
+                (
+                    "format",
+                    models.CharField(
+                        choices=[("jpeg", "JPEG"), ("webp", "WebP")], max_length=4
+                    ),
+                ),
+                ("file", models.FileField(upload_to=gallery.models.rendition_path)),
+                ("width", models.PositiveIntegerField()),
+                ("height", models.PositiveIntegerField()),
+                (
+                    "photo",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="renditions",
+                        to="gallery.photo",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="rendition",
+            constraint=models.UniqueConstraint(
+                fields=("photo", "size", "format"), name="gallery_rendition_unique"
+            ),
+        ),
+    ]
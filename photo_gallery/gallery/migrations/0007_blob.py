@@ -0,0 +1,31 @@
+# Generated by Django 3.2.4 on 2026-10-18 07:53
+
+from django.db import migrations, models
+import gallery.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gallery", "0006_uploadsession"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Blob",
+            fields=[
+                (
+                    "name",
+                    models.CharField(max_length=100, primary_key=True, serialize=False),
+                ),
+                ("refcount", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="photo",
+            name="photo",
+            field=models.ImageField(
+                storage=gallery.storage.photo_storage, upload_to=""
+            ),
+        ),
+    ]
@@ -0,0 +1,58 @@
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+from gallery.operations import AddIndexSafely, AddUniqueConstraintSafely
+
+
+def delete_duplicates(apps, schema_editor):
+    # Historical models send no signals: run "manage.py repair_counters"
+    # afterwards if any duplicates were removed.
+    for model_name in ("Comment", "Bookmark"):
+        model = apps.get_model("gallery", model_name)
+        duplicates = (
+            model.objects.values("owner_id", "photo_id")
+            .annotate(rows=Count("id"), keep=Min("id"))
+            .filter(rows__gt=1)
+        )
+        for row in duplicates.iterator():
+            model.objects.filter(
+                owner_id=row["owner_id"], photo_id=row["photo_id"]
+            ).exclude(id=row["keep"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ("gallery", "0008_versions"),
+    ]
+
+    operations = [
+        AddIndexSafely(
+            model_name="album",
+            index=models.Index(
+                fields=["owner", "id"], name="gallery_album_owner_id_idx"
+            ),
+        ),
+        AddIndexSafely(
+            model_name="photo",
+            index=models.Index(
+                fields=["owner", "id"], name="gallery_photo_owner_id_idx"
+            ),
+        ),
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+        AddUniqueConstraintSafely(
+            model_name="bookmark",
+            constraint=models.UniqueConstraint(
+                fields=("owner", "photo"), name="gallery_bookmark_owner_photo_unique"
+            ),
+        ),
+        AddUniqueConstraintSafely(
+            model_name="comment",
+            constraint=models.UniqueConstraint(
+                fields=("owner", "photo"), name="gallery_comment_owner_photo_unique"
+            ),
+        ),
+    ]
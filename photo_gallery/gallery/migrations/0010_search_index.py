@@ -0,0 +1,43 @@
+from django.db import migrations
+
+from gallery import search
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    backend = search.get_backend(connection)
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        backend.install(cursor)
+    Photo = apps.get_model("gallery", "Photo")
+    photo_ids = (
+        Photo.objects.using(connection.alias)
+        .order_by("id")
+        .values_list("id", flat=True)
+        .iterator()
+    )
+    search.rebuild_index(photo_ids, using=connection.alias)
+    with connection.cursor() as cursor:
+        backend.create_index(cursor)
+
+
+def drop_search_index(apps, schema_editor):
+    backend = search.get_backend(schema_editor.connection)
+    if backend is not None:
+        with schema_editor.connection.cursor() as cursor:
+            backend.uninstall(cursor)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ("gallery", "0009_unique_owner_photo"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
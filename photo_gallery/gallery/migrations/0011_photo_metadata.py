@@ -0,0 +1,98 @@
+# Generated by Django 3.2.4 on 2026-10-18 08:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("gallery", "0010_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PhotoMonthCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.DateField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="PhotoMetadata",
+            fields=[
+                (
+                    "photo",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="metadata",
+                        serialize=False,
+                        to="gallery.photo",
+                    ),
+                ),
+                ("taken_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "taken_month",
+                    models.DateField(blank=True, editable=False, null=True),
+                ),
+                ("camera", models.CharField(blank=True, max_length=100)),
+                ("lens", models.CharField(blank=True, max_length=100)),
+                ("width", models.PositiveIntegerField()),
+                ("height", models.PositiveIntegerField()),
+                ("orientation", models.PositiveSmallIntegerField(default=1)),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="photomonthcount",
+            constraint=models.UniqueConstraint(
+                fields=("owner", "month"), name="gallery_month_count_unique"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="photometadata",
+            index=models.Index(
+                fields=["taken_at", "photo"], name="gallery_meta_taken_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="photometadata",
+            index=models.Index(
+                fields=["owner", "taken_at", "photo"],
+                name="gallery_meta_owner_taken_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="photometadata",
+            index=models.Index(fields=["camera"], name="gallery_meta_camera_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="photometadata",
+            index=models.Index(fields=["width"], name="gallery_meta_width_idx"),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 3.2.4 on 2026-10-18 08:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("gallery", "0011_photo_metadata"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PhotoHash",
+            fields=[
+                (
+                    "photo",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="perceptual_hash",
+                        serialize=False,
+                        to="gallery.photo",
+                    ),
+                ),
+                ("value", models.BigIntegerField()),
+                ("chunk0", models.PositiveIntegerField()),
+                ("chunk1", models.PositiveIntegerField()),
+                ("chunk2", models.PositiveIntegerField()),
+                ("chunk3", models.PositiveIntegerField()),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="photohash",
+            index=models.Index(
+                fields=["owner", "chunk0"], name="gallery_hash_chunk0_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="photohash",
+            index=models.Index(
+                fields=["owner", "chunk1"], name="gallery_hash_chunk1_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="photohash",
+            index=models.Index(
+                fields=["owner", "chunk2"], name="gallery_hash_chunk2_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="photohash",
+            index=models.Index(
+                fields=["owner", "chunk3"], name="gallery_hash_chunk3_idx"
+            ),
+        ),
+    ]
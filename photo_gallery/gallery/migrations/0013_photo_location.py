@@ -0,0 +1,51 @@
+# Generated by Django 3.2.4 on 2026-10-18 08:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gallery", "0012_photo_hash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PhotoLocation",
+            fields=[
+                (
+                    "photo",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="location",
+                        serialize=False,
+                        to="gallery.photo",
+                    ),
+                ),
+                ("latitude", models.FloatField()),
+                ("longitude", models.FloatField()),
+                ("geohash", models.CharField(db_index=True, max_length=12)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="LocationCell",
+            fields=[
+                (
+                    "cell",
+                    models.CharField(max_length=12, primary_key=True, serialize=False),
+                ),
+                ("count", models.PositiveIntegerField(default=0)),
+                (
+                    "photo",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="gallery.photo",
+                    ),
+                ),
+            ],
+        ),
+    ]
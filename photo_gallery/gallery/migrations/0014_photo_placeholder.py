@@ -0,0 +1,18 @@
+# Generated by Django 3.2.4 on 2026-10-18 08:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gallery", "0013_photo_location"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="photo",
+            name="placeholder",
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+    ]
@@ -1,8 +1,18 @@
-from django.db import models
+import uuid
+
+from django.db import connections, models, router, transaction
 from django.contrib.auth import get_user_model
-from django.core.files.storage import default_storage
-from django.db.models.signals import post_delete
+from django.db.models import Case, F, Max, Value, When
+from django.db.models.functions import Greatest, Substr
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from django.utils import timezone
+
+from tasks.queue import enqueue
+
+from .geo import bounds as cell_bounds, prefix_range, prefixes
+from .search import index_photos, remove_photos
+from .storage import is_content_addressed, photo_storage
 
 User = get_user_model()
 
@@ -10,6 +20,16 @@ User = get_user_model()
 class Album(models.Model):
     name = models.CharField(max_length=150)
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    photo_count = models.PositiveIntegerField(default=0, editable=False)
+    # Set when the album is being deleted in the background, see
+    # gallery.deletion.
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner", "id"], name="gallery_album_owner_id_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -19,16 +39,237 @@ class Photo(models.Model):
     description = models.TextField()
     album = models.ForeignKey(Album, on_delete=models.CASCADE)
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
-    photo = models.ImageField(upload_to="")
+    photo = models.ImageField(upload_to="", storage=photo_storage)
+    score = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    bookmark_count = models.PositiveIntegerField(default=0, editable=False)
+    # BlurHash of the image, see gallery.placeholders.
+    placeholder = models.CharField(max_length=32, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["score", "id"], name="gallery_photo_score_id_idx"),
+            models.Index(fields=["owner", "id"], name="gallery_photo_owner_id_idx"),
+        ]
 
     def __str__(self):
         return f"{self.album.name} {self.id}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_album_id = instance.__dict__.get("album_id")
+        photo = instance.__dict__.get("photo")
+        instance._loaded_photo_name = getattr(photo, "name", photo)
+        instance._loaded_description = instance.__dict__.get("description")
+        return instance
+
+
+class Blob(models.Model):
+    """Reference count of a content-addressed file shared by photos."""
+
+    name = models.CharField(max_length=100, primary_key=True)
+    refcount = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.name
+
+
+def rendition_path(instance, filename):
+    return f"renditions/{instance.photo_id}/{filename}"
+
+
+class Rendition(models.Model):
+    JPEG = "jpeg"
+    WEBP = "webp"
+    FORMAT_CHOICES = ((JPEG, "JPEG"), (WEBP, "WebP"))
+
+    photo = models.ForeignKey(
+        Photo, on_delete=models.CASCADE, related_name="renditions"
+    )
+    size = models.PositiveSmallIntegerField()
+    format = models.CharField(max_length=4, choices=FORMAT_CHOICES)
+    file = models.FileField(upload_to=rendition_path)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["photo", "size", "format"], name="gallery_rendition_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.photo_id} {self.size} {self.format}"
+
+
+class PhotoMetadata(models.Model):
+    """Dimensions and EXIF of a photo, read from its file header on ingest."""
+
+    photo = models.OneToOneField(
+        Photo, on_delete=models.CASCADE, primary_key=True, related_name="metadata"
+    )
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    taken_at = models.DateTimeField(null=True, blank=True)
+    taken_month = models.DateField(null=True, blank=True, editable=False)
+    camera = models.CharField(max_length=100, blank=True)
+    lens = models.CharField(max_length=100, blank=True)
+    # As displayed, i.e. swapped for photos rotated by a quarter turn.
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    orientation = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["taken_at", "photo"], name="gallery_meta_taken_idx"),
+            models.Index(
+                fields=["owner", "taken_at", "photo"],
+                name="gallery_meta_owner_taken_idx",
+            ),
+            models.Index(fields=["camera"], name="gallery_meta_camera_idx"),
+            models.Index(fields=["width"], name="gallery_meta_width_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.photo_id} {self.width}x{self.height}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_taken_month = instance.__dict__.get("taken_month")
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self.taken_at is None:
+            self.taken_month = None
+        else:
+            self.taken_month = timezone.localtime(self.taken_at).date().replace(day=1)
+        super().save(*args, **kwargs)
+
+
+class PhotoLocation(models.Model):
+    """Where a photo was taken, from its EXIF GPS position."""
+
+    photo = models.OneToOneField(
+        Photo, on_delete=models.CASCADE, primary_key=True, related_name="location"
+    )
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    geohash = models.CharField(max_length=12, db_index=True)
+
+    def __str__(self):
+        return f"{self.photo_id} {self.geohash}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_geohash = instance.__dict__.get("geohash")
+        return instance
+
+
+class LocationCell(models.Model):
+    """
+    Number of located photos in a geohash cell, for every prefix of their
+    geohashes up to ``gallery.geo.MAX_PRECISION`` characters.
+    """
+
+    cell = models.CharField(max_length=12, primary_key=True)
+    count = models.PositiveIntegerField(default=0)
+    # The latest photo in the cell, shown for the whole cluster.
+    photo = models.ForeignKey(
+        Photo, on_delete=models.SET_NULL, null=True, related_name="+"
+    )
+
+    def __str__(self):
+        return f"{self.cell} {self.count}"
+
+    @property
+    def bounds(self):
+        return cell_bounds(self.cell)
+
+    @property
+    def center(self):
+        min_lat, min_lon, max_lat, max_lon = self.bounds
+        return (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+
+
+class PhotoHash(models.Model):
+    """Perceptual hash of a photo, see ``gallery.duplicates``."""
+
+    photo = models.OneToOneField(
+        Photo,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="perceptual_hash",
+    )
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Signed: the unsigned hash minus 2**64 when the top bit is set.
+    value = models.BigIntegerField()
+    # The four 16-bit chunks of the hash, lowest first, each indexed.
+    chunk0 = models.PositiveIntegerField()
+    chunk1 = models.PositiveIntegerField()
+    chunk2 = models.PositiveIntegerField()
+    chunk3 = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["owner", f"chunk{i}"], name=f"gallery_hash_chunk{i}_idx"
+            )
+            for i in range(4)
+        ]
+
+    def __str__(self):
+        return f"{self.photo_id} {self.value & (2 ** 64 - 1):016x}"
+
+
+class PhotoMonthCount(models.Model):
+    """Photos taken per owner and month, kept up to date for histograms."""
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    month = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "month"], name="gallery_month_count_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.owner_id} {self.month:%Y-%m} {self.count}"
+
+
+class UploadSession(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    album = models.ForeignKey(Album, on_delete=models.CASCADE)
+    description = models.TextField()
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    path = models.CharField(max_length=255, editable=False)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.filename} {self.offset}/{self.size}"
+
 
 class Comment(models.Model):
     photo = models.ForeignKey(Photo, on_delete=models.CASCADE)
     text = models.TextField()
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "photo"], name="gallery_comment_owner_photo_unique"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.owner.username} {str(self.photo)}"
@@ -37,13 +278,503 @@ class Comment(models.Model):
 class Bookmark(models.Model):
     photo = models.ForeignKey(Photo, on_delete=models.CASCADE)
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "photo"], name="gallery_bookmark_owner_photo_unique"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.owner.username} {str(self.photo.id)}"
 
 
+class Version(models.Model):
+    """
+    Change stamp of a resource or collection, e.g. ``photo:1:comments``.
+
+    Bumped with the write (see ``bump_versions``), and read by the API to
+    build ETags without running the queries behind a response.
+    """
+
+    key = models.CharField(max_length=64, primary_key=True)
+    value = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.key} {self.value}"
+
+
+class Deletion(models.Model):
+    """Progress of an album or account deleted in the background."""
+
+    ALBUM = "album"
+    USER = "user"
+    KIND_CHOICES = ((ALBUM, "Album"), (USER, "User"))
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=5, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    # Photos, comments and bookmarks to delete, estimated up front.
+    total = models.PositiveIntegerField(default=0)
+    deleted = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} {self.deleted}/{self.total}"
+
+
+class OnCommitBatch:
+    """
+    Work collected per transaction (or savepoint, which discards its batch on
+    rollback) and done once, after the commit.
+    """
+
+    queued = False
+
+    @classmethod
+    def current(cls):
+        """The batch of the innermost atomic block, or None outside one."""
+        connection = transaction.get_connection()
+        if not connection.in_atomic_block:
+            return None
+        savepoint_ids = set(connection.savepoint_ids)
+        for sids, func in connection.run_on_commit:
+            if isinstance(func, cls) and not func.queued and sids == savepoint_ids:
+                return func
+        return None
+
+
+# Creates and bumps stamps in one statement on the backends that have it.
+UPSERT_VENDORS = ("postgresql", "sqlite")
+
+
+def update_versions(keys):
+    keys = sorted(set(keys))
+    if not keys:
+        return
+    now = timezone.now()
+    connection = connections[router.db_for_write(Version)]
+    if connection.vendor not in UPSERT_VENDORS:
+        Version.objects.bulk_create(
+            [Version(key=key) for key in keys], ignore_conflicts=True
+        )
+        Version.objects.filter(key__in=keys).update(
+            value=F("value") + 1, updated_at=now
+        )
+        return
+    quote = connection.ops.quote_name
+    table = quote(Version._meta.db_table)
+    sql = (
+        f"INSERT INTO {table} ({quote('key')}, {quote('value')}, "
+        f"{quote('updated_at')}) VALUES {', '.join(['(%s, 1, %s)'] * len(keys))} "
+        f"ON CONFLICT ({quote('key')}) DO UPDATE SET "
+        f"{quote('value')} = {table}.{quote('value')} + 1, "
+        f"{quote('updated_at')} = excluded.{quote('updated_at')}"
+    )
+    updated_at = connection.ops.adapt_datetimefield_value(now)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [param for key in keys for param in (key, updated_at)])
+
+
+class GlobalVersionBump(OnCommitBatch):
+    """
+    Stamps of whole collections (``photos``, ``albums``...) to bump after the
+    commit: every writer touches them, so bumping them inside the write's
+    transaction would make all writers wait on the same rows.
+    """
+
+    def __init__(self):
+        self.keys = set()
+
+    def __call__(self):
+        self.queued = True
+        update_versions(self.keys)
+
+
+def bump_versions(*keys):
+    """
+    Bump version stamps: scoped ones (``photo:1``, ``user:2:photos``) with the
+    write, collection-wide ones (without ``:``) once it commits.
+
+    A collection's ETag may then lag its payload for the length of a commit,
+    which, as with concurrent writes, only makes the ETag older.
+    """
+    scoped = {key for key in keys if ":" in key}
+    update_versions(scoped)
+    collections = set(keys) - scoped
+    if collections:
+        bump = GlobalVersionBump.current()
+        created = bump is None
+        if created:
+            bump = GlobalVersionBump()
+        bump.keys.update(collections)
+        if created:
+            transaction.on_commit(bump)
+
+
+def photo_version_keys(photo_id, owner_id=None):
+    if owner_id is None:
+        owner_id = (
+            Photo.objects.filter(pk=photo_id).values_list("owner_id", flat=True).first()
+        )
+    return [f"photo:{photo_id}", "photos", f"user:{owner_id}:photos"]
+
+
+def related_photo_version_keys(instance):
+    # Comments, bookmarks and renditions are part of their photo's payload.
+    if type(instance).photo.is_cached(instance):
+        return photo_version_keys(instance.photo_id, instance.photo.owner_id)
+    return photo_version_keys(instance.photo_id)
+
+
+class DeletionBatch(OnCommitBatch):
+    """
+    Files to delete once the current transaction commits.
+
+    Deleting an album or a user cascades to every photo, so instead of a job
+    per file the files are collected per transaction and queued in chunks
+    after the commit. A crash between the commit and the queueing leaves
+    orphaned files, which ``manage.py sweep_media`` collects.
+    """
+
+    chunk_size = 500
+
+    def __init__(self):
+        self.paths = set()
+        self.blobs = set()
+        self.photo_ids = set()
+
+    def __call__(self):
+        self.queued = True
+        with transaction.atomic():
+            for name, items in (
+                ("gallery.delete_files", self.paths),
+                ("gallery.delete_blobs", self.blobs),
+                ("gallery.purge_transforms", self.photo_ids),
+            ):
+                items = sorted(items)
+                for start in range(0, len(items), self.chunk_size):
+                    enqueue(name, items[start : start + self.chunk_size])
+
+
+def defer_deletion(paths=(), blobs=(), photo_ids=()):
+    """
+    Delete files, unreferenced blobs and the transforms of photos once the
+    current transaction commits, or right away outside one.
+    """
+    batch = DeletionBatch.current()
+    created = batch is None
+    if created:
+        batch = DeletionBatch()
+    batch.paths.update(paths)
+    batch.blobs.update(blobs)
+    batch.photo_ids.update(photo_ids)
+    if created:
+        transaction.on_commit(batch)
+
+
 @receiver(post_delete, sender=Photo)
 def delete_associated_files(sender, instance, **kwargs):
-    path = instance.photo.name
+    release_file(instance.photo.name)
+    defer_deletion(photo_ids=[instance.pk])
+
+
+@receiver(post_delete, sender=UploadSession)
+def delete_upload_file(sender, instance, **kwargs):
+    if instance.path:
+        defer_deletion(paths=[instance.path])
+
+
+@receiver(post_delete, sender=Rendition)
+def delete_rendition_file(sender, instance, **kwargs):
+    path = instance.file.name
     if path:
-        default_storage.delete(path)
+        defer_deletion(paths=[path])
+
+
+def adjust_counters(model, pk, delta, *fields):
+    # Each counter stops at zero on its own, so one that drifted below the
+    # others doesn't hold their decrements back.
+    values = {field: F(field) + delta for field in fields}
+    if delta < 0:
+        values = {field: Greatest(value, 0) for field, value in values.items()}
+    model.objects.filter(pk=pk).update(**values)
+
+
+def retain_file(name):
+    if is_content_addressed(name):
+        Blob.objects.get_or_create(name=name)
+        adjust_counters(Blob, name, 1, "refcount")
+
+
+def release_file(name, count=1):
+    if not name:
+        return
+    if not is_content_addressed(name):
+        defer_deletion(paths=[name])
+        return
+    # The job deletes the blob only if nothing references it by then.
+    adjust_counters(Blob, name, -count, "refcount")
+    defer_deletion(blobs=[name])
+
+
+@receiver(post_save, sender=Album)
+def album_created(sender, instance, created, **kwargs):
+    if created:
+        adjust_counters(User, instance.owner_id, 1, "album_count")
+
+
+@receiver(post_delete, sender=Album)
+def album_deleted(sender, instance, **kwargs):
+    adjust_counters(User, instance.owner_id, -1, "album_count")
+
+
+@receiver(post_save, sender=Photo)
+def photo_saved(sender, instance, created, **kwargs):
+    loaded_album_id = getattr(instance, "_loaded_album_id", None)
+    if created:
+        adjust_counters(Album, instance.album_id, 1, "photo_count")
+        adjust_counters(User, instance.owner_id, 1, "photo_count")
+    elif loaded_album_id is not None and loaded_album_id != instance.album_id:
+        adjust_counters(Album, loaded_album_id, -1, "photo_count")
+        adjust_counters(Album, instance.album_id, 1, "photo_count")
+        bump_versions(f"album:{loaded_album_id}")
+    instance._loaded_album_id = instance.album_id
+
+    loaded_photo_name = getattr(instance, "_loaded_photo_name", None)
+    if instance.photo.name != loaded_photo_name:
+        retain_file(instance.photo.name)
+        if not created:
+            release_file(loaded_photo_name)
+            defer_deletion(photo_ids=[instance.pk])
+    instance._loaded_photo_name = instance.photo.name
+
+
+@receiver(post_delete, sender=Photo)
+def photo_deleted(sender, instance, **kwargs):
+    adjust_counters(Album, instance.album_id, -1, "photo_count")
+    adjust_counters(User, instance.owner_id, -1, "photo_count")
+
+
+@receiver(post_save, sender=Photo)
+def photo_indexed(sender, instance, created, **kwargs):
+    if created or instance.description != getattr(
+        instance, "_loaded_description", None
+    ):
+        index_photos([instance.pk])
+    instance._loaded_description = instance.description
+
+
+@receiver(post_delete, sender=Photo)
+def photo_unindexed(sender, instance, **kwargs):
+    remove_photos([instance.pk])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_indexed(sender, instance, **kwargs):
+    # The photo's search document includes the text of all its comments.
+    index_photos([instance.photo_id])
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        adjust_counters(Photo, instance.photo_id, 1, "comment_count", "score")
+        adjust_counters(User, instance.owner_id, 1, "comment_count")
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    adjust_counters(Photo, instance.photo_id, -1, "comment_count", "score")
+    adjust_counters(User, instance.owner_id, -1, "comment_count")
+
+
+@receiver(post_save, sender=Bookmark)
+def bookmark_created(sender, instance, created, **kwargs):
+    if created:
+        adjust_counters(Photo, instance.photo_id, 1, "bookmark_count", "score")
+        adjust_counters(User, instance.owner_id, 1, "bookmark_count")
+
+
+@receiver(post_delete, sender=Bookmark)
+def bookmark_deleted(sender, instance, **kwargs):
+    adjust_counters(Photo, instance.photo_id, -1, "bookmark_count", "score")
+    adjust_counters(User, instance.owner_id, -1, "bookmark_count")
+
+
+def count_month(owner_id, month, delta):
+    if month is None:
+        return
+    if delta > 0:
+        PhotoMonthCount.objects.bulk_create(
+            [PhotoMonthCount(owner_id=owner_id, month=month)], ignore_conflicts=True
+        )
+    queryset = PhotoMonthCount.objects.filter(owner_id=owner_id, month=month)
+    if delta < 0:
+        queryset = queryset.filter(count__gte=-delta)
+    queryset.update(count=F("count") + delta)
+
+
+@receiver(post_save, sender=PhotoMetadata)
+def metadata_saved(sender, instance, created, **kwargs):
+    loaded_taken_month = getattr(instance, "_loaded_taken_month", None)
+    if created or loaded_taken_month != instance.taken_month:
+        count_month(instance.owner_id, loaded_taken_month, -1)
+        count_month(instance.owner_id, instance.taken_month, 1)
+    instance._loaded_taken_month = instance.taken_month
+
+
+@receiver(post_delete, sender=PhotoMetadata)
+def metadata_deleted(sender, instance, **kwargs):
+    count_month(instance.owner_id, instance.taken_month, -1)
+
+
+def add_to_cells(geohash, photo_id):
+    cells = prefixes(geohash)
+    LocationCell.objects.bulk_create(
+        [LocationCell(cell=cell) for cell in cells], ignore_conflicts=True
+    )
+    LocationCell.objects.filter(cell__in=cells).update(
+        count=F("count") + 1, photo_id=photo_id
+    )
+
+
+def remove_from_cells(geohash, photo_id):
+    cells = prefixes(geohash)
+    LocationCell.objects.filter(cell__in=cells, count__gte=1).update(
+        count=F("count") - 1
+    )
+    # Cells that showed this photo get another one when next read; see
+    # fill_cell_photos().
+    LocationCell.objects.filter(cell__in=cells, photo_id=photo_id).update(photo=None)
+
+
+def fill_cell_photos(cells):
+    """
+    Show the latest photo in those of ``cells`` (LocationCell instances) whose
+    photo was removed, in a query per cell length and one update.
+    """
+    missing = {cell.cell: cell for cell in cells if cell.photo_id is None}
+    latest = {}
+    for length in {len(cell) for cell in missing}:
+        ranges = models.Q()
+        for cell in missing:
+            if len(cell) == length:
+                low, high = prefix_range(cell)
+                ranges |= models.Q(geohash__gte=low, geohash__lt=high)
+        latest.update(
+            PhotoLocation.objects.filter(ranges)
+            .annotate(cell=Substr("geohash", 1, length))
+            .values("cell")
+            .annotate(latest=Max("photo_id"))
+            .order_by()
+            .values_list("cell", "latest")
+        )
+    if not latest:
+        return
+    # A photo added meanwhile was set by add_to_cells() and is kept.
+    LocationCell.objects.filter(cell__in=latest, photo=None).update(
+        photo_id=Case(
+            *(
+                When(cell=cell, then=Value(photo_id))
+                for cell, photo_id in latest.items()
+            )
+        )
+    )
+    for cell, photo_id in latest.items():
+        missing[cell].photo_id = photo_id
+
+
+@receiver(post_save, sender=PhotoLocation)
+def location_saved(sender, instance, created, **kwargs):
+    loaded_geohash = getattr(instance, "_loaded_geohash", None)
+    if created or loaded_geohash != instance.geohash:
+        if loaded_geohash:
+            remove_from_cells(loaded_geohash, instance.photo_id)
+        add_to_cells(instance.geohash, instance.photo_id)
+    instance._loaded_geohash = instance.geohash
+
+
+@receiver(post_delete, sender=PhotoLocation)
+def location_deleted(sender, instance, **kwargs):
+    remove_from_cells(instance.geohash, instance.photo_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    bump_versions(f"user:{instance.pk}")
+
+
+@receiver(post_save, sender=Album)
+@receiver(post_delete, sender=Album)
+def album_changed(sender, instance, **kwargs):
+    bump_versions(
+        f"album:{instance.pk}",
+        "albums",
+        f"user:{instance.owner_id}:albums",
+        f"user:{instance.owner_id}",
+    )
+
+
+@receiver(post_save, sender=Photo)
+@receiver(post_delete, sender=Photo)
+def photo_changed(sender, instance, **kwargs):
+    # The albums' photo counts change with the photos in them.
+    bump_versions(
+        *photo_version_keys(instance.pk, instance.owner_id),
+        f"album:{instance.album_id}",
+        "albums",
+        f"user:{instance.owner_id}:albums",
+        f"user:{instance.owner_id}",
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    bump_versions(
+        *related_photo_version_keys(instance),
+        f"photo:{instance.photo_id}:comments",
+        f"user:{instance.owner_id}",
+    )
+
+
+@receiver(post_save, sender=Bookmark)
+@receiver(post_delete, sender=Bookmark)
+def bookmark_changed(sender, instance, **kwargs):
+    bump_versions(
+        *related_photo_version_keys(instance),
+        "bookmarks",
+        f"user:{instance.owner_id}:bookmarks",
+        f"user:{instance.owner_id}",
+    )
+
+
+@receiver(post_save, sender=PhotoMetadata)
+@receiver(post_delete, sender=PhotoMetadata)
+def metadata_changed(sender, instance, **kwargs):
+    bump_versions(*photo_version_keys(instance.photo_id, instance.owner_id))
+
+
+@receiver(post_save, sender=PhotoLocation)
+@receiver(post_delete, sender=PhotoLocation)
+def location_changed(sender, instance, **kwargs):
+    bump_versions("locations")
+
+
+@receiver(post_save, sender=PhotoHash)
+@receiver(post_delete, sender=PhotoHash)
+def hash_changed(sender, instance, **kwargs):
+    bump_versions(f"user:{instance.owner_id}:duplicates")
+
+
+@receiver(post_save, sender=Rendition)
+@receiver(post_delete, sender=Rendition)
+def rendition_changed(sender, instance, **kwargs):
+    bump_versions(*related_photo_version_keys(instance))
@@ -0,0 +1,118 @@
+"""
+BlurHash placeholders, painted by clients while the photo loads.
+
+A BlurHash is the first few cosine transform components of the image,
+quantised into a short base 83 string (28 characters for 4x3 components).
+It's computed once from a tiny decode of the photo and stored in its row.
+See https://github.com/woltapp/blurhash for the format and decoders.
+"""
+from itertools import chain
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from .models import Photo, bump_versions, photo_version_keys
+
+BASE83 = (
+    "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    "abcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+)
+# Components along the long and the short side of the image.
+COMPONENTS = (4, 3)
+# The transform only needs a thumbnail; more pixels don't change it.
+SAMPLE_SIZE = 32
+
+_levels = np.arange(256) / 255
+SRGB_TO_LINEAR = np.where(
+    _levels <= 0.04045, _levels / 12.92, ((_levels + 0.055) / 1.055) ** 2.4
+)
+
+
+def encode83(value, length):
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, 83)
+        chars.append(BASE83[digit])
+    return "".join(reversed(chars))
+
+
+def linear_to_srgb(value):
+    value = min(max(value, 0.0), 1.0)
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def components(pixels, x_components, y_components):
+    """The cosine transform factors of an RGB array, shape ``(y, x, 3)``."""
+    height, width, _ = pixels.shape
+    linear = SRGB_TO_LINEAR[pixels]
+    basis_x = np.cos(
+        np.pi * np.arange(x_components)[:, None] * np.arange(width)[None, :] / width
+    )
+    basis_y = np.cos(
+        np.pi * np.arange(y_components)[:, None] * np.arange(height)[None, :] / height
+    )
+    factors = np.einsum("jy,ix,yxc->jic", basis_y, basis_x, linear)
+    scale = np.full((y_components, x_components, 1), 2.0)
+    scale[0, 0] = 1.0
+    return factors * scale / (width * height)
+
+
+def encode(pixels, x_components, y_components):
+    factors = components(pixels, x_components, y_components).reshape(-1, 3)
+    dc, ac = factors[0], factors[1:]
+    size_flag = (x_components - 1) + (y_components - 1) * 9
+    if len(ac):
+        quantised_maximum = int(max(0, min(82, np.floor(np.abs(ac).max() * 166 - 0.5))))
+        maximum = (quantised_maximum + 1) / 166
+    else:
+        quantised_maximum, maximum = 0, 1.0
+    r, g, b = (linear_to_srgb(value) for value in dc)
+    quantised = np.clip(
+        np.floor(np.sign(ac) * np.sqrt(np.abs(ac / maximum)) * 9 + 9.5), 0, 18
+    ).astype(int)
+    return "".join(
+        [
+            encode83(size_flag, 1),
+            encode83(quantised_maximum, 1),
+            encode83((r << 16) + (g << 8) + b, 4),
+        ]
+        + [encode83(int(r * 19 * 19 + g * 19 + b), 2) for r, g, b in quantised]
+    )
+
+
+def blurhash(fp):
+    """Return the BlurHash of an image file (a path or a file object)."""
+    with Image.open(fp) as image:
+        # JPEGs are decoded at the smallest DCT scale above the sample size.
+        image.draft("RGB", (SAMPLE_SIZE * 2, SAMPLE_SIZE * 2))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        image.thumbnail((SAMPLE_SIZE, SAMPLE_SIZE), Image.BOX)
+        pixels = np.asarray(image, dtype=np.uint8)
+    long_side, short_side = COMPONENTS
+    if image.width >= image.height:
+        return encode(pixels, long_side, short_side)
+    return encode(pixels, short_side, long_side)
+
+
+def save_placeholders(placeholders):
+    """Store ``{photo: blurhash}`` in one statement, without ``Photo`` signals."""
+    for photo, value in placeholders.items():
+        photo.placeholder = value
+    Photo.objects.bulk_update(placeholders, ["placeholder"])
+    bump_versions(
+        *chain.from_iterable(
+            photo_version_keys(photo.pk, photo.owner_id) for photo in placeholders
+        )
+    )
+
+
+def placeholder_photo(photo):
+    """Compute and record the placeholder of ``photo``'s file."""
+    if not photo.photo:
+        return None
+    with photo.photo.open("rb") as f:
+        value = blurhash(f)
+    save_placeholders({photo: value})
+    return value
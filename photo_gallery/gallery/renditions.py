@@ -0,0 +1,92 @@
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError
+
+from PIL import Image, ImageOps, features
+
+from tasks.queue import enqueue
+
+from .models import Rendition
+
+# Rendition.format -> (Pillow format, file extension, Pillow feature)
+FORMATS = {
+    Rendition.JPEG: ("JPEG", "jpg", "jpg"),
+    Rendition.WEBP: ("WEBP", "webp", "webp"),
+}
+
+
+def available_formats():
+    return [
+        name
+        for name in settings.PHOTO_RENDITION_FORMATS
+        if name in FORMATS and features.check(FORMATS[name][2])
+    ]
+
+
+def open_image(field_file, size):
+    with field_file.open("rb") as f:
+        image = Image.open(f)
+        # For JPEGs, decode straight at the smallest DCT scale that still
+        # covers the largest rendition instead of the full resolution.
+        image.draft("RGB", (size, size))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.load()
+    return image
+
+
+def encode(image, name):
+    pillow_format = FORMATS[name][0]
+    buffer = io.BytesIO()
+    image.save(
+        buffer,
+        pillow_format,
+        quality=settings.PHOTO_RENDITION_QUALITY,
+        optimize=pillow_format == "JPEG",
+    )
+    return buffer.getvalue()
+
+
+def generate_renditions(photo):
+    """Render every configured size and format of ``photo`` and record them."""
+    sizes = sorted(set(settings.PHOTO_RENDITION_SIZES), reverse=True)
+    formats = available_formats()
+    if not photo.photo or not sizes or not formats:
+        return []
+
+    existing = {(r.size, r.format): r for r in photo.renditions.all()}
+    image = open_image(photo.photo, sizes[0])
+    renditions = []
+    # Each size is downscaled from the previous, larger one, so only the
+    # first resize touches the decoded original.
+    for size in sizes:
+        image = image.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+        for name in formats:
+            rendition = existing.get((size, name))
+            if rendition is None:
+                rendition = Rendition(photo=photo, size=size, format=name)
+            elif rendition.file:
+                rendition.file.delete(save=False)
+            rendition.width, rendition.height = image.size
+            rendition.file.save(
+                f"{size}.{FORMATS[name][1]}",
+                ContentFile(encode(image, name)),
+                save=False,
+            )
+            try:
+                rendition.save()
+            except IntegrityError:
+                # The photo was deleted (or rendered concurrently) meanwhile.
+                rendition.file.delete(save=False)
+                return renditions
+            renditions.append(rendition)
+    return renditions
+
+
+def schedule_renditions(photo):
+    """Queue rendering and metadata extraction of ``photo`` for a worker."""
+    enqueue("gallery.render_photo", photo.pk)
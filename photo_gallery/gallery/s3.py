@@ -0,0 +1,502 @@
+"""
+Photo storage on an S3-compatible object store (AWS S3, MinIO, ...).
+
+Requests are signed with AWS Signature Version 4 here, so no SDK is needed,
+and objects are addressed path-style (``<endpoint>/<bucket>/<key>``), which
+every S3-compatible store understands. Photos keep the content-addressed
+names of ``gallery.storage``, and uploads send their SHA-256 along for the
+store to check. Besides Django's storage API, ``S3Storage`` presigns uploads
+that clients send straight to the bucket (see ``gallery.uploads``).
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import mimetypes
+import re
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from email.utils import parsedate_to_datetime
+from http.client import HTTPConnection, HTTPSConnection
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import Storage, default_storage
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+from .storage import BLOCK_SIZE, hashed_name
+
+ALGORITHM = "AWS4-HMAC-SHA256"
+EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+# Downloads larger than this are spooled to a temporary file.
+SPOOL_SIZE = 8 * 1024 * 1024
+# Files larger than this are uploaded in parts of this size (5 MiB at least).
+PART_SIZE = 16 * 1024 * 1024
+UPLOAD_ID_RE = re.compile(rb"<UploadId>([^<]+)</UploadId>")
+
+
+class S3Error(Exception):
+    def __init__(self, status, body=b""):
+        super().__init__(f"The object store answered {status}: {body[:500]!r}")
+        self.status = status
+
+
+def amz_date(now=None):
+    return (now or datetime.now(dt_timezone.utc)).strftime("%Y%m%dT%H%M%SZ")
+
+
+def credential_scope(timestamp, region):
+    return f"{timestamp[:8]}/{region}/s3/aws4_request"
+
+
+def signing_key(secret_key, date, region):
+    key = ("AWS4" + secret_key).encode()
+    for part in (date, region, "s3", "aws4_request"):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    return key
+
+
+def canonical_query(query):
+    return "&".join(
+        f"{quote(name, safe='')}={quote(value, safe='')}"
+        for name, value in sorted(query.items())
+    )
+
+
+def signature(secret_key, region, timestamp, method, path, query, headers, payload):
+    """
+    The SigV4 signature of a request to ``path`` (not URL-encoded yet).
+
+    Every one of ``headers``, a dict of lower-case names, is signed.
+    ``payload`` is the hex SHA-256 of the body, or ``UNSIGNED_PAYLOAD``.
+    """
+    canonical_request = "\n".join(
+        [
+            method,
+            quote(path, safe="/"),
+            canonical_query(query),
+            "".join(
+                f"{name}:{' '.join(str(headers[name]).split())}\n"
+                for name in sorted(headers)
+            ),
+            ";".join(sorted(headers)),
+            payload,
+        ]
+    )
+    string_to_sign = "\n".join(
+        [
+            ALGORITHM,
+            timestamp,
+            credential_scope(timestamp, region),
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ]
+    )
+    key = signing_key(secret_key, timestamp[:8], region)
+    return hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+
+def policy_signature(secret_key, region, timestamp, policy):
+    """The signature of a base64-encoded POST policy."""
+    key = signing_key(secret_key, timestamp[:8], region)
+    return hmac.new(key, policy.encode(), hashlib.sha256).hexdigest()
+
+
+class S3Client:
+    """Signed requests to one bucket, a connection per request."""
+
+    def __init__(self, endpoint_url, bucket, region, access_key, secret_key, timeout):
+        url = urlsplit(endpoint_url)
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.https = url.scheme == "https"
+        self.host = url.netloc
+        self.bucket = bucket
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.timeout = timeout
+
+    def path(self, key=""):
+        return f"/{self.bucket}/{key}"
+
+    def credential(self, timestamp):
+        return f"{self.access_key}/{credential_scope(timestamp, self.region)}"
+
+    @contextmanager
+    def request(
+        self, method, key, headers=None, body=None, payload=EMPTY_SHA256, query=None
+    ):
+        """Send a signed request; yields the response with its body unread."""
+        timestamp = amz_date()
+        headers = {name.lower(): str(value) for name, value in (headers or {}).items()}
+        headers.update(
+            {
+                "host": self.host,
+                "x-amz-date": timestamp,
+                "x-amz-content-sha256": payload,
+            }
+        )
+        path = self.path(key)
+        query = query or {}
+        signed = signature(
+            self.secret_key,
+            self.region,
+            timestamp,
+            method,
+            path,
+            query,
+            headers,
+            payload,
+        )
+        headers["authorization"] = (
+            f"{ALGORITHM} Credential={self.credential(timestamp)}, "
+            f"SignedHeaders={';'.join(sorted(headers))}, Signature={signed}"
+        )
+        connection_class = HTTPSConnection if self.https else HTTPConnection
+        connection = connection_class(self.host, timeout=self.timeout)
+        url = quote(path, safe="/")
+        if query:
+            url += "?" + canonical_query(query)
+        try:
+            connection.request(method, url, body=body, headers=headers)
+            yield connection.getresponse()
+        finally:
+            connection.close()
+
+    def call(self, method, key, expect=(200,), **kwargs):
+        """Send a request and read the response's ``body``; None on 404."""
+        with self.request(method, key, **kwargs) as response:
+            response.body = response.read()
+        if response.status == 404:
+            return None
+        if response.status not in expect:
+            raise S3Error(response.status, response.body)
+        return response
+
+    def presign(self, method, key, expires, headers=None):
+        """A URL that lets anyone send this request, with these headers."""
+        timestamp = amz_date()
+        headers = {name.lower(): str(value) for name, value in (headers or {}).items()}
+        headers["host"] = self.host
+        query = {
+            "X-Amz-Algorithm": ALGORITHM,
+            "X-Amz-Credential": self.credential(timestamp),
+            "X-Amz-Date": timestamp,
+            "X-Amz-Expires": str(expires),
+            "X-Amz-SignedHeaders": ";".join(sorted(headers)),
+        }
+        path = self.path(key)
+        query["X-Amz-Signature"] = signature(
+            self.secret_key,
+            self.region,
+            timestamp,
+            method,
+            path,
+            query,
+            headers,
+            UNSIGNED_PAYLOAD,
+        )
+        return f"{self.endpoint_url}{quote(path, safe='/')}?{canonical_query(query)}"
+
+    def presign_post(self, key, expires, fields, conditions=()):
+        """The URL and form fields of a browser-style POST upload of ``key``."""
+        now = datetime.now(dt_timezone.utc)
+        timestamp = amz_date(now)
+        fields = {
+            **fields,
+            "key": key,
+            "x-amz-algorithm": ALGORITHM,
+            "x-amz-credential": self.credential(timestamp),
+            "x-amz-date": timestamp,
+        }
+        expiration = now + timedelta(seconds=expires)
+        policy = {
+            "expiration": expiration.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "conditions": [
+                {"bucket": self.bucket},
+                *({name: value} for name, value in fields.items()),
+                *conditions,
+            ],
+        }
+        fields["policy"] = base64.b64encode(json.dumps(policy).encode()).decode()
+        fields["x-amz-signature"] = policy_signature(
+            self.secret_key, self.region, timestamp, fields["policy"]
+        )
+        return f"{self.endpoint_url}{self.path()}", fields
+
+
+class S3File(File):
+    """A downloaded object; opening it again after closing downloads it again."""
+
+    def __init__(self, storage, name):
+        super().__init__(storage.download(name), name)
+        self.storage = storage
+
+    def open(self, mode=None):
+        if self.closed:
+            self.file = self.storage.download(self.name)
+        else:
+            self.seek(0)
+        return self
+
+
+@deconstructible
+class S3Storage(Storage):
+    """
+    Content-addressed photo storage in an S3 bucket.
+
+    Like ``ContentAddressedStorage`` it names files after the SHA-256 of
+    their bytes, which is sent as the payload hash and checksum of the upload,
+    so the store rejects corrupted bodies. Files are read back through a
+    spooled temporary file, and ``url()`` presigns a download.
+    """
+
+    def __init__(
+        self,
+        endpoint_url=None,
+        bucket=None,
+        region=None,
+        access_key=None,
+        secret_key=None,
+        timeout=None,
+    ):
+        self.client = S3Client(
+            endpoint_url or settings.S3_ENDPOINT_URL,
+            bucket or settings.S3_BUCKET,
+            region or settings.S3_REGION,
+            access_key or settings.S3_ACCESS_KEY_ID,
+            secret_key or settings.S3_SECRET_ACCESS_KEY,
+            timeout or settings.S3_TIMEOUT,
+        )
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is only known once the content is hashed in _save().
+        return name
+
+    def _open(self, name, mode="rb"):
+        return S3File(self, name)
+
+    def download(self, name):
+        """The contents of ``name`` in a spooled temporary file."""
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        with self.client.request("GET", name) as response:
+            if response.status != 200:
+                spool.close()
+                if response.status == 404:
+                    raise FileNotFoundError(name)
+                raise S3Error(response.status, response.read())
+            for block in iter(lambda: response.read(BLOCK_SIZE), b""):
+                spool.write(block)
+        spool.seek(0)
+        return spool
+
+    def adopt(self, name, original_name=None):
+        """
+        Upload the local file ``name`` in ``default_storage``, where resumable
+        uploads are assembled, under its hashed name, then remove it.
+        """
+        source = default_storage.path(name)
+        digest = hashlib.sha256()
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+                digest.update(block)
+            size = f.tell()
+            target = hashed_name(digest.hexdigest(), original_name or name)
+            if self.exists(target):
+                # Deduplicated (see ContentAddressedStorage._place).
+                self.touch(target)
+            elif size > PART_SIZE:
+                f.seek(0)
+                self.upload_parts(target, f)
+            else:
+                f.seek(0)
+                self.client.call(
+                    "PUT",
+                    target,
+                    headers={
+                        "Content-Length": size,
+                        "Content-Type": guess_type(target),
+                        "x-amz-checksum-sha256": base64.b64encode(
+                            digest.digest()
+                        ).decode(),
+                    },
+                    body=f,
+                    payload=digest.hexdigest(),
+                )
+        default_storage.delete(name)
+        return target
+
+    def upload_parts(self, name, f):
+        """
+        Upload the file object ``f`` to ``name`` in ``PART_SIZE`` parts, each
+        checked against its SHA-256; an unfinished upload is aborted.
+        """
+        response = self.client.call(
+            "POST",
+            name,
+            headers={"Content-Type": guess_type(name)},
+            query={"uploads": ""},
+        )
+        upload_id = UPLOAD_ID_RE.search(response.body).group(1).decode()
+        try:
+            parts = []
+            for number, part in enumerate(iter(lambda: f.read(PART_SIZE), b""), 1):
+                response = self.client.call(
+                    "PUT",
+                    name,
+                    headers={"Content-Length": len(part)},
+                    body=part,
+                    payload=hashlib.sha256(part).hexdigest(),
+                    query={"partNumber": str(number), "uploadId": upload_id},
+                )
+                parts.append(
+                    f"<Part><PartNumber>{number}</PartNumber>"
+                    f"<ETag>{response.getheader('ETag')}</ETag></Part>"
+                )
+            body = (
+                f"<CompleteMultipartUpload>{''.join(parts)}</CompleteMultipartUpload>"
+            ).encode()
+            response = self.client.call(
+                "POST",
+                name,
+                headers={"Content-Length": len(body)},
+                body=body,
+                payload=hashlib.sha256(body).hexdigest(),
+                query={"uploadId": upload_id},
+            )
+            # Like a copy, completing can fail after the 200 status was sent.
+            if b"<Error>" in response.body:
+                raise S3Error(response.status, response.body)
+        except BaseException:
+            self.client.call(
+                "DELETE", name, expect=(204,), query={"uploadId": upload_id}
+            )
+            raise
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        with spool:
+            for chunk in content.chunks():
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                digest.update(chunk)
+                spool.write(chunk)
+            name = hashed_name(digest.hexdigest(), name)
+            if self.exists(name):
+                # Deduplicated (see ContentAddressedStorage._place).
+                self.touch(name)
+                return name
+            size = spool.tell()
+            spool.seek(0)
+            self.client.call(
+                "PUT",
+                name,
+                headers={
+                    "Content-Length": size,
+                    "Content-Type": guess_type(name),
+                    "x-amz-checksum-sha256": base64.b64encode(digest.digest()).decode(),
+                },
+                body=spool,
+                payload=digest.hexdigest(),
+            )
+        return name
+
+    def delete(self, name):
+        self.client.call("DELETE", name, expect=(200, 204))
+
+    def exists(self, name):
+        return self.stat(name) is not None
+
+    def size(self, name):
+        return self.stat_or_raise(name)["size"]
+
+    def get_modified_time(self, name):
+        modified = self.stat_or_raise(name)["modified"]
+        return modified if settings.USE_TZ else timezone.make_naive(modified)
+
+    def url(self, name):
+        return self.client.presign("GET", name, settings.S3_URL_EXPIRES)
+
+    def stat(self, name):
+        """Size, content type, SHA-256 checksum and mtime of ``name``, or None."""
+        response = self.client.call(
+            "HEAD", name, headers={"x-amz-checksum-mode": "ENABLED"}
+        )
+        if response is None:
+            return None
+        return {
+            "size": int(response.getheader("Content-Length")),
+            "content_type": response.getheader("Content-Type"),
+            "checksum": response.getheader("x-amz-checksum-sha256"),
+            "modified": parsedate_to_datetime(response.getheader("Last-Modified")),
+        }
+
+    def stat_or_raise(self, name):
+        stat = self.stat(name)
+        if stat is None:
+            raise FileNotFoundError(name)
+        return stat
+
+    def read(self, name, length):
+        """The first ``length`` bytes of ``name``."""
+        response = self.client.call(
+            "GET", name, expect=(200, 206), headers={"Range": f"bytes=0-{length - 1}"}
+        )
+        if response is None:
+            raise FileNotFoundError(name)
+        return response.body[:length]
+
+    def copy(self, source, target):
+        """Copy ``source`` to ``target`` within the bucket, server-side."""
+        response = self.client.call(
+            "PUT",
+            target,
+            headers={
+                "x-amz-copy-source": quote(self.client.path(source), safe="/"),
+                # Copying an object onto itself needs new metadata.
+                "x-amz-metadata-directive": "REPLACE",
+                "Content-Type": guess_type(target),
+            },
+        )
+        if response is None:
+            raise FileNotFoundError(source)
+        # A copy can fail after the 200 status was sent.
+        if b"<Error>" in response.body:
+            raise S3Error(response.status, response.body)
+
+    def touch(self, name):
+        # Refreshes Last-Modified, which the blob grace period goes by.
+        self.copy(name, name)
+
+    def presign_upload(self, name, size, content_type, checksum, method="PUT"):
+        """
+        How a client uploads exactly ``size`` bytes of ``content_type`` whose
+        base64 SHA-256 is ``checksum`` to ``name``, with a presigned PUT
+        (signed headers) or a POST form (policy conditions).
+        """
+        expires = settings.S3_URL_EXPIRES
+        headers = {
+            "Content-Length": str(size),
+            "Content-Type": content_type,
+            "x-amz-checksum-sha256": checksum,
+        }
+        if method == "PUT":
+            url = self.client.presign("PUT", name, expires, headers)
+            return {"method": "PUT", "url": url, "headers": headers}
+        url, fields = self.client.presign_post(
+            name,
+            expires,
+            {"Content-Type": content_type, "x-amz-checksum-sha256": checksum},
+            [["content-length-range", size, size]],
+        )
+        return {"method": "POST", "url": url, "fields": fields}
+
+
+def guess_type(name):
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
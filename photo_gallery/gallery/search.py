@@ -0,0 +1,188 @@
+"""
+Full-text search over photo descriptions and the comments on each photo.
+
+Every photo has one search document: its description, weighted above the
+text of its comments. PostgreSQL keeps the document in a stored ``tsvector``
+column on ``gallery_photo`` with a GIN index, and ranks with ``ts_rank``.
+SQLite keeps it in the FTS5 table ``gallery_photo_fts`` (rowid = photo id),
+ranked by ``bm25``. The receivers in ``gallery.models`` reindex a photo when
+its description or comments change.
+
+Results are ordered by rank, best first, then by id, and paged by keyset on
+that pair, so every page is a single ranked index query.
+"""
+import re
+
+from django.db import connections
+
+TERM_RE = re.compile(r"\w+")
+MAX_TERMS = 16
+
+
+def search_terms(query):
+    """Split a user query into plain words; all of them must match."""
+    return TERM_RE.findall(query or "")[:MAX_TERMS]
+
+
+class PostgreSQLSearch:
+    config = "english"
+
+    document = (
+        "setweight(to_tsvector('{config}', p.description), 'A') || "
+        "setweight(to_tsvector('{config}', coalesce(("
+        "SELECT string_agg(c.text, ' ') FROM gallery_comment c "
+        "WHERE c.photo_id = p.id), '')), 'B')"
+    )
+
+    def install(self, cursor):
+        cursor.execute("ALTER TABLE gallery_photo ADD COLUMN search_vector tsvector")
+
+    def create_index(self, cursor):
+        # Run after the backfill: building a GIN index once is far cheaper
+        # than maintaining it row by row.
+        cursor.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS gallery_photo_search_idx "
+            "ON gallery_photo USING gin (search_vector)"
+        )
+
+    def uninstall(self, cursor):
+        cursor.execute("DROP INDEX IF EXISTS gallery_photo_search_idx")
+        cursor.execute("ALTER TABLE gallery_photo DROP COLUMN IF EXISTS search_vector")
+
+    def index(self, cursor, photo_ids):
+        cursor.execute(
+            f"UPDATE gallery_photo p SET search_vector = "
+            f"{self.document.format(config=self.config)} WHERE p.id = ANY(%s)",
+            [list(photo_ids)],
+        )
+
+    def remove(self, cursor, photo_ids):
+        # The document is deleted along with its row.
+        pass
+
+    def search(self, cursor, terms, after, limit):
+        # The rank is cast to float8 so that it survives the round trip
+        # through the cursor exactly.
+        rank = "ts_rank(p.search_vector, q)::float8"
+        sql = (
+            f"SELECT p.id, {rank} FROM gallery_photo p, "
+            f"plainto_tsquery('{self.config}', %s) q WHERE p.search_vector @@ q"
+        )
+        params = [" ".join(terms)]
+        if after is not None:
+            sql += f" AND ({rank} < %s OR ({rank} = %s AND p.id < %s))"
+            params += [after[0], after[0], after[1]]
+        sql += " ORDER BY 2 DESC, 1 DESC LIMIT %s"
+        cursor.execute(sql, params + [limit])
+        return cursor.fetchall()
+
+
+class SQLiteSearch:
+    def install(self, cursor):
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS gallery_photo_fts USING fts5("
+            "description, comments, tokenize = 'porter unicode61')"
+        )
+        # Make the description count twice as much as the comments.
+        cursor.execute(
+            "INSERT INTO gallery_photo_fts(gallery_photo_fts, rank) "
+            "VALUES('rank', 'bm25(2.0, 1.0)')"
+        )
+
+    def create_index(self, cursor):
+        pass
+
+    def uninstall(self, cursor):
+        cursor.execute("DROP TABLE IF EXISTS gallery_photo_fts")
+
+    def index(self, cursor, photo_ids):
+        photo_ids = list(photo_ids)
+        placeholders = ", ".join(["%s"] * len(photo_ids))
+        cursor.execute(
+            "INSERT OR REPLACE INTO gallery_photo_fts(rowid, description, comments) "
+            "SELECT p.id, p.description, coalesce(("
+            "SELECT group_concat(c.text, ' ') FROM gallery_comment c "
+            "WHERE c.photo_id = p.id), '') "
+            f"FROM gallery_photo p WHERE p.id IN ({placeholders})",
+            photo_ids,
+        )
+
+    def remove(self, cursor, photo_ids):
+        photo_ids = list(photo_ids)
+        placeholders = ", ".join(["%s"] * len(photo_ids))
+        cursor.execute(
+            f"DELETE FROM gallery_photo_fts WHERE rowid IN ({placeholders})",
+            photo_ids,
+        )
+
+    def search(self, cursor, terms, after, limit):
+        # bm25 is lower for better matches; it is negated on the way out so
+        # that both backends rank best first.
+        sql = (
+            "SELECT rowid, -rank FROM gallery_photo_fts "
+            "WHERE gallery_photo_fts MATCH %s"
+        )
+        params = [" ".join(f'"{term}"' for term in terms)]
+        if after is not None:
+            sql += " AND (rank > %s OR (rank = %s AND rowid < %s))"
+            params += [-after[0], -after[0], after[1]]
+        sql += " ORDER BY rank, rowid DESC LIMIT %s"
+        cursor.execute(sql, params + [limit])
+        return cursor.fetchall()
+
+
+BACKENDS = {
+    "postgresql": PostgreSQLSearch(),
+    "sqlite": SQLiteSearch(),
+}
+
+
+def get_backend(connection):
+    return BACKENDS.get(connection.vendor)
+
+
+def index_photos(photo_ids, using="default"):
+    connection = connections[using]
+    backend = get_backend(connection)
+    if backend is not None and photo_ids:
+        with connection.cursor() as cursor:
+            backend.index(cursor, photo_ids)
+
+
+def remove_photos(photo_ids, using="default"):
+    connection = connections[using]
+    backend = get_backend(connection)
+    if backend is not None and photo_ids:
+        with connection.cursor() as cursor:
+            backend.remove(cursor, photo_ids)
+
+
+def rebuild_index(photo_ids, chunk_size=1000, using="default"):
+    """Reindex the given photo ids chunk by chunk; return how many."""
+    total = 0
+    chunk = []
+    for photo_id in photo_ids:
+        chunk.append(photo_id)
+        if len(chunk) >= chunk_size:
+            index_photos(chunk, using)
+            total += len(chunk)
+            chunk = []
+    index_photos(chunk, using)
+    return total + len(chunk)
+
+
+def search_photos(terms, after=None, limit=20, using="default"):
+    """
+    Return up to ``limit`` ``(photo_id, rank)`` pairs matching all ``terms``,
+    best first, starting after the ``(rank, photo_id)`` position ``after``.
+    """
+    connection = connections[using]
+    backend = get_backend(connection)
+    if backend is None:
+        raise NotImplementedError(
+            f"Full-text search is not supported on {connection.vendor}."
+        )
+    if not terms:
+        return []
+    with connection.cursor() as cursor:
+        return backend.search(cursor, terms, after, limit)
@@ -0,0 +1,103 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils.module_loading import import_string
+
+BLOCK_SIZE = 64 * 1024
+HASHED_NAME_RE = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.[a-z0-9]+)?$")
+
+
+def is_content_addressed(name):
+    return bool(name) and HASHED_NAME_RE.match(name) is not None
+
+
+def hashed_name(digest, name):
+    """The content-addressed name of a file with SHA-256 ``digest`` (hex)."""
+    extension = os.path.splitext(name)[1].lower()
+    if not re.match(r"^\.[a-z0-9]{1,8}$", extension):
+        extension = ""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that names every file after the SHA-256 of its bytes.
+
+    Files are laid out as ``ab/cd/<sha256>.<ext>`` so no directory grows past
+    a few thousand entries, identical uploads collapse into one file, and a
+    name can never point at different content, which makes its URL safe to
+    cache forever. The hash is computed while the upload is written, so the
+    content is never read back. Whoever references a file is responsible
+    for counting references before deleting it (see ``gallery.models.Blob``).
+    """
+
+    temp_dir = "uploads"
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is only known once the content is hashed in _save().
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        if hasattr(content, "temporary_file_path"):
+            # Large uploads are already on disk: hash them, then move them.
+            source = content.temporary_file_path()
+            with open(source, "rb") as f:
+                for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+                    digest.update(block)
+        else:
+            directory = self.path(self.temp_dir)
+            os.makedirs(directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                dir=directory, prefix="cas-", delete=False
+            ) as f:
+                source = f.name
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    f.write(chunk)
+        return self._place(source, hashed_name(digest.hexdigest(), name))
+
+    def adopt(self, name, original_name=None):
+        """Move the existing file ``name`` into the hashed layout."""
+        source = self.path(name)
+        digest = hashlib.sha256()
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+                digest.update(block)
+        return self._place(
+            source, hashed_name(digest.hexdigest(), original_name or name)
+        )
+
+    def _place(self, source, name):
+        target = self.path(name)
+        if os.path.exists(target):
+            # Deduplicated. Touch the blob so a pending deletion of an
+            # unreferenced copy backs off (see gallery.tasks.delete_blob).
+            os.remove(source)
+            os.utime(target)
+            return name
+
+        directory = os.path.dirname(target)
+        if self.directory_permissions_mode is not None:
+            old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+            try:
+                os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+        file_move_safe(source, target, allow_overwrite=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(target, self.file_permissions_mode)
+        return name
+
+
+def photo_storage():
+    return import_string(settings.PHOTO_STORAGE)()
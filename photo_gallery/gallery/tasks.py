@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from tasks.queue import enqueue, schedule, task
+
+from .deletion import delete_chunks
+from .duplicates import hash_photo
+from .metadata import extract_metadata
+from .models import Blob, Deletion, Photo
+from .placeholders import placeholder_photo
+from .renditions import generate_renditions
+from .transforms import purge, trim
+
+
+@task("gallery.render_photo")
+def render_photo(photo_id):
+    photo = Photo.objects.filter(pk=photo_id).first()
+    if photo is not None:
+        # All happen on ingest; the metadata only needs the file header.
+        extract_metadata(photo)
+        hash_photo(photo)
+        placeholder_photo(photo)
+        generate_renditions(photo)
+
+
+@task("gallery.delete_files")
+def delete_files(paths):
+    for path in paths:
+        default_storage.delete(path)
+
+
+def grace_ends(storage, name):
+    """
+    When the grace period of the blob ``name`` ends, or None if it is over
+    or the file is gone.
+    """
+    try:
+        modified = storage.get_modified_time(name)
+    except FileNotFoundError:
+        return None
+    ends = modified + timedelta(seconds=settings.MEDIA_BLOB_GRACE_PERIOD)
+    return ends if ends > timezone.now() else None
+
+
+def remove_blob(storage, name):
+    with transaction.atomic():
+        deleted, _ = Blob.objects.filter(name=name, refcount=0).delete()
+        if deleted:
+            storage.delete(name)
+
+
+@task("gallery.delete_blob")
+def delete_blob(name):
+    storage = Photo._meta.get_field("photo").storage
+    ends = grace_ends(storage, name)
+    if ends is not None:
+        # Recently deduplicated onto; try again once the upload had time to
+        # commit, however long the grace period is.
+        schedule(ends, "gallery.delete_blob", name)
+        return
+    remove_blob(storage, name)
+
+
+@task("gallery.delete_blobs")
+def delete_blobs(names):
+    storage = Photo._meta.get_field("photo").storage
+    unreferenced = Blob.objects.filter(name__in=names, refcount=0)
+    for name in unreferenced.values_list("name", flat=True):
+        ends = grace_ends(storage, name)
+        if ends is not None:
+            # Retried on its own, without holding up the rest of the batch.
+            schedule(ends, "gallery.delete_blob", name)
+        else:
+            remove_blob(storage, name)
+
+
+@task("gallery.trim_transforms")
+def trim_transforms():
+    trim()
+
+
+@task("gallery.purge_transforms")
+def purge_transforms(photo_ids):
+    # Jobs queued before transforms were purged in batches carry one id.
+    if isinstance(photo_ids, int):
+        photo_ids = [photo_ids]
+    purge(photo_ids)
+
+
+@task("gallery.purge_deletion")
+def purge_deletion(deletion_id):
+    deletion = Deletion.objects.filter(pk=deletion_id, finished_at=None).first()
+    if deletion is not None and not delete_chunks(deletion):
+        # Hand over to a fresh job, so that no job outlives the lock timeout.
+        enqueue("gallery.purge_deletion", deletion_id)
@@ -0,0 +1,265 @@
+"""
+On-demand transforms of photos: resized, cropped or converted copies.
+
+A transform URL is ``/media/t/<photo_id>/<signature>/<params>.<ext>``. The
+signature is an HMAC of the rest and of the photo's current file, issued by
+the API to users who may see the photo, so clients can't ask for arbitrary
+sizes and a replaced file gets new URLs. Results are written under
+``MEDIA_ROOT`` at the same path as the URL, where nginx serves them directly
+and only sends misses on to Django. A directory per photo lets a replaced or
+deleted photo's transforms go at once.
+
+The cache is bounded by ``PHOTO_TRANSFORM_CACHE_SIZE`` bytes and evicts the
+least recently read files by access time (nginx hits update it as the mount
+allows, at least daily with ``relatime``).
+"""
+
+import base64
+import fcntl
+import io
+import os
+import re
+import shutil
+import tempfile
+import time
+import zlib
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from PIL import Image, ImageOps, features
+
+from tasks.queue import enqueue
+
+CACHE_DIR = "t"
+LOCK_DIR = ".locks"
+LOCK_STRIPES = 64
+# Trimming runs when a process has written this share of the cache size.
+TRIM_EVERY = 0.05
+# Trimming evicts down to this share of the cache size.
+TRIM_TO = 0.9
+
+# URL extension -> (Pillow format, Pillow feature)
+FORMATS = {
+    "jpg": ("JPEG", "jpg"),
+    "png": ("PNG", "zlib"),
+    "webp": ("WEBP", "webp"),
+}
+PARAM_RE = re.compile(r"^(?:w(\d+))?,?(?:h(\d+))?,?(crop)?,?(?:q(\d+))?$")
+
+# Bytes this process wrote to the cache since it last scheduled a trim.
+bytes_written = 0
+
+
+def available_extensions():
+    return [ext for ext, (_, feature) in FORMATS.items() if features.check(feature)]
+
+
+def format_params(width=None, height=None, crop=False, quality=None):
+    """The canonical ``params`` segment, e.g. ``w640,h480,crop,q80``."""
+    parts = []
+    if width:
+        parts.append(f"w{width}")
+    if height:
+        parts.append(f"h{height}")
+    if crop:
+        parts.append("crop")
+    if quality:
+        parts.append(f"q{quality}")
+    return ",".join(parts)
+
+
+def parse_params(params):
+    """Return the transform named by a canonical ``params`` segment, or None."""
+    match = PARAM_RE.match(params)
+    if not match:
+        return None
+    width, height, crop, quality = match.groups()
+    transform = {
+        "width": int(width) if width else None,
+        "height": int(height) if height else None,
+        "crop": bool(crop),
+        "quality": int(quality) if quality else None,
+    }
+    if format_params(**transform) != params:
+        return None
+    if not (transform["width"] or transform["height"]):
+        return None
+    if max(transform["width"] or 0, transform["height"] or 0) > (
+        settings.PHOTO_TRANSFORM_MAX_SIZE
+    ):
+        return None
+    if transform["quality"] is not None and not 1 <= transform["quality"] <= 95:
+        return None
+    if transform["crop"] and not (transform["width"] and transform["height"]):
+        return None
+    return transform
+
+
+def sign(params, photo_id, extension, source):
+    value = f"{params}/{photo_id}.{extension}/{source}"
+    digest = salted_hmac("gallery.transforms", value, algorithm="sha256").digest()
+    return base64.urlsafe_b64encode(digest[:18]).decode()
+
+
+def verify(signature, params, photo_id, extension, source):
+    return constant_time_compare(signature, sign(params, photo_id, extension, source))
+
+
+def transform_name(signature, params, photo_id, extension):
+    """The path of a transform relative to ``MEDIA_ROOT``, and in its URL."""
+    return f"{CACHE_DIR}/{photo_id}/{signature}/{params}.{extension}"
+
+
+def transform_url(photo, extension="jpg", **transform):
+    params = format_params(**transform)
+    signature = sign(params, photo.pk, extension, photo.photo.name)
+    return settings.MEDIA_URL + transform_name(signature, params, photo.pk, extension)
+
+
+def render(fp, extension, width=None, height=None, crop=False, quality=None):
+    """Transform an image file (a path or a file object) into bytes."""
+    pillow_format = FORMATS[extension][0]
+    with Image.open(fp) as image:
+        # JPEGs are decoded at the smallest DCT scale that covers the result.
+        side = max(width or 0, height or 0)
+        if side:
+            image.draft("RGB", (side, side))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    has_alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+    mode = "RGBA" if has_alpha and pillow_format != "JPEG" else "RGB"
+    if image.mode != mode:
+        image = image.convert(mode)
+    if crop:
+        # Never upscales: the crop box keeps the requested aspect ratio.
+        scale = min(1, image.width / width, image.height / height)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        image = ImageOps.fit(image, size, Image.LANCZOS)
+    else:
+        image.thumbnail((width or image.width, height or image.height), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(
+        buffer,
+        pillow_format,
+        quality=quality or settings.PHOTO_RENDITION_QUALITY,
+        optimize=pillow_format != "WEBP",
+    )
+    return buffer.getvalue()
+
+
+def cache_root():
+    return os.path.join(settings.MEDIA_ROOT, CACHE_DIR)
+
+
+@contextmanager
+def key_lock(name):
+    """
+    Hold an exclusive lock for ``name`` across threads and processes.
+
+    Keys share ``LOCK_STRIPES`` lock files, so there is nothing to clean up;
+    two keys on one stripe only wait for each other.
+    """
+    lock_dir = os.path.join(cache_root(), LOCK_DIR)
+    os.makedirs(lock_dir, exist_ok=True)
+    stripe = zlib.crc32(name.encode()) % LOCK_STRIPES
+    with open(os.path.join(lock_dir, str(stripe)), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def write_atomic(path, data):
+    # Readers (nginx included) never see a partial file.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def get_or_render(photo, signature, params, extension, transform):
+    """
+    Return the cached transform's name under ``MEDIA_ROOT``, rendering it on a
+    miss. Concurrent misses for one key wait on its lock and render once.
+    """
+    global bytes_written
+    name = transform_name(signature, params, photo.pk, extension)
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    if os.path.exists(path):
+        return name
+    with key_lock(name):
+        if os.path.exists(path):
+            return name
+        with photo.photo.open("rb") as f:
+            data = render(f, extension, **transform)
+        write_atomic(path, data)
+
+    bytes_written += len(data)
+    if bytes_written >= settings.PHOTO_TRANSFORM_CACHE_SIZE * TRIM_EVERY:
+        bytes_written = 0
+        enqueue("gallery.trim_transforms")
+    return name
+
+
+def touch(name):
+    """Mark a transform served by Django as recently used."""
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    try:
+        os.utime(path, (time.time(), os.stat(path).st_mtime))
+    except FileNotFoundError:
+        pass
+
+
+def cached_files():
+    for dirpath, dirnames, filenames in os.walk(cache_root()):
+        if LOCK_DIR in dirnames:
+            dirnames.remove(LOCK_DIR)
+        for filename in filenames:
+            if filename.endswith(".tmp"):
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield path, stat
+
+
+def trim(max_bytes=None):
+    """
+    Evict the least recently used transforms while the cache holds more than
+    ``max_bytes``, down to ``TRIM_TO`` of it. Returns the bytes freed.
+    """
+    if max_bytes is None:
+        max_bytes = settings.PHOTO_TRANSFORM_CACHE_SIZE
+    files = list(cached_files())
+    total = sum(stat.st_size for _, stat in files)
+    if total <= max_bytes:
+        return 0
+    freed = 0
+    files.sort(key=lambda item: max(item[1].st_atime, item[1].st_mtime))
+    for path, stat in files:
+        if total - freed <= max_bytes * TRIM_TO:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        freed += stat.st_size
+    return freed
+
+
+def purge(photo_ids):
+    """Delete every cached transform of the photos, a directory per photo."""
+    for photo_id in photo_ids:
+        shutil.rmtree(
+            os.path.join(cache_root(), str(int(photo_id))), ignore_errors=True
+        )
@@ -0,0 +1,269 @@
+import base64
+import binascii
+import fcntl
+import hashlib
+import io
+import os
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from PIL import Image, UnidentifiedImageError
+
+from .deletion import visible
+from .models import Album, Photo, UploadSession
+from .renditions import schedule_renditions
+from .storage import hashed_name
+
+BLOCK_SIZE = 64 * 1024
+DIRECT_UPLOAD_SALT = "gallery.uploads.direct"
+# Enough of a file for Pillow to tell its format.
+HEADER_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    pass
+
+
+class OffsetMismatch(UploadError):
+    pass
+
+
+class ChecksumMismatch(UploadError):
+    pass
+
+
+class IncompleteUpload(UploadError):
+    pass
+
+
+def expiry():
+    return timezone.now() + timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+
+
+def start_upload(**fields):
+    session = UploadSession(expires_at=expiry(), **fields)
+    session.path = default_storage.save(
+        f"uploads/{session.id.hex}.part", ContentFile(b"")
+    )
+    session.save()
+    return session
+
+
+def parse_checksum(header):
+    """Parse an ``Upload-Checksum: sha256 <base64 digest>`` header."""
+    if not header:
+        return None
+    try:
+        algorithm, value = header.split()
+        digest = base64.b64decode(value, validate=True)
+    except (ValueError, binascii.Error):
+        raise ChecksumMismatch("Malformed Upload-Checksum header.")
+    if algorithm.lower() != "sha256" or len(digest) != hashlib.sha256().digest_size:
+        raise ChecksumMismatch("Only sha256 checksums are supported.")
+    return digest
+
+
+def write_chunk(session, offset, stream, length, checksum=None):
+    """
+    Append ``length`` bytes read from ``stream`` at ``offset``.
+
+    The body is copied block by block straight into the session's file in
+    storage and hashed on the way, so a chunk is never held in memory or
+    spooled to a temporary file. A short or corrupt chunk is cut off again
+    and leaves the session at its previous offset.
+
+    Writers hold an exclusive lock on the file and check the offset under
+    it, so two requests for the same offset can't both write.
+    """
+    if offset + length > session.size:
+        raise UploadError("Chunk exceeds the declared upload size.")
+
+    with open(default_storage.path(session.path), "r+b") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            current = (
+                UploadSession.objects.filter(pk=session.pk)
+                .values_list("offset", flat=True)
+                .first()
+            )
+            if current is None:
+                raise UploadError("The upload was already finished.")
+            session.offset = current
+            if offset != current:
+                raise OffsetMismatch(f"Expected offset {current}.")
+
+            digest = hashlib.sha256()
+            received = 0
+            f.seek(offset)
+            while received < length:
+                block = stream.read(min(BLOCK_SIZE, length - received))
+                if not block:
+                    break
+                digest.update(block)
+                f.write(block)
+                received += len(block)
+            try:
+                if received != length:
+                    raise IncompleteUpload(f"Received {received} of {length} bytes.")
+                if checksum is not None and digest.digest() != checksum:
+                    raise ChecksumMismatch("Chunk checksum does not match.")
+            except UploadError:
+                f.truncate(offset)
+                raise
+            f.flush()
+
+            UploadSession.objects.filter(pk=session.pk).update(
+                offset=offset + length, expires_at=expiry()
+            )
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+    session.offset = offset + length
+    return session.offset
+
+
+def finish_upload(session):
+    if session.offset != session.size:
+        raise IncompleteUpload(f"Received {session.offset} of {session.size} bytes.")
+    source = default_storage.path(session.path)
+    try:
+        with Image.open(source):
+            pass
+    except (UnidentifiedImageError, OSError):
+        raise UploadError("Upload a valid image.")
+
+    storage = Photo._meta.get_field("photo").storage
+    with transaction.atomic():
+        # Clearing the path claims the session for this request and keeps
+        # delete_upload_file away from the file once the row is deleted.
+        claimed = UploadSession.objects.filter(pk=session.pk, path=session.path)
+        if not session.path or not claimed.update(path=""):
+            raise UploadError("The upload was already finished.")
+        # The assembled file is hashed and moved into place, never copied.
+        name = storage.adopt(session.path, session.filename)
+        photo = Photo(
+            owner_id=session.owner_id,
+            album_id=session.album_id,
+            description=session.description,
+        )
+        photo.photo.name = name
+        photo.save()
+        schedule_renditions(photo)
+        UploadSession.objects.filter(pk=session.pk).delete()
+    return photo
+
+
+def purge_expired(chunk_size=500):
+    """Delete expired sessions in chunks and return how many were removed."""
+    purged = 0
+    while True:
+        pks = list(
+            UploadSession.objects.filter(expires_at__lte=timezone.now()).values_list(
+                "pk", flat=True
+            )[:chunk_size]
+        )
+        if not pks:
+            return purged
+        # The partial files go with the rows (see delete_upload_file).
+        UploadSession.objects.filter(pk__in=pks).delete()
+        purged += len(pks)
+
+
+def direct_uploads_enabled():
+    return hasattr(Photo._meta.get_field("photo").storage, "presign_upload")
+
+
+def presign_upload(
+    owner, album, description, filename, size, content_type, sha256, method="PUT"
+):
+    """
+    Let a client upload a photo straight to the object store.
+
+    Returns how to send the file (see ``S3Storage.presign_upload``) and a
+    signed ``token`` that ``confirm_upload()`` takes once it is there. The
+    file goes to a key of its own rather than to its content-addressed name,
+    which another upload may hold already, so a confirmed file was sent by
+    this client. The store holds it to the declared size, content type and
+    SHA-256.
+    """
+    key = f"direct/{uuid.uuid4().hex}{os.path.splitext(filename)[1].lower()}"
+    checksum = base64.b64encode(bytes.fromhex(sha256)).decode()
+    storage = Photo._meta.get_field("photo").storage
+    upload = storage.presign_upload(key, size, content_type, checksum, method)
+    upload["token"] = signing.dumps(
+        {
+            "key": key,
+            "owner": owner.pk,
+            "album": album.pk,
+            "description": description,
+            "filename": filename,
+            "size": size,
+            "content_type": content_type,
+            "sha256": sha256,
+        },
+        salt=DIRECT_UPLOAD_SALT,
+    )
+    return upload
+
+
+def confirm_upload(token, owner):
+    """
+    Create the photo of a direct upload once its file is in the object store.
+
+    Only the file's metadata and first bytes are read from here; the store
+    copies it into the content-addressed layout by itself.
+    """
+    try:
+        upload = signing.loads(
+            token, salt=DIRECT_UPLOAD_SALT, max_age=settings.UPLOAD_SESSION_TTL
+        )
+    except signing.BadSignature:
+        raise UploadError("Invalid or expired upload token.")
+    if upload["owner"] != owner.pk:
+        raise UploadError("Invalid or expired upload token.")
+    if not visible(Album.objects.filter(pk=upload["album"])).exists():
+        raise UploadError("The album was deleted.")
+
+    storage = Photo._meta.get_field("photo").storage
+    key = upload["key"]
+    stat = storage.stat(key)
+    if stat is None:
+        raise UploadError("The file was not uploaded.")
+    checksum = base64.b64encode(bytes.fromhex(upload["sha256"])).decode()
+    if (stat["size"], stat["content_type"], stat["checksum"]) != (
+        upload["size"],
+        upload["content_type"],
+        checksum,
+    ):
+        storage.delete(key)
+        raise UploadError("The uploaded file does not match the upload.")
+    try:
+        with Image.open(io.BytesIO(storage.read(key, HEADER_SIZE))) as image:
+            mime_type = Image.MIME.get(image.format)
+    except (UnidentifiedImageError, OSError):
+        mime_type = None
+    if mime_type != upload["content_type"]:
+        storage.delete(key)
+        raise UploadError("Upload a valid image.")
+
+    name = hashed_name(upload["sha256"], upload["filename"])
+    # Also refreshes a blob this deduplicates onto (see gallery.tasks).
+    storage.copy(key, name)
+    with transaction.atomic():
+        photo = Photo(
+            owner_id=owner.pk,
+            album_id=upload["album"],
+            description=upload["description"],
+        )
+        photo.photo.name = name
+        photo.save()
+        schedule_renditions(photo)
+    # Confirming the same token again finds nothing to confirm.
+    storage.delete(key)
+    return photo
@@ -0,0 +1,14 @@
+from django.contrib import admin
+
+from .models import Job, TaskStat
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "status", "attempts", "run_at", "locked_by")
+    list_filter = ("status", "name")
+
+
+@admin.register(TaskStat)
+class TaskStatAdmin(admin.ModelAdmin):
+    list_display = ("name", "runs", "failures", "avg_time", "max_time")
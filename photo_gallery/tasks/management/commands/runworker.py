@@ -0,0 +1,92 @@
+import os
+import signal
+import socket
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from tasks.models import TaskStat
+from tasks.queue import claim, requeue_stale, run
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency", type=int, default=settings.TASKS_CONCURRENCY
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=settings.TASKS_POLL_INTERVAL
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once the queue is empty instead of polling for new jobs.",
+        )
+        parser.add_argument(
+            "--stats",
+            action="store_true",
+            help="Print per-task timing statistics and exit.",
+        )
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            return self.print_stats()
+
+        stop = threading.Event()
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *_: stop.set())
+
+        requeue_stale()
+        concurrency = max(options["concurrency"], 1)
+        work_args = (stop, options["burst"], options["poll_interval"])
+        if concurrency == 1:
+            self.work(f"{worker_id}:0", *work_args)
+            return
+
+        threads = [
+            threading.Thread(
+                target=self.work_in_thread, args=(f"{worker_id}:{i}", *work_args)
+            )
+            for i in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1)
+
+    def work(self, worker_id, stop, burst, poll_interval, between_jobs=None):
+        while not stop.is_set():
+            if between_jobs is not None:
+                between_jobs()
+            jobs = claim(worker_id)
+            if not jobs:
+                if burst:
+                    break
+                stop.wait(poll_interval)
+                continue
+            for job in jobs:
+                status = "done" if run(job) else "failed"
+                self.stdout.write(f"[{worker_id}] {job.name} #{job.pk} {status}")
+
+    def work_in_thread(self, *args):
+        try:
+            self.work(*args, between_jobs=close_old_connections)
+        finally:
+            connection.close()
+
+    def print_stats(self):
+        self.stdout.write(
+            f"{'task':<32} {'runs':>8} {'failures':>8} {'avg s':>9} {'max s':>9}"
+        )
+        for stat in TaskStat.objects.order_by("name"):
+            self.stdout.write(
+                f"{stat.name:<32} {stat.runs:>8} {stat.failures:>8} "
+                f"{stat.avg_time:>9.3f} {stat.max_time:>9.3f}"
+            )
@@ -0,0 +1,156 @@
+import functools
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Job, TaskStat
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+class Task:
+    def __init__(self, func, name, max_attempts):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        return enqueue(self.name, *args, **kwargs)
+
+
+def task(name, max_attempts=None):
+    """Register the decorated function as a queueable task called ``name``."""
+
+    def decorator(func):
+        registry[name] = Task(func, name, max_attempts or settings.TASKS_MAX_ATTEMPTS)
+        return registry[name]
+
+    return decorator
+
+
+def enqueue(name, *args, **kwargs):
+    """
+    Queue a call of the task ``name`` with JSON-serializable arguments.
+
+    The job row is written in the caller's transaction, so workers only see
+    it once that transaction commits and it vanishes if it rolls back.
+    """
+    task = registry[name]
+    if settings.TASKS_EAGER:
+        task(*args, **kwargs)
+        return None
+    return Job.objects.create(
+        name=name, args=list(args), kwargs=kwargs, max_attempts=task.max_attempts
+    )
+
+
+def schedule(run_at, name, *args, **kwargs):
+    """
+    Queue a call of the task ``name`` to run no earlier than ``run_at``.
+
+    Unlike ``enqueue()`` this writes the job even with TASKS_EAGER, since
+    running it right away would defeat the delay.
+    """
+    return Job.objects.create(
+        name=name,
+        args=list(args),
+        kwargs=kwargs,
+        max_attempts=registry[name].max_attempts,
+        run_at=run_at,
+    )
+
+
+def claim(worker_id, limit=1):
+    now = timezone.now()
+    pending = (
+        Job.objects.filter(status=Job.QUEUED, run_at__lte=now)
+        .order_by("run_at", "id")
+        .values_list("pk", flat=True)
+    )
+    claim_fields = {
+        "status": Job.RUNNING,
+        "locked_by": worker_id,
+        "locked_at": now,
+        "attempts": F("attempts") + 1,
+    }
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            pks = list(pending.select_for_update(skip_locked=True)[:limit])
+            Job.objects.filter(pk__in=pks).update(**claim_fields)
+    else:
+        # Without SKIP LOCKED (SQLite) the status column is the lock: only
+        # the worker whose conditional UPDATE flips it owns the job.
+        pks = [
+            pk
+            for pk in pending[:limit]
+            if Job.objects.filter(pk=pk, status=Job.QUEUED).update(**claim_fields)
+        ]
+    return list(Job.objects.filter(pk__in=pks).order_by("run_at", "id"))
+
+
+def run(job):
+    task = registry.get(job.name)
+    start = time.perf_counter()
+    try:
+        if task is None:
+            raise LookupError(f"Unknown task {job.name!r}")
+        task(*job.args, **job.kwargs)
+    except Exception:
+        record(job.name, time.perf_counter() - start, failed=True)
+        logger.exception("Job %s (%s) failed", job.pk, job.name)
+        retry(job, traceback.format_exc())
+        return False
+    record(job.name, time.perf_counter() - start)
+    Job.objects.filter(pk=job.pk).delete()
+    return True
+
+
+def retry(job, error):
+    jobs = Job.objects.filter(pk=job.pk)
+    if job.attempts >= job.max_attempts:
+        jobs.update(status=Job.FAILED, locked_by="", locked_at=None, last_error=error)
+        return
+    delay = min(
+        settings.TASKS_RETRY_BACKOFF * 2 ** (job.attempts - 1),
+        settings.TASKS_RETRY_BACKOFF_MAX,
+    )
+    jobs.update(
+        status=Job.QUEUED,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        locked_by="",
+        locked_at=None,
+        last_error=error,
+    )
+
+
+def requeue_stale():
+    """Give jobs held by workers that died mid-run back to the queue."""
+    cutoff = timezone.now() - timedelta(seconds=settings.TASKS_LOCK_TIMEOUT)
+    stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=cutoff)
+    stale.filter(attempts__gte=F("max_attempts")).update(
+        status=Job.FAILED, locked_by="", locked_at=None, last_error="Lock timed out."
+    )
+    return stale.update(status=Job.QUEUED, locked_by="", locked_at=None)
+
+
+def record(name, elapsed, failed=False):
+    TaskStat.objects.get_or_create(name=name)
+    TaskStat.objects.filter(name=name).update(
+        runs=F("runs") + 1,
+        failures=F("failures") + int(failed),
+        total_time=F("total_time") + elapsed,
+        max_time=Greatest("max_time", Value(elapsed)),
+    )
@@ -1,4 +1,13 @@
+import io
+from functools import partial
+
 import pytest
+from PIL import Image
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+
+pytest_plugins = ["api.pytest_plugin"]
 
 
 @pytest.fixture
@@ -37,3 +46,28 @@ def auto_login_user(db, client, create_user, test_password):
         return client, user
 
     return make_auto_login
+
+
+@pytest.fixture
+def on_commit():
+    """Runs the on_commit callbacks of a block, which tests never commit."""
+    return partial(TestCase.captureOnCommitCallbacks, execute=True)
+
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def make_image():
+    def make(name="photo.jpg", size=(800, 600), color="red", format="JPEG", exif=None):
+        buffer = io.BytesIO()
+        options = {"exif": exif.tobytes()} if exif is not None else {}
+        Image.new("RGB", size, color).save(buffer, format, **options)
+        return SimpleUploadedFile(
+            name, buffer.getvalue(), content_type=f"image/{format.lower()}"
+        )
+
+    return make
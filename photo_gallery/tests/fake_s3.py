@@ -0,0 +1,309 @@
+"""
+An in-process stand-in for an S3-compatible object store.
+
+It keeps one bucket in memory and checks what the store would: signatures
+of signed and presigned requests, POST policies, payload hashes and SHA-256
+checksums. Only the requests ``gallery.s3`` sends, multipart uploads
+included, are understood.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import re
+import threading
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from uuid import uuid4
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from gallery.s3 import UNSIGNED_PAYLOAD, policy_signature, signature
+
+AUTHORIZATION_RE = re.compile(
+    r"Credential=(?P<access_key>[^/]+)/[^,]+, "
+    r"SignedHeaders=(?P<headers>[^,]+), Signature=(?P<signature>[0-9a-f]+)"
+)
+
+
+class FakeS3(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, bucket, access_key, secret_key, region):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        # key -> (body, content type, base64 SHA-256 or None, mtime)
+        self.objects = {}
+        # upload id -> (key, content type, {part number: body})
+        self.uploads = {}
+
+    @property
+    def endpoint_url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+def parse_timestamp(timestamp):
+    return datetime.strptime(timestamp, "%Y%m%dT%H%M%SZ").replace(
+        tzinfo=dt_timezone.utc
+    )
+
+
+def parse_multipart(body, content_type):
+    boundary = re.search(r"boundary=(.+)", content_type).group(1).encode()
+    fields, file = {}, None
+    for part in body.split(b"--" + boundary)[1:-1]:
+        head, _, value = part[2:-2].partition(b"\r\n\r\n")
+        name = re.search(rb'name="([^"]+)"', head).group(1).decode()
+        if name == "file":
+            file = value
+        else:
+            fields[name] = value.decode()
+    return fields, file
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def error(self, status, code):
+        self.reply(status, f"<Error><Code>{code}</Code></Error>".encode())
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def query(self):
+        return dict(parse_qsl(urlsplit(self.path).query, keep_blank_values=True))
+
+    def key(self):
+        path = unquote(urlsplit(self.path).path)
+        prefix = f"/{self.server.bucket}/"
+        return path[len(prefix) :] if path.startswith(prefix) else None
+
+    def authorized(self, body):
+        url = urlsplit(self.path)
+        query = dict(parse_qsl(url.query, keep_blank_values=True))
+        headers = {name.lower(): value for name, value in self.headers.items()}
+        try:
+            if "X-Amz-Signature" in query:
+                given = query.pop("X-Amz-Signature")
+                access_key = query["X-Amz-Credential"].split("/")[0]
+                signed = query["X-Amz-SignedHeaders"].split(";")
+                timestamp = query["X-Amz-Date"]
+                payload = UNSIGNED_PAYLOAD
+                expires = timedelta(seconds=int(query["X-Amz-Expires"]))
+                if parse_timestamp(timestamp) + expires < datetime.now(dt_timezone.utc):
+                    return False
+            else:
+                match = AUTHORIZATION_RE.search(headers["authorization"])
+                given = match["signature"]
+                access_key = match["access_key"]
+                signed = match["headers"].split(";")
+                timestamp = headers["x-amz-date"]
+                payload = headers["x-amz-content-sha256"]
+                if payload != hashlib.sha256(body).hexdigest():
+                    return False
+            expected = signature(
+                self.server.secret_key,
+                self.server.region,
+                timestamp,
+                self.command,
+                unquote(url.path),
+                query,
+                {name: headers[name] for name in signed},
+                payload,
+            )
+        except (KeyError, TypeError, ValueError):
+            return False
+        return (
+            "host" in signed
+            and access_key == self.server.access_key
+            and hmac.compare_digest(given, expected)
+        )
+
+    def checksum_matches(self, body, checksum):
+        return checksum is None or (
+            checksum == base64.b64encode(hashlib.sha256(body).digest()).decode()
+        )
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        if not self.authorized(b""):
+            return self.error(403, "SignatureDoesNotMatch")
+        obj = self.server.objects.get(self.key())
+        if obj is None:
+            return self.error(404, "NoSuchKey")
+        body, content_type, checksum, modified = obj
+        headers = {"Content-Type": content_type, "Last-Modified": modified}
+        if checksum and self.headers.get("x-amz-checksum-mode") == "ENABLED":
+            headers["x-amz-checksum-sha256"] = checksum
+        match = re.match(r"bytes=(\d+)-(\d+)$", self.headers.get("Range", ""))
+        if match:
+            start, end = int(match[1]), min(int(match[2]), len(body) - 1)
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+            return self.reply(206, body[start : end + 1], headers)
+        self.reply(200, body, headers)
+
+    def do_PUT(self):
+        body = self.read_body()
+        if not self.authorized(body):
+            return self.error(403, "SignatureDoesNotMatch")
+        query = self.query()
+        if "uploadId" in query:
+            upload = self.server.uploads.get(query["uploadId"])
+            if upload is None:
+                return self.error(404, "NoSuchUpload")
+            upload[2][int(query["partNumber"])] = body
+            etag = f'"{hashlib.md5(body).hexdigest()}"'
+            return self.reply(200, headers={"ETag": etag})
+        source = self.headers.get("x-amz-copy-source")
+        if source:
+            obj = self.server.objects.get(
+                unquote(source)[len(self.server.bucket) + 2 :]
+            )
+            if obj is None:
+                return self.error(404, "NoSuchKey")
+            if source == urlsplit(self.path).path and (
+                self.headers.get("x-amz-metadata-directive") != "REPLACE"
+            ):
+                return self.error(400, "InvalidRequest")
+            body, _, checksum, _ = obj
+            content_type = self.headers.get("Content-Type", obj[1])
+        else:
+            checksum = self.headers.get("x-amz-checksum-sha256")
+            if not self.checksum_matches(body, checksum):
+                return self.error(400, "BadDigest")
+            content_type = self.headers.get("Content-Type", "binary/octet-stream")
+        self.server.objects[self.key()] = (
+            body,
+            content_type,
+            checksum,
+            formatdate(usegmt=True),
+        )
+        self.reply(200, b"<CopyObjectResult/>" if source else b"")
+
+    def do_DELETE(self):
+        if not self.authorized(b""):
+            return self.error(403, "SignatureDoesNotMatch")
+        upload_id = self.query().get("uploadId")
+        if upload_id is not None:
+            self.server.uploads.pop(upload_id, None)
+        else:
+            self.server.objects.pop(self.key(), None)
+        self.reply(204)
+
+    def do_POST(self):
+        body = self.read_body()
+        query = self.query()
+        if "uploads" in query or "uploadId" in query:
+            return self.multipart_upload(body, query)
+        fields, file = parse_multipart(body, self.headers.get("Content-Type", ""))
+        if file is None or not self.policy_allows(fields, file):
+            return self.error(403, "AccessDenied")
+        checksum = fields.get("x-amz-checksum-sha256")
+        if not self.checksum_matches(file, checksum):
+            return self.error(400, "BadDigest")
+        self.server.objects[fields["key"]] = (
+            file,
+            fields.get("Content-Type", "binary/octet-stream"),
+            checksum,
+            formatdate(usegmt=True),
+        )
+        self.reply(204)
+
+    def multipart_upload(self, body, query):
+        if not self.authorized(body):
+            return self.error(403, "SignatureDoesNotMatch")
+        if "uploads" in query:
+            upload_id = uuid4().hex
+            content_type = self.headers.get("Content-Type", "binary/octet-stream")
+            self.server.uploads[upload_id] = (self.key(), content_type, {})
+            return self.reply(
+                200,
+                f"<InitiateMultipartUploadResult><UploadId>{upload_id}"
+                "</UploadId></InitiateMultipartUploadResult>".encode(),
+            )
+        upload = self.server.uploads.pop(query["uploadId"], None)
+        if upload is None:
+            return self.error(404, "NoSuchUpload")
+        key, content_type, parts = upload
+        listed = re.findall(
+            rb"<PartNumber>(\d+)</PartNumber><ETag>([^<]+)</ETag>", body
+        )
+        if not listed or any(
+            int(number) not in parts
+            or etag.decode() != f'"{hashlib.md5(parts[int(number)]).hexdigest()}"'
+            for number, etag in listed
+        ):
+            return self.error(400, "InvalidPart")
+        content = b"".join(parts[int(number)] for number, _ in listed)
+        self.server.objects[key] = (
+            content,
+            content_type,
+            None,
+            formatdate(usegmt=True),
+        )
+        self.reply(200, b"<CompleteMultipartUploadResult/>")
+
+    def policy_allows(self, fields, file):
+        try:
+            expected = policy_signature(
+                self.server.secret_key,
+                self.server.region,
+                fields["x-amz-date"],
+                fields["policy"],
+            )
+            if not hmac.compare_digest(fields["x-amz-signature"], expected):
+                return False
+            policy = json.loads(base64.b64decode(fields["policy"]))
+        except (KeyError, ValueError):
+            return False
+        expiration = datetime.strptime(policy["expiration"], "%Y-%m-%dT%H:%M:%S.%fZ")
+        if expiration.replace(tzinfo=dt_timezone.utc) < datetime.now(dt_timezone.utc):
+            return False
+        # Every field but these must be allowed by a condition.
+        unchecked = set(fields) - {"policy", "x-amz-signature"}
+        for condition in policy["conditions"]:
+            if isinstance(condition, dict):
+                ((name, value),) = condition.items()
+                condition = ["eq", f"${name}", value]
+            operator, *arguments = condition
+            if operator == "content-length-range":
+                if not arguments[0] <= len(file) <= arguments[1]:
+                    return False
+                continue
+            name, value = arguments[0].lstrip("$"), arguments[1]
+            actual = self.server.bucket if name == "bucket" else fields.get(name)
+            if actual is None:
+                return False
+            if operator == "eq" and actual != value:
+                return False
+            if operator == "starts-with" and not actual.startswith(value):
+                return False
+            unchecked.discard(name)
+        return not unchecked
@@ -6,9 +6,11 @@ from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import Client
 
+from api.middleware import QueryBudgetExceeded, QueryRecorder
+from api.pagination import FeedPagination, KeysetPagination
+from api.views import StreamMixin, UserPhotosApi
 from gallery.models import Album, Photo, Comment, Bookmark
 
-
 User = get_user_model()
 pytestmark = pytest.mark.django_db
 client = Client()
@@ -22,7 +24,7 @@ class TestAlbum:
         client.force_login(user=user)
         response = client.get(url)
         assert response.status_code == 200
-        assert len(json.loads(response.content)) == 5
+        assert len(json.loads(response.content)["results"]) == 5
 
     def test_alums_user_list(self, create_user):
         user = create_user(username="test")
@@ -31,7 +33,7 @@ class TestAlbum:
         url = reverse("v1:user_albums", kwargs={"user_pk": user.id})
         response = client.get(url)
         assert response.status_code == 200
-        assert len(json.loads(response.content)) == 5
+        assert len(json.loads(response.content)["results"]) == 5
 
     def test_alums_list_superuser(self, create_user):
         baker.make("gallery.Album", _quantity=5)
@@ -48,13 +50,17 @@ class TestAlbum:
         url = reverse("v1:album", kwargs={"pk": album.id})
         response = client.get(url)
         assert response.status_code == 200
-        assert response.json() == {"id": album.id, "name": album.name}
+        assert response.json() == {
+            "id": album.id,
+            "name": album.name,
+            "photo_count": 0,
+        }
 
     def test_album_create(self, create_user):
         url = reverse("v1:albums")
         user = create_user(username="test")
         client.force_login(user=user)
-        expected_json = {"id": 1, "name": "album name"}
+        expected_json = {"id": 1, "name": "album name", "photo_count": 0}
         response = client.post(
             url,
             {"name": "album name", "owner_id": user.id},
@@ -88,7 +94,7 @@ class TestAlbum:
             url, data=album_dict, content_type="application/json", follow=True
         )
         assert response.status_code == 200
-        assert json.loads(response.content) == album_dict
+        assert json.loads(response.content) == {**album_dict, "photo_count": 0}
         assert Album.objects.all().count() == 1
 
 
@@ -100,7 +106,7 @@ class TestPhoto:
         client.force_login(user=user)
         response = client.get(url)
         assert response.status_code == 200
-        assert len(json.loads(response.content)) == 5
+        assert len(json.loads(response.content)["results"]) == 5
 
     def test_photo_partial_update(self, create_user):
         user = create_user()
@@ -152,7 +158,7 @@ class TestComment:
         url = reverse("v1:photo_comments", kwargs={"photo_pk": photo.id})
         response = client.get(url)
         assert response.status_code == 200
-        assert len(json.loads(response.content)) == 1
+        assert len(json.loads(response.content)["results"]) == 1
 
     def test_comment_create(self, create_user, create_user_1):
         user = create_user(username="test")
@@ -170,6 +176,21 @@ class TestComment:
         assert json.loads(response.content)["text"] == "comment"
         assert Comment.objects.all().count() == 1
 
+    def test_comment_create_duplicate(self, create_user, create_user_1):
+        user = create_user(username="test")
+        client.force_login(user=user)
+        photo = baker.make("gallery.Photo", owner=create_user_1(username="test_1"))
+        baker.make("gallery.Comment", owner=user, photo=photo)
+        url = reverse("v1:photo_comments", kwargs={"photo_pk": photo.id})
+        response = client.post(
+            url, {"photo": photo.id, "text": "again"}, content_type="application/json"
+        )
+        assert response.status_code == 400
+        assert json.loads(response.content) == {
+            "non_field_errors": ["You have already commented on this photo."]
+        }
+        assert Comment.objects.all().count() == 1
+
     def test_comment_delete(self, create_user, create_user_1):
         user = create_user(username="test")
         user_1 = create_user_1(username="test_1")
@@ -192,7 +213,7 @@ class TestBookmark:
         url = reverse("v1:bookmarks")
         response = client.get(url)
         assert response.status_code == 200
-        assert len(json.loads(response.content)) == 5
+        assert len(json.loads(response.content)["results"]) == 5
         assert Bookmark.objects.all().count() == 5
 
     def test_bookmark_user_list(self, create_user):
@@ -202,7 +223,7 @@ class TestBookmark:
         url = reverse("v1:user_bookmarks", kwargs={"user_pk": user.id})
         response = client.get(url)
         assert response.status_code == 200
-        assert len(json.loads(response.content)) == 5
+        assert len(json.loads(response.content)["results"]) == 5
         assert Bookmark.objects.all().count() == 5
 
     def test_bookmark_user_list_not_found(self, create_user):
@@ -232,4 +253,111 @@ class TestFeed:
         url = reverse("v1:feed")
         response = client.get(url)
         assert response.status_code == 200
-        assert json.loads(response.content)[0]["id"] == photo_1.id
+        assert json.loads(response.content)["results"][0]["id"] == photo_1.id
+
+    def test_list_cursor(self, create_user, monkeypatch):
+        monkeypatch.setattr(FeedPagination, "page_size", 2)
+        user = create_user()
+        client.force_login(user=user)
+        photos = baker.make("gallery.Photo", _quantity=5)
+        for photo in photos[:3]:
+            baker.make("gallery.Comment", photo=photo)
+        url = reverse("v1:feed")
+        ids = []
+        while url:
+            response = client.get(url)
+            assert response.status_code == 200
+            content = json.loads(response.content)
+            assert len(content["results"]) <= 2
+            ids += [photo["id"] for photo in content["results"]]
+            url = content["next"]
+        assert ids == [photo.id for photo in photos[2::-1] + photos[:2:-1]]
+
+    def test_list_invalid_cursor(self, create_user):
+        user = create_user()
+        client.force_login(user=user)
+        url = reverse("v1:feed")
+        response = client.get(url, {"cursor": "not-a-cursor"})
+        assert response.status_code == 404
+
+
+class TestPagination:
+    def test_limit(self, create_user):
+        client.force_login(user=create_user())
+        albums = baker.make("gallery.Album", _quantity=5)
+        response = client.get(reverse("v1:albums"), {"limit": 2})
+        content = json.loads(response.content)
+        assert [album["id"] for album in content["results"]] == [
+            albums[4].id,
+            albums[3].id,
+        ]
+        response = client.get(content["next"])
+        assert json.loads(response.content)["results"][0]["id"] == albums[2].id
+
+    def test_limit_capped(self, create_user, monkeypatch):
+        monkeypatch.setattr(KeysetPagination, "max_page_size", 3)
+        client.force_login(user=create_user())
+        baker.make("gallery.Album", _quantity=5)
+        response = client.get(reverse("v1:albums"), {"limit": 1000})
+        assert len(json.loads(response.content)["results"]) == 3
+
+    def test_stream(self, create_user, monkeypatch):
+        monkeypatch.setattr(StreamMixin, "stream_chunk_size", 2)
+        user = create_user()
+        client.force_login(user=user)
+        photos = baker.make("gallery.Photo", owner=user, _quantity=5)
+        url = reverse("v1:user_photos", kwargs={"user_pk": user.id})
+        response = client.get(url, {"stream": 1})
+        assert response.status_code == 200
+        assert response["Content-Type"] == "application/x-ndjson"
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        assert [json.loads(line)["id"] for line in lines] == [
+            photo.id for photo in reversed(photos)
+        ]
+
+
+class TestQueryBudget:
+    def test_list_without_n_plus_one(self, create_user):
+        user = create_user()
+        client.force_login(user=user)
+        for photo in baker.make("gallery.Photo", owner=user, _quantity=5):
+            for size in (160, 640):
+                baker.make("gallery.Rendition", photo=photo, size=size, file="r.jpg")
+        url = reverse("v1:user_photos", kwargs={"user_pk": user.id})
+        response = client.get(url)
+        assert response.status_code == 200
+        assert len(response.json()["results"]) == 5
+
+    def test_photo_delete(self, create_user, create_user_1):
+        user = create_user()
+        client.force_login(user=user)
+        photo = baker.make("gallery.Photo", owner=user)
+        baker.make("gallery.Comment", photo=photo, owner=create_user_1())
+        baker.make("gallery.Rendition", photo=photo, file="r.jpg")
+        response = client.delete(reverse("v1:photo", kwargs={"pk": photo.id}))
+        assert response.status_code == 204
+
+    def test_exceeded(self, create_user, monkeypatch):
+        user = create_user()
+        client.force_login(user=user)
+        baker.make("gallery.Photo", owner=user)
+        monkeypatch.setattr(UserPhotosApi, "query_budget", 1)
+        url = reverse("v1:user_photos", kwargs={"user_pk": user.id})
+        with pytest.raises(QueryBudgetExceeded, match="UserPhotosApi"):
+            client.get(url)
+
+    def test_headers(self, create_user, settings):
+        settings.QUERY_BUDGET_HEADERS = True
+        client.force_login(user=create_user())
+        response = client.get(reverse("v1:albums"))
+        assert int(response["X-Query-Count"]) > 0
+        assert response["X-Query-Time"].endswith("ms")
+        assert response["X-Query-Duplicates"] == "0"
+
+    def test_recorder_duplicates(self, create_user):
+        albums = baker.make("gallery.Album", _quantity=3)
+        with QueryRecorder() as recorder:
+            for album in Album.objects.filter(id__in=[a.id for a in albums]):
+                album.owner.username
+        assert recorder.count == 4
+        assert recorder.duplicates[0][1] == 3
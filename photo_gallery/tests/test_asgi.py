@@ -0,0 +1,152 @@
+import asyncio
+import importlib
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from model_bakery import baker
+
+from django.urls import clear_url_caches, resolve
+
+import api.urls
+import core.urls
+from api.asynchronous import ASGIHandler
+from api.authentication import ACCESS, make_token
+from api.views import FeedApi
+
+# Async variants query from pool threads, on connections of their own.
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def reload_urls():
+    importlib.reload(api.urls)
+    importlib.reload(core.urls)
+    clear_url_caches()
+
+
+@pytest.fixture
+def async_views(settings):
+    # As core.settings does when the ASGI deployment sets API_ASYNC_VIEWS.
+    settings.API_ASYNC_VIEWS = True
+    settings.MIDDLEWARE = [
+        name for name in settings.MIDDLEWARE if not name.startswith("whitenoise.")
+    ]
+    settings.QUERY_BUDGET_HEADERS = True
+    reload_urls()
+    yield
+    settings.API_ASYNC_VIEWS = False
+    reload_urls()
+
+
+def request(user, method, path, body=b"", query="", headers=()):
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "path": path,
+        "query_string": query.encode(),
+        "headers": [
+            (b"host", b"testserver"),
+            (b"authorization", f"Bearer {make_token(user, ACCESS)}".encode()),
+            (b"content-length", str(len(body)).encode()),
+            *headers,
+        ],
+    }
+
+    async def communicate():
+        communicator = ApplicationCommunicator(ASGIHandler(), scope)
+        # A slow client: the body arrives in small messages.
+        for start in range(0, len(body), 4096):
+            await communicator.send_input(
+                {
+                    "type": "http.request",
+                    "body": body[start : start + 4096],
+                    "more_body": start + 4096 < len(body),
+                }
+            )
+        if not body:
+            await communicator.send_input({"type": "http.request"})
+        start = await communicator.receive_output(5)
+        content = b""
+        while True:
+            message = await communicator.receive_output(5)
+            content += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        await communicator.wait(5)
+        return start["status"], dict(start["headers"]), content
+
+    return async_to_sync(communicate)()
+
+
+class TestAsyncViews:
+    def test_routes(self, async_views):
+        assert asyncio.iscoroutinefunction(resolve("/api/feed/").func)
+        assert not asyncio.iscoroutinefunction(resolve("/api/albums/").func)
+
+    def test_sync_routes(self):
+        assert not asyncio.iscoroutinefunction(resolve("/api/feed/").func)
+
+    def test_feed(self, async_views, create_user):
+        user = create_user()
+        baker.make("gallery.Photo", owner=user, _quantity=3)
+        status, headers, content = request(user, "GET", "/api/feed/")
+        assert status == 200
+        assert len(json.loads(content)["results"]) == 3
+        # Queries on the pool threads count against the budget.
+        assert int(headers[b"X-Query-Count"]) > 0
+
+    def test_query_budget(self, async_views, create_user, monkeypatch):
+        user = create_user()
+        monkeypatch.setattr(FeedApi, "query_budget", 0)
+        status, _, _ = request(user, "GET", "/api/feed/")
+        assert status == 500
+
+    def test_stream(self, async_views, create_user):
+        user = create_user()
+        baker.make("gallery.Photo", owner=user, _quantity=5)
+        status, headers, content = request(
+            user, "GET", f"/api/user/{user.id}/photos/", query="stream=1"
+        )
+        assert status == 200
+        assert headers[b"Content-Type"] == b"application/x-ndjson"
+        assert len(content.splitlines()) == 5
+
+    def test_upload(self, async_views, create_user, media_root, make_image, settings):
+        user = create_user()
+        settings.FILE_UPLOAD_MAX_MEMORY_SIZE = 1024
+        album = baker.make("gallery.Album", owner=user)
+        content = make_image().read()
+        status, _, body = request(
+            user,
+            "POST",
+            "/api/uploads/",
+            json.dumps(
+                {
+                    "album": album.id,
+                    "description": "async",
+                    "filename": "photo.jpg",
+                    "size": len(content),
+                }
+            ).encode(),
+            headers=[(b"content-type", b"application/json")],
+        )
+        assert status == 201, body
+        session = json.loads(body)
+
+        status, headers, _ = request(
+            user,
+            "PATCH",
+            f"/api/upload/{session['id']}/",
+            content,
+            headers=[
+                (b"content-type", b"application/offset+octet-stream"),
+                (b"upload-offset", b"0"),
+            ],
+        )
+        assert status == 204
+        assert headers[b"Upload-Offset"] == str(len(content)).encode()
+
+        status, _, body = request(user, "POST", f"/api/upload/{session['id']}/finish/")
+        assert status == 201, body
@@ -0,0 +1,110 @@
+import pytest
+
+from django.core import signing
+from django.test import Client
+from django.urls import reverse
+
+from api.authentication import ACCESS, make_token, user_cache
+from api.checks import check_replica_pin_cache, check_token_revocation_cache
+
+pytestmark = pytest.mark.django_db
+client = Client()
+
+
+@pytest.fixture
+def tokens(create_user, test_password):
+    user = create_user()
+    response = client.post(
+        reverse("v1:token"),
+        {"email": user.email, "password": test_password},
+        content_type="application/json",
+    )
+    assert response.status_code == 200
+    return user, response.json()
+
+
+class TestTokenAuth:
+    def test_obtain_invalid_password(self, create_user):
+        user = create_user()
+        response = client.post(
+            reverse("v1:token"),
+            {"email": user.email, "password": "wrong"},
+            content_type="application/json",
+        )
+        assert response.status_code == 400
+
+    def test_access(self, tokens):
+        user, data = tokens
+        response = client.get(
+            reverse("v1:user"), HTTP_AUTHORIZATION=f"Bearer {data['access']}"
+        )
+        assert response.status_code == 200
+        assert response.json()[0]["id"] == user.id
+
+    def test_invalid_token(self, tokens):
+        _, data = tokens
+        for token in ("garbage", data["refresh"]):
+            response = client.get(
+                reverse("v1:user"), HTTP_AUTHORIZATION=f"Bearer {token}"
+            )
+            assert response.status_code == 401
+            assert response["WWW-Authenticate"].startswith("Bearer")
+
+    def test_expired_token(self, tokens, mocker):
+        user, data = tokens
+        mocker.patch.object(signing, "time").time.return_value = 10**10
+        response = client.get(
+            reverse("v1:user"), HTTP_AUTHORIZATION=f"Bearer {data['access']}"
+        )
+        assert response.status_code == 401
+
+    def test_refresh(self, tokens):
+        _, data = tokens
+        response = client.post(
+            reverse("v1:token_refresh"),
+            {"refresh": data["refresh"]},
+            content_type="application/json",
+        )
+        assert response.status_code == 200
+        assert set(response.json()) == {"access", "refresh", "expires_in"}
+        response = client.post(
+            reverse("v1:token_refresh"),
+            {"refresh": data["access"]},
+            content_type="application/json",
+        )
+        assert response.status_code == 401
+
+    def test_password_change_revokes_tokens(self, tokens):
+        user, data = tokens
+        user.set_password("another password")
+        user.save()
+        response = client.get(
+            reverse("v1:user"), HTTP_AUTHORIZATION=f"Bearer {data['access']}"
+        )
+        assert response.status_code == 401
+
+    def test_user_cache_invalidation(self, create_user):
+        user = create_user()
+        token = make_token(user, ACCESS)
+        assert user_cache.get(user.id).first_name == ""
+        user.first_name = "Ivan"
+        user.save()
+        assert user_cache.get(user.id).first_name == "Ivan"
+        user.is_active = False
+        user.save()
+        response = client.get(reverse("v1:user"), HTTP_AUTHORIZATION=f"Bearer {token}")
+        assert response.status_code == 401
+
+
+class TestCacheCheck:
+    def test_local_cache_with_workers(self, settings):
+        assert check_token_revocation_cache(None) == []
+        settings.WEB_CONCURRENCY = 3
+        assert [error.id for error in check_token_revocation_cache(None)] == [
+            "api.E001"
+        ]
+
+    def test_local_cache_with_replicas(self, settings):
+        assert check_replica_pin_cache(None) == []
+        settings.DATABASE_REPLICAS = ["replica1"]
+        assert [error.id for error in check_replica_pin_cache(None)] == ["api.E002"]
@@ -0,0 +1,81 @@
+import pytest
+from model_bakery import baker
+
+from django.core.cache import caches
+from django.test import Client
+from django.urls import reverse
+
+from api.cache import payload_cache
+
+pytestmark = pytest.mark.django_db
+client = Client()
+
+
+@pytest.fixture(autouse=True)
+def reset_cache():
+    payload_cache.reset()
+    yield
+    payload_cache.reset()
+
+
+class TestPayloadCache:
+    def test_read_through(self, create_user, django_assert_num_queries):
+        user = create_user()
+        client.force_login(user=user)
+        album = baker.make("gallery.Album", owner=user)
+        url = reverse("v1:album", kwargs={"pk": album.id})
+        response = client.get(url)
+        assert response["X-Cache"] == "miss"
+
+        # Session, user and versions; the album itself comes from the cache.
+        with django_assert_num_queries(3):
+            cached = client.get(url)
+        assert cached["X-Cache"] == "hit"
+        assert cached.json() == response.json()
+        assert payload_cache.stats()["hits"] == 1
+        assert payload_cache.stats()["misses"] == 1
+
+    def test_invalidation(self, create_user):
+        user = create_user()
+        client.force_login(user=user)
+        album = baker.make("gallery.Album", owner=user)
+        other = baker.make("gallery.Album", owner=user)
+        url = reverse("v1:album", kwargs={"pk": album.id})
+        other_url = reverse("v1:album", kwargs={"pk": other.id})
+        client.get(url)
+        client.get(other_url)
+
+        baker.make("gallery.Photo", owner=user, album=album)
+        response = client.get(url)
+        assert response["X-Cache"] == "miss"
+        assert response.json()["photo_count"] == 1
+        assert client.get(other_url)["X-Cache"] == "hit"
+
+    def test_user_lists(self, create_user):
+        user = create_user()
+        client.force_login(user=user)
+        baker.make("gallery.Photo", owner=user)
+        url = reverse("v1:user_photos", kwargs={"user_pk": user.id})
+        assert client.get(url)["X-Cache"] == "miss"
+        assert client.get(url)["X-Cache"] == "hit"
+
+        photo = baker.make("gallery.Photo", owner=user)
+        response = client.get(url)
+        assert response["X-Cache"] == "miss"
+        assert photo.id in [item["id"] for item in response.json()["results"]]
+
+    def test_evictions(self):
+        cache = caches["api"]
+        for i in range(cache._max_entries + 1):
+            cache.set(f"key{i}", i)
+        assert payload_cache.stats()["evictions"] > 0
+        assert payload_cache.stats()["size"] <= cache._max_entries
+
+    def test_stats_admin_only(self, create_user, django_user_model):
+        client.force_login(user=create_user())
+        url = reverse("v1:cache_stats")
+        assert client.get(url).status_code == 403
+        client.force_login(django_user_model.objects.get(is_superuser=True))
+        response = client.get(url)
+        assert response.status_code == 200
+        assert set(response.json()) == {"hits", "misses", "evictions", "size"}
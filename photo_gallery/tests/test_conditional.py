@@ -0,0 +1,85 @@
+import pytest
+from model_bakery import baker
+
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+
+from gallery.models import Version
+
+pytestmark = pytest.mark.django_db
+client = Client()
+
+
+class TestConditionalGet:
+    def test_not_modified(self, create_user, django_assert_num_queries):
+        user = create_user()
+        client.force_login(user=user)
+        photo = baker.make("gallery.Photo", owner=user)
+        url = reverse("v1:photo", kwargs={"pk": photo.id})
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response["Last-Modified"]
+
+        # Session, user and versions; the photo itself is not queried.
+        with django_assert_num_queries(3):
+            response = client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        assert response.status_code == 304
+        assert response.content == b""
+
+    def test_changes_on_write(self, create_user, create_user_1, on_commit):
+        user = create_user()
+        client.force_login(user=user)
+        with on_commit():
+            photo = baker.make("gallery.Photo", owner=user)
+        urls = [
+            reverse("v1:photo_comments", kwargs={"photo_pk": photo.id}),
+            reverse("v1:photo", kwargs={"pk": photo.id}),
+            reverse("v1:user_photos", kwargs={"user_pk": user.id}),
+            reverse("v1:feed"),
+        ]
+        etags = [client.get(url)["ETag"] for url in urls]
+
+        with on_commit():
+            baker.make("gallery.Comment", photo=photo, owner=create_user_1())
+        for url, etag in zip(urls, etags):
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+            assert response.status_code == 200
+            assert response["ETag"] != etag
+
+    def test_collections_bumped_on_commit(self, create_user, on_commit):
+        user = create_user()
+        with on_commit():
+            with transaction.atomic():
+                baker.make("gallery.Album", owner=user)
+                assert not Version.objects.filter(key="albums").exists()
+                assert Version.objects.get(key=f"user:{user.pk}:albums").value == 1
+        assert Version.objects.get(key="albums").value == 1
+
+    def test_unrelated_write(self, create_user):
+        user = create_user()
+        client.force_login(user=user)
+        photo = baker.make("gallery.Photo", owner=user)
+        url = reverse("v1:photo", kwargs={"pk": photo.id})
+        etag = client.get(url)["ETag"]
+        baker.make("gallery.Photo", owner=user, album=photo.album)
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    def test_query_string(self, create_user):
+        user = create_user()
+        client.force_login(user=user)
+        baker.make("gallery.Photo", owner=user)
+        etag = client.get(reverse("v1:feed"))["ETag"]
+        response = client.get(
+            reverse("v1:feed") + "?cursor=abc", HTTP_IF_NONE_MATCH=etag
+        )
+        assert response.status_code != 304
+
+    def test_user_me(self, create_user):
+        user = create_user()
+        client.force_login(user=user)
+        url = reverse("v1:user")
+        etag = client.get(url)["ETag"]
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+        baker.make("gallery.Album", owner=user)
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
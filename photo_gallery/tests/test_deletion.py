@@ -0,0 +1,165 @@
+from io import StringIO
+
+import pytest
+from model_bakery import baker
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+
+from api.authentication import ACCESS, make_token
+from gallery.deletion import delete_chunks
+from gallery.models import Album, Blob, Bookmark, Comment, Deletion, Photo
+from gallery.search import search_photos
+
+User = get_user_model()
+pytestmark = pytest.mark.django_db
+
+
+def run_worker():
+    call_command("runworker", burst=True, concurrency=1, stdout=StringIO())
+
+
+@pytest.fixture(autouse=True)
+def deletion_settings(settings):
+    settings.DELETION_ASYNC_THRESHOLD = 3
+    settings.DELETION_CHUNK_SIZE = 2
+    settings.DELETION_CHUNK_PAUSE = 0
+
+
+def make_album(owner, other, make_image):
+    """An album of four photos, three of them commented and bookmarked."""
+    album = baker.make(Album, owner=owner)
+    photos = [
+        baker.make(
+            Photo,
+            owner=owner,
+            album=album,
+            description="harbour",
+            photo=make_image(color=color),
+        )
+        for color in ("red", "green", "blue", "red")
+    ]
+    for photo in photos[:3]:
+        baker.make(Comment, owner=other, photo=photo, text="nice harbour")
+        baker.make(Bookmark, owner=other, photo=photo)
+    return album
+
+
+def client_for(user):
+    return Client(HTTP_AUTHORIZATION=f"Bearer {make_token(user, ACCESS)}")
+
+
+class TestAlbumDeletion:
+    def test_small_album_deleted_at_once(self, create_user, settings):
+        owner = create_user()
+        settings.DELETION_ASYNC_THRESHOLD = 100
+        album = baker.make(Album, owner=owner)
+        response = client_for(owner).delete(
+            reverse("v1:album", kwargs={"pk": album.pk})
+        )
+        assert response.status_code == 204
+        assert not Album.objects.exists()
+
+    def test_hidden_then_deleted(
+        self, create_user, create_user_1, media_root, make_image
+    ):
+        owner, other = create_user(), create_user_1()
+        album = make_album(owner, other, make_image)
+        photo = Photo.objects.filter(album=album).first()
+        client = client_for(owner)
+        response = client.delete(reverse("v1:album", kwargs={"pk": album.pk}))
+        assert response.status_code == 202
+        assert response.json()["status"] == "running"
+        assert response.json()["total"] == 10
+        status_url = response["Location"]
+
+        for url in (
+            reverse("v1:album", kwargs={"pk": album.pk}),
+            reverse("v1:photo", kwargs={"pk": photo.pk}),
+        ):
+            assert client.get(url).status_code == 404
+        assert client.get(reverse("v1:feed")).json()["results"] == []
+        assert client_for(other).get(reverse("v1:bookmarks")).json()["results"] == []
+
+        run_worker()
+        assert not Album.objects.exists()
+        assert not Photo.objects.exists()
+        assert not Comment.objects.exists()
+        owner.refresh_from_db()
+        other.refresh_from_db()
+        assert (owner.album_count, owner.photo_count) == (0, 0)
+        assert (other.comment_count, other.bookmark_count) == (0, 0)
+        assert list(Blob.objects.values_list("refcount", flat=True)) == [0, 0, 0]
+        assert search_photos(["harbour"]) == []
+
+        status = Client().get(status_url).json()
+        assert status["status"] == "done"
+        assert status["deleted"] == 10
+        assert status["progress"] == 1.0
+
+    def test_hands_over_in_chunks(
+        self, create_user, create_user_1, media_root, make_image
+    ):
+        owner = create_user()
+        album = make_album(owner, create_user_1(), make_image)
+        client_for(owner).delete(reverse("v1:album", kwargs={"pk": album.pk}))
+        deletion = Deletion.objects.get()
+        assert not delete_chunks(deletion, seconds=0)
+        deletion.refresh_from_db()
+        assert deletion.deleted == 2
+        assert Comment.objects.count() == 1
+
+    def test_no_new_photos(self, create_user, create_user_1, media_root, make_image):
+        owner = create_user()
+        album = make_album(owner, create_user_1(), make_image)
+        client = client_for(owner)
+        client.delete(reverse("v1:album", kwargs={"pk": album.pk}))
+        response = client.post(
+            reverse("v1:uploads"),
+            {"album": album.pk, "description": "", "filename": "a.jpg", "size": 1},
+            "application/json",
+        )
+        assert response.status_code == 400
+
+
+class TestAccountDeletion:
+    def test_hidden_then_deleted(
+        self, create_user, create_user_1, media_root, make_image
+    ):
+        owner, other = create_user(), create_user_1()
+        make_album(owner, other, make_image)
+        theirs = baker.make(Photo, owner=other, album=baker.make(Album, owner=other))
+        baker.make(Comment, owner=owner, photo=theirs, text="harbour view")
+        user_count = User.objects.count()
+
+        response = client_for(owner).delete(reverse("v1:user"))
+        assert response.status_code == 202
+        assert client_for(owner).get(reverse("v1:user")).status_code == 401
+        client = client_for(other)
+        user_url = reverse("v1:user_id", kwargs={"pk": owner.pk})
+        assert client.get(user_url).status_code == 404
+        comments = reverse("v1:photo_comments", kwargs={"photo_pk": theirs.pk})
+        assert client.get(comments).json()["results"] == []
+
+        run_worker()
+        assert User.objects.count() == user_count - 1
+        assert list(Photo.objects.all()) == [theirs]
+        theirs.refresh_from_db()
+        assert (theirs.comment_count, theirs.score) == (0, 0)
+        assert search_photos(["harbour"]) == []
+        assert Deletion.objects.get().finished_at is not None
+
+    def test_counts_read_fresh(self, create_user):
+        owner = create_user()
+        # Token authentication caches the user before these photos exist.
+        client = client_for(owner)
+        assert client.get(reverse("v1:user")).json()[0]["photo_count"] == 0
+        album = baker.make(Album, owner=owner)
+        baker.make(Photo, owner=owner, album=album, _quantity=3)
+
+        response = client.delete(reverse("v1:user"))
+        assert response.status_code == 202
+        owner.refresh_from_db()
+        assert (owner.is_active, owner.photo_count) == (False, 3)
@@ -0,0 +1,100 @@
+import io
+import random
+
+import pytest
+from model_bakery import baker
+from PIL import Image
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client
+from django.urls import reverse
+
+from gallery.duplicates import (
+    MultiIndex,
+    distance,
+    dhash,
+    find_similar,
+    hash_photo,
+    save_hash,
+)
+
+pytestmark = pytest.mark.django_db
+client = Client()
+
+
+def make_scene(seed, size=(800, 600), quality=90):
+    rng = random.Random(seed)
+    noise = Image.frombytes("L", (8, 6), bytes(rng.randrange(256) for _ in range(48)))
+    buffer = io.BytesIO()
+    noise.resize(size, Image.BICUBIC).convert("RGB").save(
+        buffer, "JPEG", quality=quality
+    )
+    return SimpleUploadedFile("scene.jpg", buffer.getvalue())
+
+
+class TestHash:
+    def test_near_duplicates(self):
+        original = dhash(make_scene(1))
+        resized = dhash(make_scene(1, size=(400, 300), quality=30))
+        other = dhash(make_scene(2))
+        assert distance(original, resized) <= 6
+        assert distance(original, other) > 6
+
+    def test_multi_index(self):
+        rng = random.Random(0)
+        hashes = [rng.getrandbits(64) for _ in range(2000)]
+        # Plant neighbours at every distance up to 8.
+        hashes += [hashes[i] ^ ((1 << i) - 1) for i in range(1, 9)]
+        index = MultiIndex()
+        for key, value in enumerate(hashes):
+            index.add(key, value)
+        for value in hashes[:50]:
+            expected = {k for k, h in enumerate(hashes) if distance(h, value) <= 7}
+            assert set(index.search(value, 7)) == expected
+
+    def test_find_similar(self, create_user, create_user_1):
+        user = create_user()
+        photo = baker.make("gallery.Photo", owner=user)
+        near = baker.make("gallery.Photo", owner=user)
+        far = baker.make("gallery.Photo", owner=user)
+        theirs = baker.make("gallery.Photo", owner=create_user_1())
+        value = 0xF0F0F0F0F0F0F0F0
+        save_hash(photo, value)
+        save_hash(near, value ^ 0b101)
+        save_hash(far, value ^ 0xFFFF)
+        save_hash(theirs, value)
+        assert find_similar(user.id, value, 6) == [photo.id, near.id]
+        assert find_similar(user.id, value, 6, exclude=photo.id) == [near.id]
+
+
+class TestDuplicatesApi:
+    def test_clusters(self, create_user, media_root):
+        user = create_user()
+        client.force_login(user=user)
+        first = baker.make("gallery.Photo", owner=user, photo=make_scene(1))
+        second = baker.make(
+            "gallery.Photo", owner=user, photo=make_scene(1, size=(400, 300))
+        )
+        other = baker.make("gallery.Photo", owner=user, photo=make_scene(2))
+        for photo in (first, second, other):
+            hash_photo(photo)
+        response = client.get(reverse("v1:photo_duplicates"))
+        assert response.status_code == 200
+        assert response.json() == [{"photos": [first.id, second.id]}]
+
+    def test_upload_warning(self, create_user, media_root):
+        user = create_user()
+        client.force_login(user=user)
+        album = baker.make("gallery.Album", owner=user)
+        existing = baker.make("gallery.Photo", owner=user, photo=make_scene(1))
+        hash_photo(existing)
+        url = reverse("v1:photos")
+        data = {"description": "again", "album": album.id}
+
+        response = client.post(url, {**data, "photo": make_scene(1, quality=40)})
+        assert "duplicates" not in response.json()
+        response = client.post(
+            f"{url}?duplicates=1", {**data, "photo": make_scene(1, quality=40)}
+        )
+        assert response.status_code == 201
+        assert response.json()["duplicates"] == [existing.id]
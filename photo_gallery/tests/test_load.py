@@ -0,0 +1,6 @@
+from api.urls import urlpatterns
+from benchmarks.load import ROUTES
+
+
+def test_every_route_has_requests():
+    assert sorted(ROUTES) == sorted(pattern.name for pattern in urlpatterns)
@@ -0,0 +1,167 @@
+import pytest
+from model_bakery import baker
+
+from django.test import Client
+from django.urls import reverse
+
+from gallery.geo import (
+    bounds,
+    count_cells,
+    covering_cells,
+    encode,
+    prefixes,
+    zoom_precision,
+)
+from gallery.metadata import save_location
+from gallery.models import LocationCell, fill_cell_photos
+
+pytestmark = pytest.mark.django_db
+client = Client()
+
+SYDNEY = (-33.8568, 151.2153)
+BONDI = (-33.8915, 151.2767)
+LONDON = (51.5007, -0.1246)
+
+
+def locate(user, location):
+    photo = baker.make("gallery.Photo", owner=user)
+    save_location(photo, location)
+    return photo
+
+
+def cells(precision):
+    return {
+        cell.cell: (cell.count, cell.photo_id)
+        for cell in LocationCell.objects.filter(count__gt=0)
+        if len(cell.cell) == precision
+    }
+
+
+class TestGeohash:
+    def test_encode(self):
+        assert encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+        min_lat, min_lon, max_lat, max_lon = bounds("u4pruydqqvj")
+        assert min_lat <= 57.64911 <= max_lat
+        assert min_lon <= 10.40744 <= max_lon
+
+    def test_covering_cells(self):
+        cell = encode(*SYDNEY, 4)
+        min_lat, min_lon, max_lat, max_lon = bounds(cell)
+        bbox = (min_lon + 0.01, min_lat + 0.01, max_lon - 0.01, max_lat - 0.01)
+        assert covering_cells(bbox, 4) == [cell]
+        assert len(covering_cells((-180, -90, 180, 90), 1)) == 32
+
+    def test_antimeridian(self):
+        bbox = (179.0, -1.0, -179.0, 1.0)
+        found = covering_cells(bbox, 3)
+        assert len(found) == count_cells(bbox, 3)
+        assert encode(0.5, 179.5, 3) in found
+        assert encode(0.5, -179.5, 3) in found
+        assert encode(0.5, 0.0, 3) not in found
+
+    def test_zoom_precision(self):
+        precisions = [zoom_precision(zoom) for zoom in range(0, 20)]
+        assert precisions == sorted(precisions)
+        assert precisions[0] == 1
+        assert precisions[-1] == 8
+
+
+class TestLocationCells:
+    def test_counts(self, create_user):
+        user = create_user()
+        sydney = locate(user, SYDNEY)
+        bondi = locate(user, BONDI)
+        locate(user, LONDON)
+        shared = encode(*SYDNEY, 3)
+        assert shared == encode(*BONDI, 3)
+        assert cells(3)[shared] == (2, bondi.id)
+        assert len(cells(1)) == 2
+        assert len(cells(8)) == 3
+
+        bondi.location.delete()
+        assert cells(3)[shared] == (1, None)
+        fill_cell_photos(list(LocationCell.objects.all()))
+        assert cells(3)[shared] == (1, sydney.id)
+        assert encode(*BONDI, 8) not in cells(8)
+
+    def test_move(self, create_user):
+        user = create_user()
+        photo = locate(user, SYDNEY)
+        save_location(photo, LONDON)
+        assert set(cells(8)) == {encode(*LONDON, 8)}
+        assert set(cells(1)) == {encode(*LONDON, 1)}
+        assert set(prefixes(encode(*LONDON))) == set(
+            LocationCell.objects.filter(count=1).values_list("cell", flat=True)
+        )
+
+    def test_photo_deleted(self, create_user):
+        user = create_user()
+        client.force_login(user=user)
+        sydney = locate(user, SYDNEY)
+        bondi = locate(user, BONDI)
+        bondi.delete()
+        assert cells(3)[encode(*SYDNEY, 3)] == (1, None)
+        response = client.get(reverse("v1:map"), {"bbox": "150,-35,152,-33", "zoom": 4})
+        [cell] = response.json()["cells"]
+        assert cell["photo"] == sydney.id
+        assert cells(3)[encode(*SYDNEY, 3)] == (1, sydney.id)
+        save_location(sydney, None)
+        assert cells(1) == {}
+
+
+class TestMapApi:
+    def test_clusters(self, create_user):
+        user = create_user()
+        client.force_login(user=user)
+        locate(user, SYDNEY)
+        bondi = locate(user, BONDI)
+        locate(user, LONDON)
+        url = reverse("v1:map")
+        response = client.get(url, {"bbox": "150,-35,152,-33", "zoom": 4})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["precision"] == zoom_precision(4)
+        [cell] = data["cells"]
+        assert cell["count"] == 2
+        assert cell["photo"] == bondi.id
+        min_lat, min_lon, max_lat, max_lon = cell["bounds"]
+        assert min_lat <= cell["center"][0] <= max_lat
+        assert min_lon <= cell["center"][1] <= max_lon
+
+        response = client.get(url, {"bbox": "151.2,-33.9,151.3,-33.85", "zoom": 12})
+        assert sorted(c["count"] for c in response.json()["cells"]) == [1, 1]
+
+    def test_cell_limit(self, create_user):
+        client.force_login(user=create_user())
+        response = client.get(
+            reverse("v1:map"), {"bbox": "150,-35,152,-33", "zoom": 16}
+        )
+        precision = response.json()["precision"]
+        assert precision < zoom_precision(16)
+        assert count_cells((150, -35, 152, -33), precision) <= 256
+
+    def test_whole_world(self, create_user):
+        user = create_user()
+        client.force_login(user=user)
+        locate(user, SYDNEY)
+        locate(user, LONDON)
+        response = client.get(
+            reverse("v1:map"), {"bbox": "-180,-90,180,90", "zoom": 18}
+        )
+        data = response.json()
+        assert count_cells((-180, -90, 180, 90), data["precision"]) <= 256
+        assert sum(c["count"] for c in data["cells"]) == 2
+
+    @pytest.mark.parametrize(
+        "params",
+        [
+            {"zoom": 3},
+            {"bbox": "1,2,3", "zoom": 3},
+            {"bbox": "0,10,1,5", "zoom": 3},
+            {"bbox": "0,0,1,1", "zoom": -1},
+        ],
+    )
+    def test_invalid(self, create_user, params):
+        client.force_login(user=create_user())
+        response = client.get(reverse("v1:map"), params)
+        assert response.status_code == 400
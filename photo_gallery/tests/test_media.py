@@ -0,0 +1,82 @@
+import pytest
+from model_bakery import baker
+
+from django.test import Client
+from django.urls import reverse
+
+from gallery.renditions import generate_renditions
+
+pytestmark = pytest.mark.django_db
+client = Client()
+
+
+@pytest.fixture
+def photo(create_user, media_root, make_image):
+    user = create_user()
+    client.force_login(user=user)
+    return baker.make("gallery.Photo", owner=user, photo=make_image())
+
+
+def content_of(response):
+    return b"".join(response.streaming_content)
+
+
+class TestPhotoFile:
+    def test_anonymous(self, photo):
+        client.logout()
+        response = client.get(reverse("v1:photo_file", kwargs={"pk": photo.id}))
+        assert response.status_code == 401
+
+    def test_not_found(self, photo):
+        response = client.get(reverse("v1:photo_file", kwargs={"pk": photo.id + 1}))
+        assert response.status_code == 404
+
+    def test_stream(self, photo, media_root):
+        response = client.get(
+            reverse("v1:photo_file", kwargs={"pk": photo.id}), HTTP_ACCEPT="image/*"
+        )
+        assert response.status_code == 200
+        assert response["Content-Type"] == "image/jpeg"
+        assert response["Cache-Control"] == "private, max-age=31536000, immutable"
+        assert content_of(response) == (media_root / photo.photo.name).read_bytes()
+
+        response = client.get(
+            reverse("v1:photo_file", kwargs={"pk": photo.id}),
+            HTTP_IF_NONE_MATCH=response["ETag"],
+        )
+        assert response.status_code == 304
+
+    def test_range(self, photo, media_root):
+        content = (media_root / photo.photo.name).read_bytes()
+        url = reverse("v1:photo_file", kwargs={"pk": photo.id})
+
+        response = client.get(url, HTTP_RANGE="bytes=10-19")
+        assert response.status_code == 206
+        assert response["Content-Range"] == f"bytes 10-19/{len(content)}"
+        assert content_of(response) == content[10:20]
+
+        response = client.get(url, HTTP_RANGE="bytes=-5")
+        assert content_of(response) == content[-5:]
+
+        response = client.get(url, HTTP_RANGE=f"bytes={len(content)}-")
+        assert response.status_code == 416
+
+    def test_accel_redirect(self, photo, settings):
+        settings.MEDIA_ACCEL_REDIRECT = "/protected-media/"
+        response = client.get(reverse("v1:photo_file", kwargs={"pk": photo.id}))
+        assert response.status_code == 200
+        assert response["X-Accel-Redirect"] == f"/protected-media/{photo.photo.name}"
+        assert response.content == b""
+
+    def test_rendition(self, photo, settings):
+        settings.PHOTO_RENDITION_SIZES = (160,)
+        settings.PHOTO_RENDITION_FORMATS = ("jpeg",)
+        generate_renditions(photo)
+        response = client.get(
+            reverse(
+                "v1:photo_rendition_file",
+                kwargs={"pk": photo.id, "size": 160, "format": "jpeg"},
+            )
+        )
+        assert response.status_code == 200
+        assert response["Cache-Control"] == "private, no-cache"
@@ -0,0 +1,191 @@
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+
+import pytest
+from model_bakery import baker
+from PIL import Image
+
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+
+from gallery.metadata import read_metadata
+from gallery.models import PhotoHash, PhotoMetadata, PhotoMonthCount
+from gallery.renditions import schedule_renditions
+
+pytestmark = pytest.mark.django_db
+client = Client()
+
+
+def make_exif(taken="2021:05:04 10:11:12", offset=None, orientation=1, location=None):
+    exif = Image.Exif()
+    exif[0x010F] = "Canon"
+    exif[0x0110] = "Canon EOS 5D"
+    exif[0x0112] = orientation
+    details = {0x9003: taken, 0xA434: "EF 50mm f/1.8"}
+    if offset:
+        details[0x9011] = offset
+    exif[0x8769] = details
+    if location:
+        (lat_ref, lat), (lon_ref, lon) = location
+        exif[0x8825] = {1: lat_ref, 2: lat, 3: lon_ref, 4: lon}
+    return exif
+
+
+def make_metadata(user, taken_at=None, **kwargs):
+    photo = baker.make("gallery.Photo", owner=user)
+    kwargs.setdefault("width", 800)
+    kwargs.setdefault("height", 600)
+    return PhotoMetadata.objects.create(
+        photo=photo, owner=user, taken_at=taken_at, **kwargs
+    )
+
+
+def ids(response):
+    return [item["id"] for item in response.json()["results"]]
+
+
+class TestReadMetadata:
+    def test_exif(self, make_image):
+        image = make_image(size=(40, 20), exif=make_exif(offset="+02:00"))
+        data = read_metadata(image)
+        assert data == {
+            "taken_at": datetime(
+                2021, 5, 4, 10, 11, 12, tzinfo=timezone(timedelta(hours=2))
+            ),
+            "camera": "Canon EOS 5D",
+            "lens": "EF 50mm f/1.8",
+            "width": 40,
+            "height": 20,
+            "orientation": 1,
+            "location": None,
+        }
+
+    def test_gps(self, make_image):
+        exif = make_exif(
+            location=(("S", (33.0, 51.0, 34.56)), ("E", (151.0, 12.0, 36.0)))
+        )
+        latitude, longitude = read_metadata(make_image(exif=exif))["location"]
+        assert latitude == pytest.approx(-33.8596)
+        assert longitude == pytest.approx(151.21)
+
+    def test_invalid_gps(self, make_image):
+        exif = make_exif(location=(("N", (95.0, 0.0, 0.0)), ("E", (1.0, 0.0, 0.0))))
+        assert read_metadata(make_image(exif=exif))["location"] is None
+
+    def test_rotated(self, make_image):
+        data = read_metadata(make_image(size=(40, 20), exif=make_exif(orientation=6)))
+        assert (data["width"], data["height"]) == (20, 40)
+        assert data["taken_at"] == datetime(2021, 5, 4, 10, 11, 12)
+
+    def test_without_exif(self, make_image):
+        data = read_metadata(make_image(size=(40, 20), format="PNG"))
+        assert data["taken_at"] is None
+        assert data["camera"] == ""
+        assert (data["width"], data["height"]) == (40, 20)
+
+
+class TestExtraction:
+    def test_on_ingest(self, create_user, media_root, make_image, settings):
+        user = create_user()
+        settings.PHOTO_RENDITION_SIZES = (160,)
+        photo = baker.make(
+            "gallery.Photo", owner=user, photo=make_image(exif=make_exif())
+        )
+        schedule_renditions(photo)
+        call_command("runworker", burst=True, concurrency=1, stdout=StringIO())
+        metadata = PhotoMetadata.objects.get(photo=photo)
+        assert metadata.camera == "Canon EOS 5D"
+        assert metadata.taken_month.isoformat() == "2021-05-01"
+        assert PhotoMonthCount.objects.get(owner=user).count == 1
+
+    def test_backfill(self, create_user, media_root, make_image):
+        user = create_user()
+        photos = [
+            baker.make("gallery.Photo", owner=user, photo=make_image(exif=make_exif()))
+            for _ in range(3)
+        ]
+        PhotoMetadata.objects.all().delete()
+        out = StringIO()
+        call_command("backfill_metadata", processes=2, chunk_size=2, stdout=out)
+        assert "3 extracted, 0 failed" in out.getvalue()
+        assert PhotoMetadata.objects.filter(photo__in=photos).count() == 3
+        assert PhotoHash.objects.filter(photo__in=photos).count() == 3
+
+
+class TestMonthCounts:
+    def test_counts(self, create_user):
+        user = create_user()
+        may = datetime(2021, 5, 4, 12, tzinfo=timezone.utc)
+        first = make_metadata(user, may)
+        make_metadata(user, may)
+        make_metadata(user, None)
+        assert PhotoMonthCount.objects.get(owner=user).count == 2
+
+        first.taken_at = may + timedelta(days=40)
+        first.save()
+        counts = PhotoMonthCount.objects.order_by("month")
+        assert [c.count for c in counts] == [1, 1]
+
+        first.photo.delete()
+        assert [c.count for c in counts.all()] == [1, 0]
+
+    def test_histogram(self, create_user, create_user_1):
+        user = create_user()
+        client.force_login(user=user)
+        may = datetime(2021, 5, 4, 12, tzinfo=timezone.utc)
+        make_metadata(user, may)
+        make_metadata(user, may + timedelta(days=40))
+        make_metadata(create_user_1(), may)
+
+        response = client.get(reverse("v1:photo_months"))
+        assert response.json() == [
+            {"month": "2021-05", "count": 2},
+            {"month": "2021-06", "count": 1},
+        ]
+        url = reverse("v1:user_photo_months", kwargs={"user_pk": user.id})
+        assert client.get(url).json() == [
+            {"month": "2021-05", "count": 1},
+            {"month": "2021-06", "count": 1},
+        ]
+
+
+class TestPhotoFilters:
+    def test_filters(self, create_user):
+        user = create_user()
+        client.force_login(user=user)
+        may = datetime(2021, 5, 4, 12, tzinfo=timezone.utc)
+        old = make_metadata(user, may, camera="Canon EOS 5D")
+        new = make_metadata(user, may + timedelta(days=40), width=4000)
+        make_metadata(user, None)
+        url = reverse("v1:photos")
+
+        response = client.get(url, {"taken_after": "2021-06-01T00:00:00Z"})
+        assert ids(response) == [new.photo_id]
+        response = client.get(url, {"taken_before": "2021-06-01T00:00:00Z"})
+        assert ids(response) == [old.photo_id]
+        assert ids(client.get(url, {"camera": "Canon EOS 5D"})) == [old.photo_id]
+        assert ids(client.get(url, {"min_width": 1000})) == [new.photo_id]
+        assert client.get(url, {"min_width": "wide"}).status_code == 400
+
+    def test_ordering(self, create_user):
+        user = create_user()
+        client.force_login(user=user)
+        start = datetime(2021, 5, 4, 12, tzinfo=timezone.utc)
+        # Created newest first, so that id order differs from capture order.
+        photos = [
+            make_metadata(user, start - timedelta(days=i)).photo_id for i in range(5)
+        ]
+        make_metadata(user, None)
+        url = reverse("v1:user_photos", kwargs={"user_pk": user.id})
+        response = client.get(url, {"ordering": "taken_at", "limit": 2})
+        seen = ids(response)
+        while response.json()["next"]:
+            response = client.get(response.json()["next"])
+            seen += ids(response)
+        assert seen == photos[::-1]
+
+        response = client.get(url, {"ordering": "-taken_at"})
+        assert ids(response) == photos
+        data = response.json()["results"][0]["metadata"]
+        assert data["width"] == 800
@@ -1,5 +1,8 @@
+from io import StringIO
+
 import pytest
 
+from django.core.management import call_command
 from django.db.models.signals import post_delete
 from django.test import Client
 
@@ -36,3 +39,71 @@ class TestModels:
         photo = baker.make('gallery.Photo')
         result = post_delete.send(Photo, instance=photo)
         assert result
+
+    def test_photo_score(self):
+        photo = baker.make("gallery.Photo")
+        comment = baker.make("gallery.Comment", photo=photo)
+        baker.make("gallery.Bookmark", photo=photo, _quantity=2)
+        photo.refresh_from_db()
+        assert photo.score == 3
+        comment.delete()
+        photo.refresh_from_db()
+        assert photo.score == 2
+
+
+class TestCounters:
+    def test_counters(self, create_user, create_user_1):
+        user = create_user()
+        album = baker.make("gallery.Album", owner=user)
+        photo = baker.make("gallery.Photo", owner=user, album=album)
+        baker.make("gallery.Comment", photo=photo, owner=user)
+        baker.make("gallery.Comment", photo=photo, owner=create_user_1())
+        baker.make("gallery.Bookmark", photo=photo, owner=user)
+        photo.refresh_from_db()
+        album.refresh_from_db()
+        user.refresh_from_db()
+        assert (photo.comment_count, photo.bookmark_count) == (2, 1)
+        assert album.photo_count == 1
+        assert (user.album_count, user.photo_count) == (1, 1)
+        assert (user.comment_count, user.bookmark_count) == (1, 1)
+
+    def test_counters_cascade(self, create_user, create_user_1):
+        user = create_user()
+        user_1 = create_user_1()
+        album = baker.make("gallery.Album", owner=user)
+        photo = baker.make("gallery.Photo", owner=user, album=album)
+        baker.make("gallery.Comment", photo=photo, owner=user_1)
+        baker.make("gallery.Bookmark", photo=photo, owner=user_1)
+        album.delete()
+        user.refresh_from_db()
+        user_1.refresh_from_db()
+        assert (user.album_count, user.photo_count) == (0, 0)
+        assert (user_1.comment_count, user_1.bookmark_count) == (0, 0)
+
+    def test_counters_stop_at_zero(self, create_user):
+        photo = baker.make("gallery.Photo")
+        baker.make("gallery.Comment", photo=photo, owner=create_user())
+        Photo.objects.update(comment_count=0)
+        photo.comment_set.get().delete()
+        photo.refresh_from_db()
+        assert (photo.comment_count, photo.score) == (0, 0)
+
+    def test_counters_album_move(self):
+        album, album_1 = baker.make("gallery.Album", _quantity=2)
+        photo = baker.make("gallery.Photo", album=album)
+        photo = Photo.objects.get(pk=photo.pk)
+        photo.album = album_1
+        photo.save()
+        album.refresh_from_db()
+        album_1.refresh_from_db()
+        assert (album.photo_count, album_1.photo_count) == (0, 1)
+
+    def test_repair_counters(self):
+        photo = baker.make("gallery.Photo")
+        baker.make("gallery.Comment", photo=photo, _quantity=3)
+        Photo.objects.update(comment_count=0, score=7)
+        out = StringIO()
+        call_command("repair_counters", chunk_size=1, stdout=out)
+        photo.refresh_from_db()
+        assert (photo.comment_count, photo.score) == (3, 3)
+        assert "gallery.Photo: 1 checked, 1 drifted" in out.getvalue()
@@ -0,0 +1,80 @@
+import math
+from io import StringIO
+
+import numpy as np
+import pytest
+from model_bakery import baker
+
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+
+from gallery.models import Photo
+from gallery.placeholders import BASE83, blurhash, components
+from gallery.renditions import schedule_renditions
+
+pytestmark = pytest.mark.django_db
+client = Client()
+
+
+def decode83(chars):
+    value = 0
+    for char in chars:
+        value = value * 83 + BASE83.index(char)
+    return value
+
+
+class TestBlurHash:
+    def test_components(self):
+        rng = np.random.default_rng(0)
+        pixels = rng.integers(0, 256, (5, 7, 3), dtype=np.uint8)
+        linear = ((pixels / 255 + 0.055) / 1.055) ** 2.4
+        linear = np.where(pixels / 255 <= 0.04045, pixels / 255 / 12.92, linear)
+        factors = components(pixels, 4, 3)
+        for j in range(3):
+            for i in range(4):
+                expected = sum(
+                    math.cos(math.pi * i * x / 7)
+                    * math.cos(math.pi * j * y / 5)
+                    * linear[y, x]
+                    for y in range(5)
+                    for x in range(7)
+                ) * ((1 if i == j == 0 else 2) / 35)
+                assert factors[j, i] == pytest.approx(expected)
+
+    def test_format(self, make_image):
+        landscape = blurhash(make_image(size=(800, 600), color="blue", format="PNG"))
+        portrait = blurhash(make_image(size=(600, 800), format="PNG"))
+        assert len(landscape) == len(portrait) == 28
+        # The first character encodes the number of components.
+        assert decode83(landscape[0]) == (4 - 1) + (3 - 1) * 9
+        assert decode83(portrait[0]) == (3 - 1) + (4 - 1) * 9
+        # Then the average color.
+        assert decode83(landscape[2:6]) == 0x0000FF
+
+
+class TestPlaceholders:
+    def test_on_ingest(self, create_user, media_root, make_image, settings):
+        user = create_user()
+        client.force_login(user=user)
+        settings.PHOTO_RENDITION_SIZES = (160,)
+        photo = baker.make("gallery.Photo", owner=user, photo=make_image())
+        schedule_renditions(photo)
+        call_command("runworker", burst=True, concurrency=1, stdout=StringIO())
+        photo.refresh_from_db()
+        assert len(photo.placeholder) == 28
+
+        response = client.get(reverse("v1:photos"))
+        assert response.json()["results"][0]["placeholder"] == photo.placeholder
+
+    def test_backfill(self, create_user, media_root, make_image):
+        user = create_user()
+        photos = [
+            baker.make("gallery.Photo", owner=user, photo=make_image(color=color))
+            for color in ("red", "green", "blue")
+        ]
+        out = StringIO()
+        call_command("backfill_placeholders", processes=2, chunk_size=2, stdout=out)
+        assert "3 computed, 0 failed" in out.getvalue()
+        placeholders = Photo.objects.filter(pk__in=[p.pk for p in photos])
+        assert len(set(placeholders.values_list("placeholder", flat=True))) == 3
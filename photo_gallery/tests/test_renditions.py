@@ -0,0 +1,81 @@
+from io import StringIO
+
+import pytest
+from model_bakery import baker
+
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+
+from api.serializers import PhotoSerializer
+from gallery.models import Photo, Rendition
+from gallery.renditions import generate_renditions
+
+pytestmark = pytest.mark.django_db
+client = Client()
+
+
+@pytest.fixture
+def rendition_settings(settings):
+    settings.PHOTO_RENDITION_SIZES = (160, 640)
+    settings.PHOTO_RENDITION_FORMATS = ("jpeg",)
+    return settings
+
+
+class TestRenditions:
+    def test_generate(self, media_root, make_image, rendition_settings):
+        photo = baker.make("gallery.Photo", photo=make_image(size=(2000, 1000)))
+        generate_renditions(photo)
+        renditions = {r.size: r for r in Rendition.objects.filter(photo=photo)}
+        assert set(renditions) == {160, 640}
+        assert (renditions[640].width, renditions[640].height) == (640, 320)
+        assert (media_root / renditions[160].file.name).exists()
+
+    def test_regenerate_replaces_files(
+        self, media_root, make_image, rendition_settings
+    ):
+        photo = baker.make("gallery.Photo", photo=make_image())
+        generate_renditions(photo)
+        generate_renditions(photo)
+        assert Rendition.objects.filter(photo=photo).count() == 2
+        assert len(list((media_root / "renditions" / str(photo.id)).iterdir())) == 2
+
+    def test_delete_removes_files(
+        self, media_root, make_image, rendition_settings, on_commit
+    ):
+        photo = baker.make("gallery.Photo", photo=make_image())
+        paths = [media_root / r.file.name for r in generate_renditions(photo)]
+        with on_commit():
+            photo.delete()
+        assert all(path.exists() for path in paths)
+        call_command("runworker", burst=True, concurrency=1, stdout=StringIO())
+        assert not any(path.exists() for path in paths)
+
+    def test_serializer(self, media_root, make_image, rendition_settings):
+        photo = baker.make("gallery.Photo", photo=make_image())
+        generate_renditions(photo)
+        data = PhotoSerializer(photo).data
+        assert set(data["renditions"]) == {"160", "640"}
+        assert data["photo"] == f"/api/photo/{photo.pk}/file/"
+        assert data["renditions"]["160"]["jpeg"] == (
+            f"/api/photo/{photo.pk}/file/160/jpeg/"
+        )
+
+    def test_create_schedules(self, create_user, media_root, make_image, mocker):
+        schedule = mocker.patch("api.views.schedule_renditions")
+        user = create_user()
+        client.force_login(user=user)
+        album = baker.make("gallery.Album", owner=user)
+        response = client.post(
+            reverse("v1:photos"),
+            {"description": "photo", "album": album.id, "photo": make_image()},
+        )
+        assert response.status_code == 201
+        assert response.json()["renditions"] == {}
+        schedule.assert_called_once_with(Photo.objects.get())
+
+    def test_backfill(self, media_root, make_image, rendition_settings):
+        baker.make("gallery.Photo", photo=make_image(), _quantity=3)
+        baker.make("gallery.Photo")
+        call_command("backfill_renditions", chunk_size=2)
+        assert Rendition.objects.count() == 6
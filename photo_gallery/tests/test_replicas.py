@@ -0,0 +1,144 @@
+import sqlite3
+
+import pytest
+from model_bakery import baker
+
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+from api import routers
+from api.authentication import ACCESS, make_token
+from gallery.models import Album
+
+# The replica is a snapshot of committed rows.
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture
+def replica(settings, tmp_path):
+    """A second SQLite file standing in for a replica, synced by ``sync()``."""
+    alias = "replica"
+    path = str(tmp_path / "replica.sqlite3")
+    connections.settings[alias] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": path,
+        "CONN_MAX_AGE": 60,
+    }
+    connections.ensure_defaults(alias)
+    connections.prepare_test_settings(alias)
+    settings.DATABASE_REPLICAS = [alias]
+    routers.lag_monitor.clear()
+
+    def sync():
+        connections[alias].close()
+        primary = connections["default"]
+        primary.ensure_connection()
+        with sqlite3.connect(path) as target:
+            primary.connection.backup(target)
+
+    sync()
+    yield sync
+    connections[alias].close()
+    del connections[alias]
+    del connections.settings[alias]
+    routers.lag_monitor.clear()
+    cache.clear()
+
+
+def client_for(user):
+    return Client(HTTP_AUTHORIZATION=f"Bearer {make_token(user, ACCESS)}")
+
+
+def album_names(client):
+    response = client.get(reverse("v1:albums"))
+    assert response.status_code == 200
+    return [album["name"] for album in response.json()["results"]]
+
+
+class TestReplicaRouting:
+    def test_reads_from_replica(self, create_user, replica):
+        user = create_user()
+        client = client_for(user)
+        baker.make(Album, owner=user, name="synced")
+        replica()
+        baker.make(Album, owner=user, name="not yet replicated")
+        assert album_names(client) == ["synced"]
+
+    def test_reads_own_writes(self, create_user, replica):
+        user = create_user()
+        client = client_for(user)
+        response = client.post(
+            reverse("v1:albums"), {"name": "mine"}, "application/json"
+        )
+        assert response.status_code == 201
+        assert album_names(client) == ["mine"]
+
+    def test_pin_expires(self, create_user, replica, settings):
+        user = create_user()
+        client = client_for(user)
+        settings.REPLICA_PIN_SECONDS = 0
+        response = client.post(
+            reverse("v1:albums"), {"name": "mine"}, "application/json"
+        )
+        assert response.status_code == 201
+        assert album_names(client) == []
+
+    def test_pin_is_per_client(self, create_user, replica, create_user_1):
+        user = create_user()
+        client = client_for(user)
+        other = create_user_1()
+        replica()
+        other_client = client_for(other)
+        other_client.post(reverse("v1:albums"), {"name": "theirs"}, "application/json")
+        baker.make(Album, owner=user, name="not yet replicated")
+        assert album_names(client) == []
+
+    def test_writes_read_primary(self, create_user, replica, create_user_1):
+        user = create_user()
+        client = client_for(user)
+        # The photo isn't on the replica; the comment is validated against it.
+        photo = baker.make("gallery.Photo", owner=create_user_1())
+        response = client.post(
+            reverse("v1:photo_comments", kwargs={"photo_pk": photo.pk}),
+            {"photo": photo.pk, "text": "comment"},
+            "application/json",
+        )
+        assert response.status_code == 201
+
+    def test_new_user_authenticates(self, replica, create_user_1):
+        client = client_for(create_user_1())
+        assert client.get(reverse("v1:albums")).status_code == 200
+
+    def test_lagging_replica_skipped(self, create_user, replica, monkeypatch):
+        user = create_user()
+        client = client_for(user)
+        monkeypatch.setattr(routers, "measure_lag", lambda alias: 60)
+        baker.make(Album, owner=user, name="not yet replicated")
+        assert album_names(client) == ["not yet replicated"]
+
+    def test_no_replicas(self, create_user):
+        user = create_user()
+        client = client_for(user)
+        baker.make(Album, owner=user, name="primary")
+        assert album_names(client) == ["primary"]
+
+
+class TestConnectionHealth:
+    def test_broken_connection_closed(self, replica, settings, monkeypatch):
+        settings.SQL_HEALTH_CHECK_INTERVAL = 0
+        connection = connections["replica"]
+        connection.ensure_connection()
+        monkeypatch.setattr(connection, "is_usable", lambda: False)
+        request_started.send(sender=None)
+        assert connection.connection is None
+
+    def test_checked_at_interval(self, replica, settings, monkeypatch):
+        connection = connections["replica"]
+        connection.ensure_connection()
+        request_started.send(sender=None)
+        monkeypatch.setattr(connection, "is_usable", lambda: False)
+        request_started.send(sender=None)
+        assert connection.connection is not None
@@ -0,0 +1,96 @@
+import pytest
+from model_bakery import baker
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from gallery.search import search_photos, search_terms
+
+pytestmark = pytest.mark.django_db
+client = Client()
+
+
+def ids(response):
+    return [item["id"] for item in response.json()["results"]]
+
+
+class TestSearchIndex:
+    def test_terms(self):
+        assert search_terms('sunset "beach" OR -x*') == ["sunset", "beach", "OR", "x"]
+        assert search_terms("  ") == []
+
+    def test_description_and_comments(self, create_user, create_user_1):
+        user = create_user()
+        photo = baker.make("gallery.Photo", owner=user, description="Sunset at sea")
+        other = baker.make("gallery.Photo", owner=user, description="Mountains")
+        assert [hit[0] for hit in search_photos(["sunsets"])] == [photo.id]
+
+        comment = baker.make(
+            "gallery.Comment", owner=create_user_1(), photo=other, text="What a sunset"
+        )
+        # The description weighs more than the comments.
+        assert [hit[0] for hit in search_photos(["sunset"])] == [photo.id, other.id]
+
+        comment.delete()
+        assert [hit[0] for hit in search_photos(["sunset"])] == [photo.id]
+
+    def test_update_and_delete(self, create_user):
+        user = create_user()
+        photo = baker.make("gallery.Photo", owner=user, description="Old harbour")
+        photo.description = "New bridge"
+        photo.save()
+        assert search_photos(["harbour"]) == []
+        assert [hit[0] for hit in search_photos(["bridge"])] == [photo.id]
+
+        photo.delete()
+        assert search_photos(["bridge"]) == []
+
+    def test_rebuild(self, create_user):
+        user = create_user()
+        photo = baker.make("gallery.Photo", owner=user, description="Forest")
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM gallery_photo_fts")
+        assert search_photos(["forest"]) == []
+
+        call_command("rebuild_search_index", chunk_size=1)
+        assert [hit[0] for hit in search_photos(["forest"])] == [photo.id]
+
+
+class TestSearchApi:
+    def test_search(self, create_user):
+        user = create_user()
+        client.force_login(user=user)
+        photo = baker.make("gallery.Photo", owner=user, description="Red fox")
+        baker.make("gallery.Photo", owner=user, description="Red car")
+        response = client.get(reverse("v1:search"), {"q": "fox red"})
+        assert response.status_code == 200
+        assert ids(response) == [photo.id]
+        assert response.json()["results"][0]["rank"] > 0
+
+    def test_pages(self, create_user):
+        user = create_user()
+        client.force_login(user=user)
+        photos = baker.make("gallery.Photo", owner=user, description="cat", _quantity=3)
+        photos.append(
+            baker.make("gallery.Photo", owner=user, description="cat cat cat")
+        )
+        response = client.get(reverse("v1:search"), {"q": "cat", "limit": 2})
+        seen = ids(response)
+        while response.json()["next"]:
+            response = client.get(response.json()["next"])
+            seen += ids(response)
+        assert seen[0] == photos[-1].id
+        assert sorted(seen) == sorted(photo.id for photo in photos)
+
+    def test_requires_query(self, create_user):
+        client.force_login(user=create_user())
+        response = client.get(reverse("v1:search"), {"q": " ? "})
+        assert response.status_code == 400
+        assert "q" in response.json()
+
+    def test_invalid_cursor(self, create_user):
+        client.force_login(user=create_user())
+        response = client.get(reverse("v1:search"), {"q": "cat", "cursor": "x"})
+        assert response.status_code == 404
@@ -0,0 +1,65 @@
+from io import StringIO
+
+import pytest
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import Count, F
+
+from gallery.models import Album, Blob, Bookmark, Comment, Photo
+from gallery.search import search_photos
+
+pytestmark = pytest.mark.django_db
+User = get_user_model()
+
+
+def seed(**options):
+    options = {"users": 5, "photos": 40, "images": 3, "batch_size": 7, **options}
+    call_command("seed_gallery", stdout=StringIO(), **options)
+
+
+class TestSeedGallery:
+    def test_counts(self, media_root):
+        users = User.objects.count()
+        seed()
+        assert User.objects.count() == users + 5
+        assert Album.objects.count() == 15
+        assert Photo.objects.count() == 40
+        assert Comment.objects.count() == 80
+        assert Bookmark.objects.count() == 40
+        assert Blob.objects.count() == 3
+        assert len(list(media_root.rglob("*.jpg"))) == 3
+
+    def test_consistent(self, media_root):
+        seed()
+        assert not Photo.objects.exclude(album__owner=F("owner")).exists()
+        assert not Comment.objects.filter(owner=F("photo__owner")).exists()
+        assert not Photo.objects.filter(placeholder="").exists()
+        for photo in Photo.objects.annotate(comments=Count("comment")):
+            assert photo.comment_count == photo.comments
+        for user in User.objects.all():
+            assert user.photo_count == Photo.objects.filter(owner=user).count()
+        assert sum(Blob.objects.values_list("refcount", flat=True)) == 40
+
+        out = StringIO()
+        call_command("repair_counters", stdout=out)
+        lines = out.getvalue().splitlines()
+        assert all(line.endswith(", 0 drifted") for line in lines)
+
+    def test_searchable(self, media_root):
+        seed()
+        word = Photo.objects.first().description.split()[0]
+        assert search_photos([word])
+
+    def test_reproducible(self, media_root):
+        seed(seed=1)
+        first = list(Photo.objects.order_by("pk").values_list("description", "photo"))
+        Photo.objects.all().delete()
+        seed(seed=1)
+        second = list(Photo.objects.order_by("pk").values_list("description", "photo"))
+        assert first == second
+
+    def test_single_user(self, media_root):
+        seed(users=1)
+        assert Photo.objects.count() == 40
+        assert not Comment.objects.exists()
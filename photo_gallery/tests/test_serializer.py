@@ -1,6 +1,8 @@
 import pytest
 from model_bakery import baker
 
+from rest_framework.exceptions import ValidationError
+
 from api.serializers import (
     AlbumSerializer,
     PhotoSerializer,
@@ -77,8 +79,9 @@ class TestCommentSerializer:
                 "photo": photo_1.id,
             }
         )
-        assert not serializer.is_valid()
-        assert serializer.errors
+        assert serializer.is_valid()
+        with pytest.raises(ValidationError, match="already commented"):
+            serializer.save()
         serializer = CommentSerializer(
             data={
                 "id": comment.id,
@@ -114,8 +117,9 @@ class TestBookmarkSerializer:
         serializer = BookmarkSerializer(
             data={"id": bookmark.id, "user": user, "photo": photo_1.id}
         )
-        assert not serializer.is_valid()
-        assert serializer.errors
+        assert serializer.is_valid()
+        with pytest.raises(ValidationError, match="already added"):
+            serializer.save()
         serializer = BookmarkSerializer(
             data={"id": bookmark.id, "user": user, "photo": photo.id}
         )
@@ -0,0 +1,182 @@
+import hashlib
+from io import StringIO
+
+import pytest
+from model_bakery import baker
+
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+
+from gallery.management.commands.sweep_media import walk_sorted
+from gallery.models import Blob, Photo
+from gallery.storage import is_content_addressed
+from tasks.models import Job
+
+pytestmark = pytest.mark.django_db
+
+
+def run_worker():
+    call_command("runworker", burst=True, concurrency=1, stdout=StringIO())
+
+
+@pytest.fixture
+def no_grace(settings):
+    settings.MEDIA_BLOB_GRACE_PERIOD = 0
+    return settings
+
+
+class TestContentAddressedStorage:
+    def test_hashed_layout(self, media_root, make_image):
+        image = make_image()
+        digest = hashlib.sha256(image.read()).hexdigest()
+        image.seek(0)
+        photo = baker.make("gallery.Photo", photo=image)
+        assert photo.photo.name == f"{digest[:2]}/{digest[2:4]}/{digest}.jpg"
+        assert is_content_addressed(photo.photo.name)
+        assert (media_root / photo.photo.name).exists()
+        assert not list((media_root / "uploads").iterdir())
+
+    def test_deduplicates(self, media_root, make_image):
+        first = baker.make("gallery.Photo", photo=make_image())
+        second = baker.make("gallery.Photo", photo=make_image(name="copy.jpg"))
+        assert first.photo.name == second.photo.name
+        assert Blob.objects.get(name=first.photo.name).refcount == 2
+
+    def test_last_reference_deletes(self, media_root, make_image, no_grace, on_commit):
+        first = baker.make("gallery.Photo", photo=make_image())
+        second = baker.make("gallery.Photo", photo=make_image())
+        path = media_root / first.photo.name
+
+        with on_commit():
+            first.delete()
+        run_worker()
+        assert path.exists()
+        assert Blob.objects.get(name=second.photo.name).refcount == 1
+
+        with on_commit():
+            second.delete()
+        run_worker()
+        assert not path.exists()
+        assert not Blob.objects.exists()
+
+    def test_grace_period(self, media_root, make_image, on_commit, settings):
+        photo = baker.make("gallery.Photo", photo=make_image())
+        path = media_root / photo.photo.name
+        with on_commit():
+            photo.delete()
+        run_worker()
+        run_worker()
+        assert path.exists()
+        job = Job.objects.get()
+        assert job.name == "gallery.delete_blob"
+        assert job.status == Job.QUEUED
+        assert job.attempts == 0
+        assert job.run_at > timezone.now()
+
+        # Deleted once the grace period is over, without failed attempts.
+        settings.MEDIA_BLOB_GRACE_PERIOD = 0
+        Job.objects.update(run_at=timezone.now())
+        run_worker()
+        assert not path.exists()
+        assert not Job.objects.exists()
+
+    def test_replace_file(self, media_root, make_image, no_grace, on_commit):
+        photo = baker.make("gallery.Photo", photo=make_image())
+        old = photo.photo.name
+        photo.photo = make_image(color="blue")
+        with on_commit():
+            photo.save()
+        run_worker()
+        assert photo.photo.name != old
+        assert not (media_root / old).exists()
+        assert list(Blob.objects.values_list("name", "refcount")) == [
+            (photo.photo.name, 1)
+        ]
+
+
+class TestDeferredDeletion:
+    def test_batched_per_transaction(self, media_root, make_image, on_commit):
+        album = baker.make("gallery.Album")
+        for color in ("red", "green", "blue"):
+            baker.make(
+                "gallery.Photo",
+                album=album,
+                owner=album.owner,
+                photo=make_image(color=color),
+            )
+        with on_commit():
+            album.delete()
+        jobs = dict(Job.objects.values_list("name", "args"))
+        assert set(jobs) == {"gallery.delete_blobs", "gallery.purge_transforms"}
+        assert len(jobs["gallery.delete_blobs"][0]) == 3
+
+    def test_rollback_keeps_files(self, media_root, make_image, on_commit):
+        photo = baker.make("gallery.Photo", photo=make_image())
+        with on_commit(), pytest.raises(RuntimeError):
+            with transaction.atomic():
+                photo.delete()
+                raise RuntimeError
+        assert not Job.objects.exists()
+        assert Blob.objects.get(name=photo.photo.name).refcount == 1
+
+
+class TestSweepMedia:
+    def sweep(self, **options):
+        out = StringIO()
+        call_command("sweep_media", verbosity=2, stdout=out, **options)
+        return out.getvalue()
+
+    def test_sorted_walk(self, media_root):
+        names = ["a-b.jpg", "a.jpg", "a/b.jpg", "a/c/d.jpg", "b.jpg"]
+        for name in names:
+            (media_root / name).parent.mkdir(parents=True, exist_ok=True)
+            (media_root / name).write_bytes(b"x")
+        (media_root / "t" / "x").mkdir(parents=True)
+        (media_root / "t" / "x" / "1.jpg").write_bytes(b"x")
+        assert [name for name, _ in walk_sorted(media_root)] == sorted(names)
+
+    def test_sweep(self, media_root, make_image, no_grace):
+        kept = baker.make("gallery.Photo", photo=make_image())
+        missing = baker.make("gallery.Photo", photo=make_image(color="blue"))
+        (media_root / missing.photo.name).unlink()
+        (media_root / "orphan.jpg").write_bytes(b"x")
+
+        output = self.sweep(dry_run=True)
+        assert "orphaned: orphan.jpg" in output
+        assert f"missing: gallery.Photo {missing.pk}" in output
+        assert (media_root / "orphan.jpg").exists()
+
+        output = self.sweep()
+        assert "1 orphaned files (1 bytes) deleted" in output
+        assert "1 rows with missing files" in output
+        assert not (media_root / "orphan.jpg").exists()
+        assert (media_root / kept.photo.name).exists()
+
+    def test_recent_files_kept(self, media_root):
+        (media_root / "uploads").mkdir()
+        (media_root / "uploads" / "cas-upload").write_bytes(b"x")
+        assert "0 orphaned files" in self.sweep()
+        assert (media_root / "uploads" / "cas-upload").exists()
+
+
+class TestMigrateMediaLayout:
+    def test_migrate(self, media_root, make_image):
+        image = make_image()
+        content = image.read()
+        photos = baker.make("gallery.Photo", _quantity=2)
+        for i, photo in enumerate(photos):
+            (media_root / f"flat{i}.jpg").write_bytes(content)
+            Photo.objects.filter(pk=photo.pk).update(photo=f"flat{i}.jpg")
+
+        call_command("migrate_media_layout", dry_run=True, stdout=StringIO())
+        assert (media_root / "flat0.jpg").exists()
+
+        call_command("migrate_media_layout", stdout=StringIO())
+        names = set(Photo.objects.values_list("photo", flat=True))
+        assert len(names) == 1
+        name = names.pop()
+        assert is_content_addressed(name)
+        assert (media_root / name).read_bytes() == content
+        assert not (media_root / "flat0.jpg").exists()
+        assert Blob.objects.get(name=name).refcount == 2
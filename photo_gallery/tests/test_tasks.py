@@ -0,0 +1,85 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from tasks.models import Job, TaskStat
+from tasks.queue import claim, enqueue, requeue_stale, run, task
+
+pytestmark = pytest.mark.django_db
+
+calls = []
+
+
+@task("tests.append")
+def append(value):
+    calls.append(value)
+
+
+@task("tests.fail", max_attempts=2)
+def fail():
+    raise RuntimeError("boom")
+
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    calls.clear()
+
+
+class TestQueue:
+    def test_enqueue_and_run(self):
+        enqueue("tests.append", 1)
+        append.delay(2)
+        assert calls == []
+        call_command("runworker", burst=True, concurrency=1, stdout=StringIO())
+        assert calls == [1, 2]
+        assert not Job.objects.exists()
+        assert TaskStat.objects.get(name="tests.append").runs == 2
+
+    def test_eager(self, settings):
+        settings.TASKS_EAGER = True
+        assert enqueue("tests.append", 1) is None
+        assert calls == [1]
+
+    def test_claim_is_exclusive(self):
+        enqueue("tests.append", 1)
+        assert len(claim("worker-1")) == 1
+        assert claim("worker-2") == []
+        job = Job.objects.get()
+        assert (job.status, job.locked_by, job.attempts) == (Job.RUNNING, "worker-1", 1)
+
+    def test_retry_with_backoff(self, settings):
+        settings.TASKS_RETRY_BACKOFF = 10
+        enqueue("tests.fail")
+        [job] = claim("worker")
+        assert not run(job)
+        job.refresh_from_db()
+        assert job.status == Job.QUEUED
+        assert "boom" in job.last_error
+        assert job.run_at > timezone.now() + timedelta(seconds=5)
+        assert claim("worker") == []
+
+        Job.objects.update(run_at=timezone.now())
+        [job] = claim("worker")
+        assert not run(job)
+        job.refresh_from_db()
+        assert job.status == Job.FAILED
+        assert TaskStat.objects.get(name="tests.fail").failures == 2
+
+    def test_requeue_stale(self):
+        enqueue("tests.append", 1)
+        claim("worker")
+        assert requeue_stale() == 0
+        Job.objects.update(locked_at=timezone.now() - timedelta(days=1))
+        assert requeue_stale() == 1
+        assert Job.objects.get().status == Job.QUEUED
+
+    def test_stats_command(self):
+        enqueue("tests.append", 1)
+        call_command("runworker", burst=True, concurrency=1, stdout=StringIO())
+        out = StringIO()
+        call_command("runworker", stats=True, stdout=out)
+        assert "tests.append" in out.getvalue()
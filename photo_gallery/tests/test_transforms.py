@@ -0,0 +1,169 @@
+import io
+import os
+import threading
+import time
+from io import StringIO
+
+import pytest
+from model_bakery import baker
+from PIL import Image
+
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+
+from gallery import transforms
+from gallery.transforms import format_params, get_or_render, parse_params, trim
+
+pytestmark = pytest.mark.django_db
+client = Client()
+
+
+@pytest.fixture
+def photo(create_user, media_root, make_image):
+    user = create_user()
+    client.force_login(user=user)
+    return baker.make("gallery.Photo", owner=user, photo=make_image(size=(800, 600)))
+
+
+def signed_url(photo, **params):
+    response = client.get(
+        reverse("v1:photo_transform", kwargs={"pk": photo.pk}), params
+    )
+    assert response.status_code == 200, response.content
+    return response.json()["url"]
+
+
+def image_of(response):
+    content = b"".join(response.streaming_content)
+    return Image.open(io.BytesIO(content))
+
+
+class TestParams:
+    @pytest.mark.parametrize(
+        "transform",
+        [
+            {"width": 640},
+            {"height": 480, "quality": 70},
+            {"width": 640, "height": 480, "crop": True},
+        ],
+    )
+    def test_round_trip(self, transform):
+        params = format_params(**transform)
+        assert {k: v for k, v in parse_params(params).items() if v} == transform
+
+    @pytest.mark.parametrize(
+        "params", ["", "h480,w640", "w640,crop", "w0640", "w99999", "w640,q0", "x"]
+    )
+    def test_invalid(self, params):
+        assert parse_params(params) is None
+
+
+class TestTransform:
+    def test_resize(self, photo):
+        response = client.get(signed_url(photo, width=200))
+        assert response.status_code == 200
+        assert response["Content-Type"] == "image/jpeg"
+        assert response["Cache-Control"] == "public, max-age=31536000, immutable"
+        assert image_of(response).size == (200, 150)
+
+    def test_crop(self, photo):
+        url = signed_url(photo, width=100, height=100, crop=True, extension="png")
+        image = image_of(client.get(url))
+        assert (image.format, image.size) == ("PNG", (100, 100))
+
+    def test_no_upscaling(self, photo):
+        image = image_of(client.get(signed_url(photo, width=2000)))
+        assert image.size == (800, 600)
+
+    def test_signature(self, photo):
+        url = signed_url(photo, width=200)
+        _, _, _, signature, params, name = url.rsplit("/", 5)
+        assert client.get(url.replace(params, "w2000")).status_code == 404
+        assert client.get(url.replace(name, f"{photo.pk}.png")).status_code == 404
+        assert client.get(url.replace(signature, "A" * 24)).status_code == 404
+
+    def test_replaced_file(self, photo, make_image):
+        url = signed_url(photo, width=200)
+        photo.photo = make_image(color="blue")
+        photo.save()
+        assert client.get(url).status_code == 404
+        assert client.get(signed_url(photo, width=200)).status_code == 200
+
+    def test_limits(self, photo, settings):
+        settings.PHOTO_TRANSFORM_MAX_SIZE = 1000
+        url = reverse("v1:photo_transform", kwargs={"pk": photo.pk})
+        for params in ({}, {"width": 1001}, {"width": 10, "crop": 1}):
+            assert client.get(url, params).status_code == 400
+        assert client.get(url, {"width": 10, "extension": "gif"}).status_code == 400
+
+    def test_accel_redirect(self, photo, settings):
+        settings.MEDIA_ACCEL_REDIRECT = "/protected-media/"
+        url = signed_url(photo, width=200)
+        response = client.get(url)
+        assert (
+            response["X-Accel-Redirect"]
+            == "/protected-media/" + url.split("/media/", 1)[1]
+        )
+
+
+class TestCache:
+    def test_cached(self, photo, media_root, mocker):
+        render = mocker.spy(transforms, "render")
+        url = signed_url(photo, width=200)
+        client.get(url)
+        client.get(url)
+        assert render.call_count == 1
+        assert os.path.exists(media_root / url.split("/media/", 1)[1])
+
+    def test_single_render(self, photo, mocker):
+        calls = []
+
+        def slow_render(*args, **kwargs):
+            calls.append(1)
+            time.sleep(0.1)
+            return b"image"
+
+        mocker.patch.object(transforms, "render", slow_render)
+        transform = parse_params("w200")
+        signature = transforms.sign("w200", photo.pk, "jpg", photo.photo.name)
+        barrier = threading.Barrier(8)
+        names = []
+
+        def request():
+            barrier.wait()
+            names.append(get_or_render(photo, signature, "w200", "jpg", transform))
+
+        threads = [threading.Thread(target=request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1
+        assert len(set(names)) == 1 and len(names) == 8
+
+    def test_trim(self, media_root):
+        now = time.time()
+        root = media_root / "t" / "sig" / "w100"
+        root.mkdir(parents=True)
+        for i in range(10):
+            path = root / f"{i}.jpg"
+            path.write_bytes(b"x" * 100)
+            # Files 0..9 from the least to the most recently used.
+            os.utime(path, (now - 100 + i, now - 1000))
+        assert trim(max_bytes=2000) == 0
+        assert trim(max_bytes=500) == 600
+        assert sorted(p.name for p in root.iterdir()) == [
+            f"{i}.jpg" for i in range(6, 10)
+        ]
+
+    def test_purged_with_photo(self, photo, media_root, on_commit):
+        url = signed_url(photo, width=200)
+        client.get(url)
+        path = media_root / url.split("/media/", 1)[1]
+        assert path.exists()
+        with on_commit():
+            photo.delete()
+        call_command("runworker", burst=True, concurrency=1, stdout=StringIO())
+        assert not path.exists()
+        assert not (media_root / "t" / str(photo.pk)).exists()
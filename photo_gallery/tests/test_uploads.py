@@ -0,0 +1,187 @@
+import base64
+import hashlib
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+
+import pytest
+from model_bakery import baker
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from gallery.models import Photo, UploadSession
+from gallery.uploads import OffsetMismatch, write_chunk
+from tasks.models import Job
+
+pytestmark = pytest.mark.django_db
+client = Client()
+
+
+def checksum(data):
+    return "sha256 " + base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+def send_chunk(session_id, offset, data, **headers):
+    return client.patch(
+        reverse("v1:upload", kwargs={"pk": session_id}),
+        data,
+        content_type="application/offset+octet-stream",
+        HTTP_UPLOAD_OFFSET=str(offset),
+        **headers,
+    )
+
+
+@pytest.fixture
+def upload(create_user, media_root, make_image):
+    user = create_user()
+    client.force_login(user=user)
+    album = baker.make("gallery.Album", owner=user)
+    content = make_image().read()
+    response = client.post(
+        reverse("v1:uploads"),
+        {
+            "album": album.id,
+            "description": "resumable",
+            "filename": "../photo.jpg",
+            "size": len(content),
+        },
+        content_type="application/json",
+    )
+    assert response.status_code == 201
+    return response.json(), content
+
+
+class TestUploads:
+    def test_create_invalid(self, create_user):
+        user = create_user()
+        client.force_login(user=user)
+        album = baker.make("gallery.Album", owner=user)
+        response = client.post(
+            reverse("v1:uploads"),
+            {"album": album.id, "description": "", "filename": "a.exe", "size": 0},
+            content_type="application/json",
+        )
+        assert response.status_code == 400
+        assert set(response.json()) >= {"filename", "size"}
+
+    def test_chunks_and_finish(self, upload, media_root):
+        session, content = upload
+        assert session["filename"] == "photo.jpg"
+        middle = len(content) // 2
+        response = send_chunk(
+            session["id"],
+            0,
+            content[:middle],
+            HTTP_UPLOAD_CHECKSUM=checksum(content[:middle]),
+        )
+        assert response.status_code == 204
+        assert response["Upload-Offset"] == str(middle)
+
+        response = client.get(reverse("v1:upload", kwargs={"pk": session["id"]}))
+        assert response["Upload-Offset"] == str(middle)
+        assert response.json()["offset"] == middle
+
+        response = send_chunk(session["id"], middle, content[middle:])
+        assert response.status_code == 204
+
+        response = client.post(
+            reverse("v1:upload_finish", kwargs={"pk": session["id"]})
+        )
+        assert response.status_code == 201
+        photo = Photo.objects.get()
+        assert response.json()["id"] == photo.id
+        assert photo.description == "resumable"
+        assert (media_root / photo.photo.name).read_bytes() == content
+        assert not UploadSession.objects.exists()
+        assert not list((media_root / "uploads").iterdir())
+
+    def test_offset_mismatch(self, upload):
+        session, content = upload
+        response = send_chunk(session["id"], 10, content[10:20])
+        assert response.status_code == 409
+        assert response["Upload-Offset"] == "0"
+
+    @pytest.mark.django_db(transaction=True)
+    def test_concurrent_writers(self, upload, media_root):
+        session, content = upload
+        first, second = content[:100], bytes(reversed(content[:100]))
+        reading = threading.Event()
+        resume = threading.Event()
+        results = {}
+
+        class SlowStream(BytesIO):
+            def read(self, size=-1):
+                reading.set()
+                resume.wait()
+                return super().read(size)
+
+        def write(name, stream):
+            try:
+                results[name] = write_chunk(
+                    UploadSession.objects.get(), 0, stream, len(first)
+                )
+            except OffsetMismatch:
+                results[name] = None
+            finally:
+                connection.close()
+
+        # The first writer stalls mid-chunk while the second one comes in.
+        threads = [threading.Thread(target=write, args=("first", SlowStream(first)))]
+        threads[0].start()
+        reading.wait()
+        threads.append(threading.Thread(target=write, args=("second", BytesIO(second))))
+        threads[1].start()
+        time.sleep(0.1)
+        resume.set()
+        for thread in threads:
+            thread.join()
+
+        assert results == {"first": 100, "second": None}
+        assert UploadSession.objects.get().offset == 100
+        path = media_root / UploadSession.objects.get().path
+        assert path.read_bytes() == first
+
+    def test_checksum_mismatch(self, upload, media_root):
+        session, content = upload
+        response = send_chunk(
+            session["id"], 0, content[:100], HTTP_UPLOAD_CHECKSUM=checksum(b"other")
+        )
+        assert response.status_code == 400
+        assert UploadSession.objects.get().offset == 0
+        assert (media_root / UploadSession.objects.get().path).stat().st_size == 0
+
+    def test_chunk_too_large(self, upload, settings):
+        settings.UPLOAD_CHUNK_MAX_SIZE = 10
+        session, content = upload
+        assert send_chunk(session["id"], 0, content[:11]).status_code == 413
+
+    def test_finish_incomplete(self, upload):
+        session, content = upload
+        send_chunk(session["id"], 0, content[:10])
+        response = client.post(
+            reverse("v1:upload_finish", kwargs={"pk": session["id"]})
+        )
+        assert response.status_code == 400
+        assert not Photo.objects.exists()
+
+    def test_other_user(self, upload, create_user_1):
+        session, content = upload
+        client.force_login(user=create_user_1())
+        assert send_chunk(session["id"], 0, content).status_code == 404
+
+    def test_purge_expired(self, upload, media_root, on_commit):
+        session, _ = upload
+        path = media_root / UploadSession.objects.get().path
+        UploadSession.objects.update(expires_at=timezone.now() - timedelta(hours=1))
+        assert send_chunk(session["id"], 0, b"x").status_code == 404
+        with on_commit():
+            call_command("purge_uploads", stdout=StringIO())
+        assert not UploadSession.objects.exists()
+        assert Job.objects.filter(name="gallery.delete_files").exists()
+        call_command("runworker", burst=True, concurrency=1, stdout=StringIO())
+        assert not path.exists()
@@ -6,6 +6,7 @@ from django.test import Client
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from api.authentication import ACCESS, make_token
 from api.serializers import SignupSerializer
 
 User = get_user_model()
@@ -99,7 +100,13 @@ class TestUser:
             url, data=user_dict, content_type="application/json", follow=True
         )
         assert response.status_code == 200
-        assert json.loads(response.content) == user_dict
+        assert json.loads(response.content) == {
+            **user_dict,
+            "album_count": 0,
+            "photo_count": 0,
+            "comment_count": 0,
+            "bookmark_count": 0,
+        }
         assert User.objects.all().count() == 2
 
     def test_user_update_error(self, create_user):
@@ -131,3 +138,21 @@ class TestUser:
         assert response.status_code == 200
         assert json.loads(response.content)["last_name"] == "Ivanov"
         assert User.objects.all().count() == 2
+
+    def test_update_keeps_counters(self, create_user):
+        # Token authentication serves a cached copy of the user, whose
+        # counters are older than the ones the album below increments.
+        user = create_user()
+        client = Client(HTTP_AUTHORIZATION=f"Bearer {make_token(user, ACCESS)}")
+        assert client.get(reverse("v1:user")).status_code == 200
+        response = client.post(
+            reverse("v1:albums"), {"name": "album"}, "application/json"
+        )
+        assert response.status_code == 201
+        response = client.patch(
+            reverse("v1:user"), {"first_name": "B"}, "application/json"
+        )
+        assert response.status_code == 200
+        assert response.json()["album_count"] == 1
+        user.refresh_from_db()
+        assert (user.first_name, user.album_count) == ("B", 1)
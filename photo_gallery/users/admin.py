@@ -1,5 +1,7 @@
 from django.contrib import admin
 
+from gallery.deletion import is_large, tombstone
+
 from .models import User
 
 
@@ -12,3 +14,14 @@ class UserAdmin(admin.ModelAdmin):
         "first_name",
         "last_name",
     )
+
+    def delete_model(self, request, obj):
+        # Big accounts are deleted in the background, see gallery.deletion.
+        if is_large(obj):
+            tombstone(obj)
+        else:
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            self.delete_model(request, obj)
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.4 on 2026-10-18 07:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_auto_20210606_1253"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="album_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="bookmark_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="comment_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="photo_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -8,6 +8,13 @@ class User(AbstractUser):
     email = models.EmailField(
         validators=[validators.validate_email], max_length=255, unique=True
     )
+    album_count = models.PositiveIntegerField(default=0, editable=False)
+    photo_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    bookmark_count = models.PositiveIntegerField(default=0, editable=False)
+    # Set when the account is being deleted in the background, see
+    # gallery.deletion.
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username"]